@@ -1,6 +1,79 @@
-def main():
-    print("Hello from braincare!")
+"""
+main.py - braincare 命令行入口
+子命令在调用时才导入对应模块，离线命令不加载 Qt / pyqtgraph / bleak
+
+用法:
+    python main.py [gui] [--profile 秒]      实时监测界面 (默认)
+    python main.py review <会话目录>          会话回看
+    python main.py info <会话目录>            会话信息
+    python main.py export <会话目录> <csv>    导出 CSV
+    python main.py epochs <会话目录> <npz>    按事件标记切分分段
+    python main.py profiles                   列出设备协议
+    python main.py scan [--prefix 前缀]       扫描 BLE 设备
+    python main.py batch <录制目录> [--workers N] 批量计算频段功率与质量指标
+    python main.py catalog <录制目录> [--index] 会话目录登记与查询
+    python main.py sleep <会话目录> <csv>     睡眠分期特征 (30 秒分段)
+    python main.py codec [会话目录]           无损编码基准 (与 zlib 比较)
+    python main.py soak [--hours 8]           内存浸泡测试 (合成数据)
+    python main.py importtime                 各子命令启动耗时 (-X importtime)
+"""
+
+import importlib
+import os
+import sys
+
+MATERIALS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "materials")
+
+# 子命令 -> (模块, 入口函数, 说明)；入口函数接收子命令之后的参数列表
+COMMANDS = {
+    "gui": ("test_nv_brainrf_modified_new", "main", "实时监测界面"),
+    "review": ("session_review", "main", "会话回看窗口"),
+    "info": ("offline", "info_main", "显示会话信息"),
+    "export": ("offline", "export_main", "会话导出为 CSV"),
+    "epochs": ("offline", "epochs_main", "按事件标记切分分段"),
+    "profiles": ("offline", "profiles_main", "列出设备协议"),
+    "scan": ("offline", "scan_main", "扫描 BLE 设备"),
+    "batch": ("batch", "main", "批量处理录制会话 (多进程)"),
+    "catalog": ("catalog", "main", "会话目录: 登记与查询"),
+    "sleep": ("sleep", "main", "睡眠分期特征 (30 秒分段)"),
+    "codec": ("codec", "main", "无损编码基准 (与 zlib 比较)"),
+    "soak": ("soak", "main", "长时间会话内存浸泡测试"),
+    "importtime": ("startup_bench", "main", "测量各子命令的导入耗时"),
+}
+DEFAULT_COMMAND = "gui"
+
+# GUI 入口沿用脚本方式的 argv (argv[0] 为程序名)
+_SCRIPT_STYLE = {"gui", "review"}
+
+
+def usage():
+    lines = ["用法: python main.py <命令> [参数...]", "", "命令:"]
+    lines += [f"  {name:<12}{help_text}" for name, (_, _, help_text) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def resolve(name):
+    """按名称导入子命令入口"""
+    module_name, function_name, _ = COMMANDS[name]
+    if MATERIALS_DIR not in sys.path:
+        sys.path.insert(0, MATERIALS_DIR)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv and argv[0] in COMMANDS:
+        name, rest = argv[0], argv[1:]
+    else:
+        name, rest = DEFAULT_COMMAND, argv
+    entry = resolve(name)
+    if name in _SCRIPT_STYLE:
+        return entry([f"main.py {name}"] + rest)
+    return entry(rest)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""
+batch.py - 录制会话离线批处理 (多进程)
+功能说明：
+1. 遍历目录下的全部会话 (含 meta.json 与 eeg.f32 的子目录)，每个会话交给
+   ProcessPoolExecutor 中的一个进程处理，吞吐随核数近似线性增长
+2. 按块流式读取内存映射数据 (默认每块 60 秒)，每块整形为 (分段, 通道, 样本)
+   后一次 FFT 完成全部分段，频段功率与反馈指标复用实时流水线的 spectral / neurofeedback
+3. 质量指标 (每通道): RMS、平线分段比例、饱和样本比例、伪迹分段比例 (峰峰值超过中位数若干倍)、
+   工频噪声占比；峰峰值以对数直方图累计，内存与会话时长无关
+4. 每个会话的进度写入检查点 (每若干块一次)，中断后从上次位置继续；
+   已完成且数据未变化的会话直接复用结果
+5. 输出汇总表 sessions.csv (每会话一行) 与 channels.csv (每会话每通道一行)，
+   并将特征登记到会话目录 (catalog.py，默认 <录制目录>/catalog.sqlite)
+
+用法:
+    python main.py batch <录制目录> [--out 输出目录] [--workers N] [--epoch-seconds 2] [--no-catalog]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from catalog import CATALOG_FILE, SessionCatalog
+from neurofeedback import feedback_indices
+from recording import EEG_CODEC_FILE, EEG_FILE, META_FILE, SessionReader
+from spectral import BANDS, BandPowerAnalyzer
+
+FULL_SCALE = 2 ** 23 - 1  # 24 位 ADC 满量程 (原始计数)
+CLIP_LEVEL = 0.999 * FULL_SCALE  # 超过即视为饱和
+FLAT_STD = 1.0  # 分段标准差低于该值视为平线 (原始计数)
+ARTIFACT_FACTOR = 5.0  # 峰峰值超过该通道中位峰峰值的倍数视为伪迹
+LINE_BANDS = {"line50": (48.0, 52.0), "line60": (58.0, 62.0)}
+PTP_BINS = np.linspace(0.0, 8.0, 161)  # log10(峰峰值) 直方图边界
+
+CHECKPOINT_VERSION = 1
+STATUS_PARTIAL = "partial"
+STATUS_DONE = "done"
+
+
+def find_sessions(root, exclude=None):
+    """返回 root 下全部会话目录 (排序)"""
+    exclude = os.path.abspath(exclude) if exclude else None
+    sessions = []
+    for directory, dirs, files in os.walk(root):
+        if exclude and os.path.abspath(directory).startswith(exclude):
+            dirs[:] = []
+            continue
+        if META_FILE in files and (EEG_FILE in files or EEG_CODEC_FILE in files):
+            sessions.append(directory)
+            dirs[:] = []  # 会话目录内不再有会话
+        dirs.sort()
+    return sorted(sessions)
+
+
+def fingerprint(directory):
+    """数据文件的大小与修改时间，变化时需重新处理"""
+    name = EEG_FILE if os.path.exists(os.path.join(directory, EEG_FILE)) else EEG_CODEC_FILE
+    stat = os.stat(os.path.join(directory, name))
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def checkpoint_path(out_dir, root, directory):
+    key = os.path.relpath(directory, root).replace(os.sep, "__")
+    return os.path.join(out_dir, "checkpoints", key + ".json")
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == CHECKPOINT_VERSION else None
+
+
+def save_checkpoint(path, state):
+    """先写临时文件再替换，避免中断时留下损坏的检查点"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class SessionAccumulator:
+    """单个会话的累加量 (可序列化到检查点)"""
+
+    ARRAYS = ("band_sum", "rel_sum", "line_sum", "total_sum", "var_sum", "flat", "clipped",
+              "ptp_hist", "index_sum")
+
+    def __init__(self, num_channels, bands):
+        self.bands = list(bands)
+        nb, nc = len(self.bands), num_channels
+        self.next_sample = 0
+        self.epochs = 0
+        self.band_sum = np.zeros((nb, nc))  # 各频段绝对功率之和
+        self.rel_sum = np.zeros((nb, nc))  # 各频段相对功率之和
+        self.line_sum = np.zeros(nc)  # 工频功率之和
+        self.total_sum = np.zeros(nc)  # 分析频段总功率之和
+        self.var_sum = np.zeros(nc)
+        self.flat = np.zeros(nc)
+        self.clipped = np.zeros(nc)
+        self.ptp_hist = np.zeros((nc, len(PTP_BINS) - 1))
+        self.index_sum = np.zeros(3)  # 放松度 / 专注度 / 疲劳度
+
+    def to_state(self):
+        state = {name: getattr(self, name).tolist() for name in self.ARRAYS}
+        state.update(next_sample=self.next_sample, epochs=self.epochs)
+        return state
+
+    @classmethod
+    def from_state(cls, state, num_channels, bands):
+        acc = cls(num_channels, bands)
+        acc.next_sample = state["next_sample"]
+        acc.epochs = state["epochs"]
+        for name in cls.ARRAYS:
+            setattr(acc, name, np.asarray(state[name], dtype=np.float64))
+        return acc
+
+
+def analyze_chunk(acc, analyzer, epochs):
+    """累加一块分段数据 (n_epochs, n_channels, epoch_samples) 的特征"""
+    powers = analyzer.compute(epochs)
+    band_powers = np.stack([powers[name] for name in acc.bands])  # (频段, 分段, 通道)
+    total = band_powers.sum(axis=0)
+    acc.band_sum += band_powers.sum(axis=1)
+    acc.rel_sum += (band_powers / np.maximum(total, 1e-12)).sum(axis=1)
+    acc.total_sum += total.sum(axis=0)
+    acc.line_sum += (powers["line50"] + powers["line60"]).sum(axis=0)
+
+    # 反馈指标与实时评分一致: 先跨通道平均频段功率，再计算比值
+    mean = band_powers.mean(axis=2)
+    index = {name: mean[i] for i, name in enumerate(acc.bands)}
+    acc.index_sum += feedback_indices(index["theta"], index["alpha"], index["beta"]).sum(axis=1)
+
+    std = epochs.std(axis=-1)
+    acc.var_sum += (std ** 2).sum(axis=0)
+    acc.flat += (std < FLAT_STD).sum(axis=0)
+    acc.clipped += (np.abs(epochs) >= CLIP_LEVEL).sum(axis=(0, 2))
+    log_ptp = np.log10(np.ptp(epochs, axis=-1) + 1.0)
+    for ch in range(epochs.shape[1]):
+        acc.ptp_hist[ch] += np.histogram(log_ptp[:, ch], PTP_BINS)[0]
+    acc.epochs += len(epochs)
+
+
+def artifact_fraction(hist):
+    """由 log10 峰峰值直方图估计超过 ARTIFACT_FACTOR × 中位数的分段比例"""
+    total = hist.sum()
+    if total == 0:
+        return 0.0
+    cumulative = np.cumsum(hist)
+    median_bin = int(np.searchsorted(cumulative, total / 2.0))
+    threshold = PTP_BINS[median_bin + 1] + np.log10(ARTIFACT_FACTOR)
+    above = PTP_BINS[1:] > threshold
+    return float(hist[above].sum() / total)
+
+
+def summarize(acc, reader, directory):
+    """由累加量生成会话汇总与通道汇总"""
+    meta = reader.meta
+    n = max(acc.epochs, 1)
+    names = meta.get("channel_names") or [f"Ch{i + 1}" for i in range(reader.num_channels)]
+    gaps = meta.get("gaps", [])
+    relaxation, focus, fatigue = (acc.index_sum / n).tolist()
+    channels = []
+    for ch, name in enumerate(names):
+        row = {"channel": name,
+               "rms": float(np.sqrt(acc.var_sum[ch] / n)),
+               "flat_fraction": float(acc.flat[ch] / n),
+               "clipped_fraction": float(acc.clipped[ch] / max(acc.next_sample, 1)),
+               "artifact_fraction": artifact_fraction(acc.ptp_hist[ch]),
+               "line_noise_ratio": float(acc.line_sum[ch] / max(acc.total_sum[ch], 1e-12))}
+        for i, band in enumerate(acc.bands):
+            row[f"{band}_power"] = float(acc.band_sum[i, ch] / n)
+            row[f"{band}_relative"] = float(acc.rel_sum[i, ch] / n)
+        channels.append(row)
+    session = {
+        "session": os.path.basename(directory),
+        "path": directory,
+        "device": meta.get("device", ""),
+        "start_time": meta.get("start_time", ""),
+        "sample_rate": reader.sample_rate,
+        "num_channels": reader.num_channels,
+        "duration_seconds": round(reader.duration, 3),
+        "epochs": acc.epochs,
+        "gaps": len(gaps),
+        "missing_samples": int(sum(g.get("missing_samples", 0) for g in gaps)),
+        "relaxation": round(relaxation, 2),
+        "focus": round(focus, 2),
+        "fatigue": round(fatigue, 2),
+    }
+    for key in ("rms", "flat_fraction", "clipped_fraction", "artifact_fraction", "line_noise_ratio"):
+        session[key] = float(np.mean([c[key] for c in channels])) if channels else 0.0
+    for band in acc.bands:
+        session[f"{band}_relative"] = float(np.mean([c[f"{band}_relative"] for c in channels]))
+    return session, channels
+
+
+def process_session(directory, checkpoint, epoch_seconds=2.0, chunk_seconds=60.0,
+                    checkpoint_every=10, force=False):
+    """
+    处理单个会话 (工作进程入口)，返回检查点状态 (含汇总)
+    检查点存在且未完成时从 next_sample 继续
+    """
+    started = time.perf_counter()
+    reader = SessionReader(directory)
+    bands = dict(BANDS, **LINE_BANDS)
+    epoch = max(1, int(round(epoch_seconds * reader.sample_rate)))
+    analyzer = BandPowerAnalyzer(reader.sample_rate, epoch, bands)
+    band_names = list(BANDS)
+
+    stamp = fingerprint(directory)
+    state = None if force else load_checkpoint(checkpoint)
+    options = {"epoch_seconds": epoch_seconds}
+    if state is not None and state["fingerprint"] == stamp and state["options"] == options:
+        if state["status"] == STATUS_DONE:
+            state["skipped"] = True
+            return state
+        acc = SessionAccumulator.from_state(state["accumulator"], reader.num_channels, band_names)
+    else:
+        acc = SessionAccumulator(reader.num_channels, band_names)
+
+    chunk = max(1, int(chunk_seconds * reader.sample_rate) // epoch) * epoch
+    usable = (reader.n_samples // epoch) * epoch
+    chunks = 0
+    resumed_from = acc.next_sample
+    while acc.next_sample < usable:
+        end = min(acc.next_sample + chunk, usable)
+        block = reader.read(acc.next_sample, end).astype(np.float64)  # 编码会话只解码本块范围
+        # (样本, 通道) → (分段, 通道, 分段样本)
+        epochs = block.reshape(-1, epoch, reader.num_channels).transpose(0, 2, 1)
+        analyze_chunk(acc, analyzer, epochs)
+        acc.next_sample = end
+        chunks += 1
+        if chunks % checkpoint_every == 0 and acc.next_sample < usable:
+            save_checkpoint(checkpoint, {"version": CHECKPOINT_VERSION, "status": STATUS_PARTIAL,
+                                         "fingerprint": stamp, "options": options,
+                                         "accumulator": acc.to_state()})
+
+    session, channels = summarize(acc, reader, directory)
+    elapsed = time.perf_counter() - started
+    processed = acc.next_sample - resumed_from
+    session["process_seconds"] = round(elapsed, 3)
+    state = {"version": CHECKPOINT_VERSION, "status": STATUS_DONE, "fingerprint": stamp,
+             "options": options, "accumulator": acc.to_state(),
+             "session": session, "channels": channels,
+             "processed_samples": processed, "resumed_from": resumed_from}
+    save_checkpoint(checkpoint, state)
+    return state
+
+
+def write_tables(out_dir, states):
+    """写出 sessions.csv 与 channels.csv"""
+    sessions = [s["session"] for s in states]
+    channel_rows = [dict(session=s["session"]["session"], **c) for s in states for c in s["channels"]]
+    paths = []
+    for name, rows in (("sessions.csv", sessions), ("channels.csv", channel_rows)):
+        if not rows:
+            continue
+        path = os.path.join(out_dir, name)
+        fields = list(rows[0])
+        for row in rows[1:]:
+            fields += [k for k in row if k not in fields]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+
+def update_catalog(path, states):
+    """将会话元数据与批处理特征登记到会话目录 (主进程单连接写入)"""
+    with SessionCatalog(path) as catalog:
+        for state in states:
+            directory = state["session"]["path"]
+            catalog.add_recording(directory)
+            catalog.add_analysis(state["session"], state["channels"])
+        return len(catalog)
+
+
+def run(root, out_dir=None, workers=None, epoch_seconds=2.0, chunk_seconds=60.0,
+        checkpoint_every=10, force=False, out=print, catalog=True):
+    """
+    批处理 root 下的全部会话，返回 (成功状态列表, 失败 [(目录, 错误)])
+    catalog 为 True 时登记到 <root>/catalog.sqlite，也可为目录文件路径，False 时不登记
+    """
+    out_dir = out_dir or os.path.join(root, "_batch")
+    os.makedirs(os.path.join(out_dir, "checkpoints"), exist_ok=True)
+    sessions = find_sessions(root, exclude=out_dir)
+    workers = workers or os.cpu_count() or 1
+    out(f"发现 {len(sessions)} 个会话, {workers} 个工作进程 → {out_dir}")
+
+    started = time.perf_counter()
+    states, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_session, directory, checkpoint_path(out_dir, root, directory),
+                        epoch_seconds, chunk_seconds, checkpoint_every, force): directory
+            for directory in sessions
+        }
+        for future in as_completed(futures):
+            directory = futures[future]
+            try:
+                state = future.result()
+            except Exception as e:
+                failures.append((directory, str(e)))
+                out(f"  ✗ {os.path.basename(directory)}: {e}")
+                continue
+            states.append(state)
+            session = state["session"]
+            if state.get("skipped"):
+                out(f"  - {session['session']}: 已完成，跳过")
+            else:
+                resumed = f" (从样本 {state['resumed_from']} 继续)" if state["resumed_from"] else ""
+                out(f"  ✓ {session['session']}: {session['duration_seconds'] / 60:.1f} 分钟, "
+                    f"{session['process_seconds']:.2f} 秒{resumed}")
+
+    elapsed = time.perf_counter() - started
+    states.sort(key=lambda s: s["session"]["path"])
+    for path in write_tables(out_dir, states):
+        out(f"汇总表: {path}")
+    if catalog:
+        path = os.path.join(root, CATALOG_FILE) if catalog is True else catalog
+        total = update_catalog(path, states)
+        out(f"会话目录: {path} (共 {total} 个会话)")
+    processed = [s for s in states if not s.get("skipped")]
+    samples = sum(s["processed_samples"] for s in processed)
+    hours = sum(s["processed_samples"] / s["session"]["sample_rate"] for s in processed) / 3600
+    out(f"处理 {len(processed)} 个会话 ({hours:.2f} 小时数据, {samples} 样本) 用时 {elapsed:.1f} 秒, "
+        f"吞吐 {samples / max(elapsed, 1e-9) / 1e6:.2f} M 样本/秒, "
+        f"{hours * 3600 / max(elapsed, 1e-9):.0f}× 实时; 失败 {len(failures)} 个")
+    return states, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="batch", description="批量计算录制会话的频段功率与质量指标")
+    parser.add_argument("root", help="录制目录 (递归查找会话)")
+    parser.add_argument("--out", default=None, help="输出目录 (默认 <录制目录>/_batch)")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数 (默认 CPU 核数)")
+    parser.add_argument("--epoch-seconds", type=float, default=2.0, help="分析分段长度 (秒)")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="每次读取的数据长度 (秒)")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="每处理多少块写一次检查点")
+    parser.add_argument("--force", action="store_true", help="忽略检查点重新处理")
+    parser.add_argument("--catalog", default=None, help=f"会话目录文件 (默认 <录制目录>/{CATALOG_FILE})")
+    parser.add_argument("--no-catalog", action="store_true", help="不登记到会话目录")
+    args = parser.parse_args(argv)
+
+    catalog = False if args.no_catalog else (args.catalog or True)
+    _, failures = run(args.root, args.out, args.workers, args.epoch_seconds, args.chunk_seconds,
+                      args.checkpoint_every, args.force, catalog=catalog)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
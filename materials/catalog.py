@@ -0,0 +1,295 @@
+"""
+catalog.py - 会话目录索引 (SQLite)
+功能说明：
+1. sessions 表每个会话一行: 路径、设备、协议、开始时间、时长、样本数、标记数、
+   数据间隙与丢失率，以及会话级汇总特征 (各频段功率/相对功率、RMS、质量比例、反馈指标)
+2. channels 表每会话每通道一行: 直流偏移、标准差与批处理得到的频段功率和质量指标
+3. 增量写入: 录制结束时由 meta.json 写入元数据与逐通道统计 (add_recording)，
+   批处理完成后补充频谱与质量特征 (add_analysis)；同一会话按路径合并，后写入的字段不覆盖其它来源
+4. 常用查询 (设备 + 时间、时长、频段功率) 均有索引，数千个会话的查询为毫秒级，无需打开会话文件
+
+用法:
+    python main.py catalog <录制目录> --index                 扫描并登记全部会话
+    python main.py catalog <录制目录> --device NV-BrainRF --where "alpha_power>100"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from recording import META_FILE
+from spectral import BANDS
+
+CATALOG_FILE = "catalog.sqlite"
+SCHEMA_VERSION = 1
+
+_BAND_COLUMNS = [f"{band}_{kind}" for band in BANDS for kind in ("power", "relative")]
+_QUALITY_COLUMNS = ["rms", "flat_fraction", "clipped_fraction", "artifact_fraction", "line_noise_ratio"]
+
+# 列名 -> SQL 类型 (查询条件只允许使用这些列名)
+SESSION_COLUMNS = dict(
+    [("name", "TEXT"), ("device", "TEXT"), ("profile", "TEXT"), ("start_time", "TEXT"),
+     ("sample_rate", "REAL"), ("num_channels", "INTEGER"), ("n_samples", "INTEGER"),
+     ("duration_seconds", "REAL"), ("n_markers", "INTEGER"), ("gaps", "INTEGER"),
+     ("missing_samples", "INTEGER"), ("loss_rate", "REAL"), ("epochs", "INTEGER"),
+     ("relaxation", "REAL"), ("focus", "REAL"), ("fatigue", "REAL")]
+    + [(c, "REAL") for c in _QUALITY_COLUMNS + _BAND_COLUMNS]
+    + [("recorded_at", "TEXT"), ("analyzed_at", "TEXT")]
+)
+CHANNEL_COLUMNS = dict(
+    [("mean", "REAL"), ("std", "REAL")]
+    + [(c, "REAL") for c in _QUALITY_COLUMNS + _BAND_COLUMNS]
+)
+
+_INDEXES = [
+    ("idx_sessions_device", "sessions(device, start_time)"),
+    ("idx_sessions_start", "sessions(start_time)"),
+    ("idx_sessions_duration", "sessions(duration_seconds)"),
+] + [(f"idx_sessions_{band}", f"sessions({band}_power)") for band in BANDS] + [
+    ("idx_channels_channel", "channels(channel, session_id)"),
+]
+
+_CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$")
+
+
+def parse_condition(text):
+    """'alpha_power>100' → ('alpha_power', '>', 100.0)"""
+    match = _CONDITION.match(text)
+    if not match:
+        raise ValueError(f"无法解析查询条件: {text}")
+    column, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return column, op, value
+
+
+class SessionCatalog:
+    """会话目录 (单个 SQLite 文件，WAL 模式，界面与批处理可同时写入)"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._create()
+
+    def _create(self):
+        session_columns = ", ".join(f"{name} {kind}" for name, kind in SESSION_COLUMNS.items())
+        channel_columns = ", ".join(f"{name} {kind}" for name, kind in CHANNEL_COLUMNS.items())
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS sessions ("
+                              f"id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, {session_columns})")
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS channels ("
+                              f"session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE, "
+                              f"channel TEXT NOT NULL, {channel_columns}, "
+                              f"PRIMARY KEY (session_id, channel)) WITHOUT ROWID")
+            for name, target in _INDEXES:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # 写入 ----------------------------------------------------
+    def _upsert_session(self, path, fields):
+        """按路径插入或更新会话行，只改写 fields 中的列，返回会话 id"""
+        fields = {k: v for k, v in fields.items() if k in SESSION_COLUMNS}
+        columns = ["path"] + list(fields)
+        updates = ", ".join(f"{c}=excluded.{c}" for c in fields) or "path=excluded.path"
+        self.conn.execute(
+            f"INSERT INTO sessions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(path) DO UPDATE SET {updates}",
+            [path] + list(fields.values()))
+        return self.conn.execute("SELECT id FROM sessions WHERE path=?", (path,)).fetchone()[0]
+
+    def _upsert_channels(self, session_id, rows):
+        """逐通道插入或更新 (rows 为 [{channel, 列...}])"""
+        for row in rows:
+            fields = {k: v for k, v in row.items() if k in CHANNEL_COLUMNS}
+            columns = ["session_id", "channel"] + list(fields)
+            updates = ", ".join(f"{c}=excluded.{c}" for c in fields) or "channel=excluded.channel"
+            self.conn.execute(
+                f"INSERT INTO channels ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(session_id, channel) DO UPDATE SET {updates}",
+                [session_id, row["channel"]] + list(fields.values()))
+
+    def add_recording(self, directory, meta=None):
+        """由会话元数据登记 (录制结束时调用)，返回会话 id"""
+        if meta is None:
+            with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        gaps = meta.get("gaps", [])
+        missing = int(sum(g.get("missing_samples", 0) for g in gaps))
+        n_samples = int(meta.get("n_samples", 0))
+        fields = {
+            "name": os.path.basename(os.path.normpath(directory)),
+            "device": meta.get("device", ""),
+            "profile": meta.get("profile"),
+            "start_time": meta.get("start_time"),
+            "sample_rate": meta.get("sample_rate"),
+            "num_channels": meta.get("num_channels"),
+            "n_samples": n_samples,
+            "duration_seconds": meta.get("duration_seconds"),
+            "n_markers": meta.get("n_markers", 0),
+            "gaps": len(gaps),
+            "missing_samples": missing,
+            "loss_rate": missing / max(n_samples + missing, 1),
+            "recorded_at": _now(),
+        }
+        names = meta.get("channel_names") or [f"Ch{i + 1}" for i in range(int(meta.get("num_channels", 0)))]
+        stats = meta.get("channel_stats", {})
+        channels = [{"channel": name, "mean": stats["mean"][i], "std": stats["std"][i]}
+                    for i, name in enumerate(names) if stats.get("mean")]
+        with self.conn:
+            session_id = self._upsert_session(os.path.abspath(directory), fields)
+            self._upsert_channels(session_id, channels)
+        return session_id
+
+    def add_analysis(self, session, channels):
+        """登记批处理结果 (batch.summarize 的会话汇总与通道汇总)，返回会话 id"""
+        fields = dict(session, analyzed_at=_now())
+        fields.pop("path", None)
+        fields["name"] = session["session"]
+        for band in BANDS:
+            values = [c[f"{band}_power"] for c in channels if f"{band}_power" in c]
+            if values:
+                fields[f"{band}_power"] = sum(values) / len(values)
+        directory = session["path"]
+        if "missing_samples" in session:
+            n_samples = int(round(session["duration_seconds"] * session["sample_rate"]))
+            fields["loss_rate"] = session["missing_samples"] / max(n_samples + session["missing_samples"], 1)
+        with self.conn:
+            session_id = self._upsert_session(os.path.abspath(directory), fields)
+            self._upsert_channels(session_id, channels)
+        return session_id
+
+    def remove_missing(self):
+        """删除会话目录已不存在的条目，返回删除数"""
+        gone = [row["path"] for row in self.conn.execute("SELECT path FROM sessions")
+                if not os.path.isdir(row["path"])]
+        with self.conn:
+            self.conn.executemany("DELETE FROM sessions WHERE path=?", [(p,) for p in gone])
+        return len(gone)
+
+    # 查询 ----------------------------------------------------
+    def query(self, device=None, since=None, until=None, min_duration=None, where=(), channel=None,
+              order="start_time", limit=None):
+        """
+        查询会话，返回 sqlite3.Row 列表
+        where: [(列名, 运算符, 值)]；给定 channel 时条件作用于该通道的 channels 列，
+        否则作用于 sessions 列 (会话级汇总)
+        """
+        table = "c" if channel is not None else "s"
+        allowed = CHANNEL_COLUMNS if channel is not None else SESSION_COLUMNS
+        clauses, params = [], []
+        if device is not None:
+            clauses.append("s.device = ?")
+            params.append(device)
+        if since is not None:
+            clauses.append("s.start_time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("s.start_time < ?")
+            params.append(until)
+        if min_duration is not None:
+            clauses.append("s.duration_seconds >= ?")
+            params.append(min_duration)
+        if channel is not None:
+            clauses.append("c.channel = ?")
+            params.append(channel)
+        for column, op, value in where:
+            if column not in allowed or op not in ("=", "!=", ">", ">=", "<", "<="):
+                raise ValueError(f"不支持的查询条件: {column} {op}")
+            clauses.append(f"{table}.{column} {op} ?")
+            params.append(value)
+        if order not in SESSION_COLUMNS:
+            raise ValueError(f"不支持的排序列: {order}")
+
+        sql = "SELECT s.*" + (", c.channel" if channel is not None else "") + " FROM sessions s"
+        if channel is not None:
+            sql += " JOIN channels c ON c.session_id = s.id"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY s.{order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self.conn.execute(sql, params).fetchall()
+
+    def channels(self, session_id):
+        """某会话的逐通道行"""
+        return self.conn.execute("SELECT * FROM channels WHERE session_id=?", (session_id,)).fetchall()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="catalog", description="会话目录索引: 登记与查询")
+    parser.add_argument("root", help="录制目录")
+    parser.add_argument("--db", default=None, help=f"目录文件 (默认 <录制目录>/{CATALOG_FILE})")
+    parser.add_argument("--index", action="store_true", help="扫描录制目录并登记全部会话的元数据")
+    parser.add_argument("--device", default=None, help="设备")
+    parser.add_argument("--since", default=None, help="开始时间下限 (ISO 格式，如 2025-11-01)")
+    parser.add_argument("--until", default=None, help="开始时间上限")
+    parser.add_argument("--min-duration", type=float, default=None, help="最短时长 (秒)")
+    parser.add_argument("--channel", default=None, help="条件作用于该通道 (默认会话级汇总)")
+    parser.add_argument("--where", action="append", default=[], metavar="列>值",
+                        help="特征条件，可重复，如 alpha_power>100、loss_rate<0.01")
+    parser.add_argument("--limit", type=int, default=None, help="最多返回条数")
+    args = parser.parse_args(argv)
+    try:
+        conditions = [parse_condition(c) for c in args.where]
+    except ValueError as e:
+        parser.error(str(e))
+
+    from batch import find_sessions
+
+    with SessionCatalog(args.db or os.path.join(args.root, CATALOG_FILE)) as catalog:
+        if args.index:
+            started = time.perf_counter()
+            sessions = find_sessions(args.root)
+            for directory in sessions:
+                catalog.add_recording(directory)
+            removed = catalog.remove_missing()
+            print(f"已登记 {len(sessions)} 个会话, 移除 {removed} 个已删除的会话, "
+                  f"用时 {time.perf_counter() - started:.2f} 秒")
+
+        started = time.perf_counter()
+        try:
+            rows = catalog.query(args.device, args.since, args.until, args.min_duration,
+                                 conditions, args.channel, limit=args.limit)
+        except ValueError as e:
+            parser.error(str(e))  # 未知列或运算符
+        elapsed = (time.perf_counter() - started) * 1000.0
+        for row in rows:
+            alpha = row["alpha_power"]
+            print(f"{row['name']:<28}{row['device'] or '--':<22}{row['start_time'] or '--':<25}"
+                  f"{(row['duration_seconds'] or 0) / 60:>8.1f} 分钟  丢失 {(row['loss_rate'] or 0) * 100:5.2f}%  "
+                  f"alpha {'--' if alpha is None else f'{alpha:.4g}'}")
+        print(f"共 {len(rows)} 条 / {len(catalog)} 个会话, 查询 {elapsed:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
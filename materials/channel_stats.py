@@ -0,0 +1,195 @@
+"""
+channel_stats.py - 逐通道在线统计 (Welford 累加器)
+功能说明：
+1. RunningStats 以 (样本数, 均值, 离差平方和 M2) 表示一组样本，数据块按 Chan 等人的
+   并行合并公式整块并入，每块代价 O(块长 × 通道数)，不保存历史样本；
+   相比 Σx、Σx² 的朴素累积，24 位原始值的大直流分量不会造成数值抵消
+2. 滑动窗口只保存各数据块的 (n, 均值, M2) 摘要，新块并入、过期块按合并公式的逆运算移出
+3. ChannelStatsStage 同时维护整段会话与滑动窗口两组统计，按固定间隔推送 ChannelStats:
+   均值 (直流偏移)、标准差、RMS、峰峰值 (窗口内) 与电极接触判定 (平坦 / 直流偏移过大)
+"""
+
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+# 接触判定 (原始计数): 窗口标准差低于 FLAT_STD 视为平坦 (导联脱落或短路)，
+# 直流偏移绝对值超过 DC_LIMIT 视为接触不良 / 接近饱和 (24 位满量程 8388607)
+FLAT_STD = 1.0
+DC_LIMIT = 4_000_000
+
+STATUS_OK = "正常"
+STATUS_FLAT = "平坦"
+STATUS_OFFSET = "偏移"
+
+
+class RunningStats:
+    """逐通道 Welford 累加器 (支持整块并入与移出)"""
+
+    def __init__(self, num_channels):
+        self.num_channels = num_channels
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = np.zeros(self.num_channels)
+        self.m2 = np.zeros(self.num_channels)
+
+    @staticmethod
+    def summarize(block):
+        """数据块 (n_samples, n_channels) 的 (n, 均值, M2) 摘要"""
+        n = len(block)
+        mean = block.mean(axis=0)
+        m2 = np.square(block - mean).sum(axis=0)
+        return n, mean, m2
+
+    def merge(self, n, mean, m2):
+        """并入一组摘要"""
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += m2 + delta * delta * (self.count * n / total)
+        self.count = total
+
+    def remove(self, n, mean, m2):
+        """移出此前并入的一组摘要 (merge 的逆运算)"""
+        remaining = self.count - n
+        if remaining <= 0:
+            self.reset()
+            return
+        old_mean = (self.mean * self.count - mean * n) / remaining
+        delta = mean - old_mean
+        self.m2 -= m2 + delta * delta * (remaining * n / self.count)
+        np.maximum(self.m2, 0.0, out=self.m2)  # 抵消舍入误差
+        self.mean = old_mean
+        self.count = remaining
+
+    def add(self, block):
+        self.merge(*self.summarize(block))
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return np.zeros(self.num_channels)
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def rms(self):
+        """均方根 (含直流分量): sqrt(均值² + 方差)"""
+        return np.sqrt(self.mean * self.mean + self.variance)
+
+
+class SlidingStats(RunningStats):
+    """最近 window_samples 个样本的统计 (按块滑动，窗口长度以块为粒度)"""
+
+    def __init__(self, num_channels, window_samples):
+        self.window_samples = window_samples
+        self._blocks = deque()
+        super().__init__(num_channels)
+
+    def reset(self):
+        super().reset()
+        self._blocks.clear()
+        self.minimum = None  # 窗口内各块极值 (峰峰值)
+        self.maximum = None
+
+    def add(self, block, summary=None):
+        """并入数据块；summary 为已算好的 summarize(block) 时不重复计算"""
+        summary = self.summarize(block) if summary is None else summary
+        self.merge(*summary)
+        self._blocks.append((summary, block.min(axis=0), block.max(axis=0)))
+        while self._blocks and self.count - self._blocks[0][0][0] >= self.window_samples:
+            old, _, _ = self._blocks.popleft()
+            self.remove(*old)
+        self.minimum = None
+        self.maximum = None
+
+    @property
+    def peak_to_peak(self):
+        if not self._blocks:
+            return np.zeros(self.num_channels)
+        if self.minimum is None:
+            self.minimum = np.min([b[1] for b in self._blocks], axis=0)
+            self.maximum = np.max([b[2] for b in self._blocks], axis=0)
+        return self.maximum - self.minimum
+
+
+class ChannelStats:
+    """一次统计输出 (各字段为长度 n_channels 的数组)"""
+
+    __slots__ = ("timestamp", "session_samples", "session_mean", "session_std",
+                 "mean", "std", "rms", "peak_to_peak", "status")
+
+    def __init__(self, timestamp, session, window):
+        self.timestamp = timestamp
+        self.session_samples = session.count
+        self.session_mean = session.mean.copy()
+        self.session_std = session.std
+        self.mean = window.mean.copy()
+        self.std = window.std
+        self.rms = window.rms
+        self.peak_to_peak = window.peak_to_peak
+        self.status = [contact_status(m, s) for m, s in zip(self.mean.tolist(), self.std.tolist())]
+
+    def rows(self, channel_names):
+        """[(通道名, 直流偏移, 标准差, RMS, 峰峰值, 状态)]，供状态表显示"""
+        return list(zip(channel_names, self.mean.tolist(), self.std.tolist(), self.rms.tolist(),
+                        self.peak_to_peak.tolist(), self.status))
+
+
+def contact_status(mean, std, flat_std=FLAT_STD, dc_limit=DC_LIMIT):
+    if not math.isfinite(std) or std < flat_std:
+        return STATUS_FLAT
+    if abs(mean) > dc_limit:
+        return STATUS_OFFSET
+    return STATUS_OK
+
+
+class ChannelStatsStage:
+    """整段会话 + 滑动窗口统计，按固定间隔推送 ChannelStats"""
+
+    def __init__(self, stream_info, window_seconds=2.0, emit_seconds=0.5):
+        self.stream_info = stream_info
+        self.session = RunningStats(stream_info.num_channels)
+        self.window = SlidingStats(stream_info.num_channels, stream_info.samples(window_seconds))
+        self.emit_samples = stream_info.samples(emit_seconds)
+        self._since_emit = 0
+        self._subscribers = []
+        self.latest = None
+
+    def subscribe(self, callback):
+        """订阅统计流, callback(ChannelStats)"""
+        self._subscribers.append(callback)
+
+    def reset(self):
+        self.session.reset()
+        self.window.reset()
+        self._since_emit = 0
+        self.latest = None
+
+    def push(self, block):
+        """输入一个数据块，达到输出间隔时返回 ChannelStats，否则返回 None"""
+        if len(block) == 0:
+            return None
+        block = np.asarray(block, dtype=np.float64)
+        summary = RunningStats.summarize(block)
+        self.session.merge(*summary)
+        self.window.add(block, summary)
+        self._since_emit += len(block)
+        if self._since_emit < self.emit_samples:
+            return None
+
+        self._since_emit = 0
+        result = ChannelStats(time.monotonic(), self.session, self.window)
+        self.latest = result
+        for callback in list(self._subscribers):
+            callback(result)
+        return result
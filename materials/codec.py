@@ -0,0 +1,384 @@
+"""
+codec.py - 脑电无损块编码 (差分预测 + zigzag + 位打包 / Rice 编码)
+功能说明：
+1. 每个数据块 (n_samples, n_channels) 的整数样本逐通道编码，相邻样本差值很小，
+   24 位原始值经预测后通常只需 6~10 位
+2. 预测: 每通道在 0/1/2 阶差分中选残差绝对值和最小者 (0 阶适合白噪声样数据)，
+   前 order 个残差 (起始值) 单独以 int64 保存
+3. zigzag 将有符号残差映射为无符号数，再在两种熵编码中选较小者:
+   - 位打包: 以残差最大位宽定长打包
+   - Rice:   按最优参数 k 分为一元商与 k 位余数，两部分分别成流，
+             解码时由一元流中 0 的位置一次求出全部商，无逐值循环
+4. 阶数与编码参数对全部通道一次向量化选择，位流的打包/解包为整块 NumPy 运算，
+   只在通道维上循环
+5. 容器格式: 每块一个头 (魔数、样本数、通道数、负载字节数)，可顺序追加与按块随机访问；
+   录制器 (recording.py) 与网络发布 (BlockPublisher) 共用
+6. 基准: python main.py codec [会话目录]，与 zlib 比较压缩比及编码/解码吞吐
+
+块内每通道格式: order(u1) mode(u1) param(u1) | order × int64 起始值 | u4 负载长度 | 负载
+Rice 负载: u4 一元流比特数 | 一元流 | 余数流
+"""
+
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b"EGC1"
+BLOCK_HEADER = struct.Struct("<4sIHI")  # 魔数, 样本数, 通道数, 负载字节数
+CHANNEL_HEADER = struct.Struct("<BBB")  # 预测阶数, 编码方式, 位宽或 Rice 参数
+LENGTH = struct.Struct("<I")
+
+MODE_PACKED = 0
+MODE_RICE = 1
+ORDERS = (0, 1, 2)
+
+
+class CodecError(ValueError):
+    """数据无法编码或编码流损坏"""
+
+
+# 位级工具 --------------------------------------------------------
+def _pack_bits(values, width):
+    """无符号值数组以定长 width 位打包 (高位在前)"""
+    if width == 0 or len(values) == 0:
+        return b""
+    # 每个值展开为 64 位 (大端字节序)，只保留低 width 位后整体打包
+    bits = np.unpackbits(values.astype(">u8").view(np.uint8).reshape(-1, 8), axis=1)
+    return np.packbits(bits[:, 64 - width:]).tobytes()
+
+
+def _unpack_bits(buffer, count, width):
+    if width == 0 or count == 0:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), count=count * width)
+    full = np.zeros((count, 64), dtype=np.uint8)
+    full[:, 64 - width:] = bits.reshape(count, width)
+    return np.packbits(full, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def zigzag(residuals):
+    """int64 → uint64: 0, -1, 1, -2, ... → 0, 1, 2, 3, ..."""
+    r = residuals.astype(np.int64)
+    return ((r << 1) ^ (r >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    v = values.view(np.int64)
+    return (values >> np.uint64(1)).view(np.int64) ^ -(v & 1)
+
+
+def _integrate(r, order):
+    for _ in range(order):
+        r = np.cumsum(r, axis=0)
+    return r
+
+
+def _plan(data):
+    """
+    为全部通道一次性选择预测阶数与编码方式
+    返回 (阶数, zigzag 值, 残差, 位宽, Rice 参数, 是否用 Rice)，前两个数组为 (n, C)，其余为 (C,)；
+    zigzag 值的前 order 行 (起始值) 置 0
+    """
+    n, channels = data.shape
+    candidates = [data]
+    for _ in ORDERS[1:]:
+        candidates.append(np.diff(candidates[-1], axis=0, prepend=0))
+    stacked = np.stack(candidates)  # (阶数, n, C)
+    rows = np.arange(n)[None, :, None]
+    orders = np.array(ORDERS)[:, None, None]
+    costs = np.where(rows >= orders, np.abs(stacked), 0).sum(axis=1)  # 起始值不计入
+    costs[np.array(ORDERS) > n] = np.iinfo(np.int64).max
+    order = np.argmin(costs, axis=0)  # (C,)
+    residuals = np.take_along_axis(stacked, order[None, None, :], axis=0)[0]
+
+    values = zigzag(residuals)
+    values[rows[0] < order[None, :]] = 0  # 起始值单独保存，不参与熵编码
+    count = (n - order).astype(np.uint64)
+    width = np.array([int(v).bit_length() for v in values.max(axis=0, initial=0).tolist()])
+    # 最优 Rice 参数在 log2(均值) 附近，只比较相邻的三个候选
+    mean = values.sum(axis=0, dtype=np.float64) / np.maximum(count, 1)
+    center = np.floor(np.log2(np.maximum(mean, 1.0))).astype(np.int64)
+    candidates = np.clip(center[None, :] + np.arange(-1, 2)[:, None], 0, 32).astype(np.uint64)  # (3, C)
+    rice = (values[None] >> candidates[:, None, :]).sum(axis=1, dtype=np.uint64) \
+        + count[None, :] * (candidates + np.uint64(1))
+    best = np.argmin(rice, axis=0)
+    k = candidates[best, np.arange(channels)]
+    use_rice = rice[best, np.arange(channels)] < count * width.astype(np.uint64)
+    return order, values, residuals, width, k, use_rice
+
+
+def _encode_channel(values, residuals, order, width, k, use_rice):
+    seeds = residuals[:order].astype("<i8").tobytes()
+    values = values[order:]
+    if not use_rice:
+        payload = _pack_bits(values, width)
+        head = CHANNEL_HEADER.pack(order, MODE_PACKED, width)
+    else:
+        quotients = values >> np.uint64(k)
+        unary_bits = int(quotients.sum()) + len(values)
+        unary = np.ones(unary_bits, dtype=np.uint8)
+        unary[np.cumsum(quotients + np.uint64(1)).astype(np.int64) - 1] = 0  # 每个商以 0 结束
+        remainders = values & np.uint64((1 << k) - 1)
+        payload = LENGTH.pack(unary_bits) + np.packbits(unary).tobytes() + _pack_bits(remainders, k)
+        head = CHANNEL_HEADER.pack(order, MODE_RICE, k)
+    return head + seeds + LENGTH.pack(len(payload)) + payload
+
+
+def _decode_channel(buffer, offset, n):
+    order, mode, param = CHANNEL_HEADER.unpack_from(buffer, offset)
+    offset += CHANNEL_HEADER.size
+    if order not in ORDERS or order > n:
+        raise CodecError(f"无效的预测阶数 {order}")
+    seeds = np.frombuffer(buffer, dtype="<i8", count=order, offset=offset).astype(np.int64)
+    offset += 8 * order
+    (length,) = LENGTH.unpack_from(buffer, offset)
+    offset += LENGTH.size
+    payload = buffer[offset:offset + length]
+    count = n - order
+    if mode == MODE_PACKED:
+        values = _unpack_bits(payload, count, param)
+    elif mode == MODE_RICE:
+        (unary_bits,) = LENGTH.unpack_from(payload, 0)
+        unary_bytes = (unary_bits + 7) // 8
+        unary = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=unary_bytes, offset=LENGTH.size),
+                              count=unary_bits)
+        ends = np.flatnonzero(unary == 0)
+        if len(ends) != count:
+            raise CodecError("Rice 一元流长度不符")
+        quotients = np.diff(ends, prepend=-1).astype(np.uint64) - np.uint64(1)
+        remainders = _unpack_bits(payload[LENGTH.size + unary_bytes:], count, param)
+        values = (quotients << np.uint64(param)) | remainders
+    else:
+        raise CodecError(f"未知编码方式 {mode}")
+    return _integrate(np.concatenate([seeds, unzigzag(values)]), order), offset + length
+
+
+# 数据块 ----------------------------------------------------------
+def to_integers(block):
+    """浮点样本转为 int64，非整数值 (无法无损编码) 时抛出 CodecError"""
+    block = np.asarray(block)
+    if block.dtype.kind in "iu":
+        return block.astype(np.int64)
+    ints = np.rint(block).astype(np.int64)
+    if not np.array_equal(ints, block):
+        raise CodecError("样本含非整数值，无法无损编码")
+    return ints
+
+
+def encode_block(block):
+    """编码数据块 (n_samples, n_channels) 整数值样本，返回 bytes (含块头)"""
+    data = to_integers(block)
+    if data.ndim != 2:
+        raise CodecError("数据块应为 (n_samples, n_channels)")
+    n, channels = data.shape
+    if n == 0:
+        return BLOCK_HEADER.pack(MAGIC, 0, channels, 0)
+    order, values, residuals, width, k, use_rice = _plan(data)
+    values, residuals = values.T.copy(), residuals.T.copy()  # 逐通道连续
+    body = b"".join(_encode_channel(values[ch], residuals[ch], int(order[ch]), int(width[ch]),
+                                    int(k[ch]), bool(use_rice[ch])) for ch in range(channels))
+    return BLOCK_HEADER.pack(MAGIC, n, channels, len(body)) + body
+
+
+def read_header(buffer, offset=0):
+    """解析块头，返回 (样本数, 通道数, 负载字节数)"""
+    magic, n, channels, length = BLOCK_HEADER.unpack_from(buffer, offset)
+    if magic != MAGIC:
+        raise CodecError("块头魔数不符")
+    return n, channels, length
+
+
+def decode_block(buffer, offset=0):
+    """解码一个块，返回 ((n_samples, n_channels) int64, 下一块的偏移)"""
+    buffer = memoryview(buffer)
+    n, channels, length = read_header(buffer, offset)
+    position = offset + BLOCK_HEADER.size
+    if n == 0:
+        return np.empty((0, channels), dtype=np.int64), position + length
+    out = np.empty((channels, n), dtype=np.int64)
+    for ch in range(channels):
+        out[ch], position = _decode_channel(buffer, position, n)
+    if position != offset + BLOCK_HEADER.size + length:
+        raise CodecError("块负载长度不符")
+    return out.T, position
+
+
+def iter_blocks(buffer):
+    """依次解码连续存放的多个块"""
+    offset = 0
+    while offset < len(buffer):
+        block, offset = decode_block(buffer, offset)
+        yield block
+
+
+def scan_index(f):
+    """
+    扫描编码文件的块头 (不读取负载)，返回 [(文件偏移, 起始样本, 样本数)]
+    录制中断导致的末尾不完整块不计入
+    """
+    size = os.fstat(f.fileno()).st_size
+    index = []
+    start = 0
+    while True:
+        offset = f.tell()
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            break
+        n, _, length = read_header(header)
+        if offset + BLOCK_HEADER.size + length > size:
+            break
+        index.append((offset, start, n))
+        start += n
+        f.seek(length, 1)
+    return index
+
+
+# 网络发布 --------------------------------------------------------
+class BlockPublisher:
+    """
+    将数据块编码后通过 UDP 发送 (可作为数据块订阅回调)
+    数据块先累积到 flush_samples 个样本再编码一次，每个数据报为 u4 起始样本序号 + 一个编码块
+    """
+
+    SEQUENCE = struct.Struct("<I")
+
+    def __init__(self, host="127.0.0.1", port=9872, flush_samples=25, max_datagram=60000):
+        self.address = (host, port)
+        self.flush_samples = flush_samples
+        self.max_datagram = max_datagram
+        self.samples_sent = 0
+        self.bytes_sent = 0
+        self.raw_bytes = 0
+        self.errors = 0
+        self._pending = []
+        self._pending_samples = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def __call__(self, block):
+        self._pending.append(block)
+        self._pending_samples += len(block)
+        if self._pending_samples >= self.flush_samples:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        block = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending.clear()
+        self._pending_samples = 0
+        try:
+            datagram = self.SEQUENCE.pack(self.samples_sent & 0xFFFFFFFF) + encode_block(block)
+            if len(datagram) > self.max_datagram:
+                raise CodecError(f"编码块 {len(datagram)} 字节超过数据报上限")
+            self._sock.sendto(datagram, self.address)
+            self.bytes_sent += len(datagram)
+        except (OSError, CodecError):
+            self.errors += 1  # 网络输出不可影响采集
+        self.samples_sent += len(block)
+        self.raw_bytes += block.size * 3
+
+    @classmethod
+    def parse(cls, datagram):
+        """接收端: 返回 (起始样本序号, (n_samples, n_channels) int64)"""
+        (sequence,) = cls.SEQUENCE.unpack_from(datagram, 0)
+        block, _ = decode_block(datagram, cls.SEQUENCE.size)
+        return sequence, block
+
+    @property
+    def ratio(self):
+        """相对 24 位原始样本的压缩比"""
+        return self.raw_bytes / self.bytes_sent if self.bytes_sent else 0.0
+
+    def close(self):
+        self.flush()
+        self._sock.close()
+
+
+# 基准 ------------------------------------------------------------
+def synthetic_eeg(n_samples, n_channels, sample_rate=250.0, seed=0):
+    """合成脑电 (1/f 背景 + alpha 节律 + 直流偏移)，原始计数"""
+    rng = np.random.default_rng(seed)
+    white = rng.normal(0, 1, (n_samples, n_channels))
+    spectrum = np.fft.rfft(white, axis=0)
+    freqs = np.fft.rfftfreq(n_samples, 1.0 / sample_rate)
+    spectrum /= np.sqrt(np.maximum(freqs, 0.5))[:, None]
+    background = np.fft.irfft(spectrum, n_samples, axis=0)
+    background *= 400.0 / background.std()
+    t = np.arange(n_samples)[:, None] / sample_rate
+    alpha = 300.0 * np.sin(2 * np.pi * 10.0 * t + np.arange(n_channels))
+    offset = rng.integers(-200000, 200000, n_channels)
+    return np.rint(background + alpha + offset + rng.normal(0, 20, (n_samples, n_channels))).astype(np.int64)
+
+
+def _int24_bytes(data):
+    """按帧内布局交错的 24 位大端字节 (与设备帧中的 EEG 字段一致)"""
+    u = (data.astype(np.int64) & 0xFFFFFF).astype(np.uint32)
+    out = np.empty(data.shape + (3,), dtype=np.uint8)
+    out[..., 0], out[..., 1], out[..., 2] = u >> 16, (u >> 8) & 0xFF, u & 0xFF
+    return out.tobytes()
+
+
+def benchmark(data, block_samples=1024, repeat=3, out=print):
+    """比较本编码与 zlib (24 位交错字节与 float32) 的压缩比与吞吐，返回结果字典"""
+    raw = _int24_bytes(data)
+    raw_mb = len(raw) / 1e6
+    blocks = [data[i:i + block_samples] for i in range(0, len(data), block_samples)]
+    float_bytes = data.astype(np.float32).tobytes()
+
+    def timed(function):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    results = {}
+    encoded, t_enc = timed(lambda: [encode_block(b) for b in blocks])
+    decoded, t_dec = timed(lambda: [decode_block(e)[0] for e in encoded])
+    if not np.array_equal(np.concatenate(decoded), data):
+        raise CodecError("基准解码结果与原始数据不一致")
+    results["egc"] = (sum(map(len, encoded)), t_enc, t_dec)
+    for name, source in (("zlib-int24", raw), ("zlib-float32", float_bytes)):
+        chunk = block_samples * data.shape[1] * (3 if name == "zlib-int24" else 4)
+        parts = [source[i:i + chunk] for i in range(0, len(source), chunk)]
+        compressed, t_enc = timed(lambda: [zlib.compress(p, 6) for p in parts])
+        _, t_dec = timed(lambda: [zlib.decompress(c) for c in compressed])
+        results[name] = (sum(map(len, compressed)), t_enc, t_dec)
+
+    out(f"{len(data)} 样本 × {data.shape[1]} 通道, 24 位原始 {raw_mb:.2f} MB, 每块 {block_samples} 样本")
+    out(f"{'方法':<14}{'压缩比':>8}{'位/样本':>9}{'编码 MB/s':>12}{'解码 MB/s':>12}")
+    for name, (size, t_enc, t_dec) in results.items():
+        out(f"{name:<14}{len(raw) / size:>8.2f}{size * 8 / data.size:>9.2f}"
+            f"{raw_mb / t_enc:>12.1f}{raw_mb / t_dec:>12.1f}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="codec", description="无损编码基准 (与 zlib 比较)")
+    parser.add_argument("directory", nargs="?", help="会话目录 (默认使用合成数据)")
+    parser.add_argument("--seconds", type=float, default=600.0, help="测试数据长度 (秒)")
+    parser.add_argument("--block", type=int, default=1024, help="每块样本数")
+    args = parser.parse_args(argv)
+
+    if args.directory:
+        from recording import SessionReader
+
+        reader = SessionReader(args.directory)
+        data = to_integers(reader.read(0, int(args.seconds * reader.sample_rate)))
+    else:
+        data = synthetic_eeg(int(args.seconds * 250), 8)
+    benchmark(data, args.block)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+commands.py - 串行化 BLE 命令队列与命令延迟统计
+功能说明：
+1. 同一设备的所有写入命令经 CommandQueue 逐条执行，按钮与控制台并发触发也不会交错
+2. 命令可声明期望结果: EXPECT_DATA (之后应有数据) / EXPECT_SILENCE (之后数据应停止)，
+   以事件等待代替固定 sleep，满足条件即返回；EXPECT_DATA 只由 (重新) 订阅之后到达的通知确认，
+   旧订阅残留的通知不计入
+3. 记录每条命令的排队、写入与确认耗时 (如启动命令到首个数据的实际延迟)
+4. CommandStats 按命令名汇总次数、未确认、失败与延迟分位数
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+EXPECT_DATA = "data"
+EXPECT_SILENCE = "silence"
+
+
+class CommandResult:
+    """一条命令的执行记录 (时刻均为 time.monotonic 秒)"""
+
+    __slots__ = ("name", "command", "expect", "queued_at", "sent_at", "written_at",
+                 "confirmed_at", "ok", "error")
+
+    def __init__(self, name, command, expect, queued_at):
+        self.name = name
+        self.command = command
+        self.expect = expect
+        self.queued_at = queued_at
+        self.sent_at = None
+        self.written_at = None
+        self.confirmed_at = None
+        self.ok = False
+        self.error = None
+
+    @property
+    def queue_ms(self):
+        """排队等待时长"""
+        return None if self.sent_at is None else (self.sent_at - self.queued_at) * 1000.0
+
+    @property
+    def write_ms(self):
+        """GATT 写入耗时"""
+        return None if self.written_at is None else (self.written_at - self.sent_at) * 1000.0
+
+    @property
+    def latency_ms(self):
+        """发送到确认的时长: 首个数据到达 / 最后一个数据到达 / 写入完成"""
+        return None if self.confirmed_at is None else (self.confirmed_at - self.sent_at) * 1000.0
+
+    def __repr__(self):
+        if self.error:
+            return f"{self.name}: 失败 ({self.error})"
+        if not self.ok:
+            return f"{self.name}: 未确认 (写入 {self.write_ms:.1f} ms)"
+        return f"{self.name}: {self.latency_ms:.1f} ms (排队 {self.queue_ms:.1f} ms)"
+
+
+class CommandStats:
+    """按命令名汇总执行结果，每个命令只保留最近 history 条延迟"""
+
+    def __init__(self, history=256):
+        self.history = history
+        self._latencies = {}
+        self._counts = {}
+
+    def record(self, result):
+        counts = self._counts.setdefault(result.name, {"count": 0, "unconfirmed": 0, "failed": 0})
+        counts["count"] += 1
+        if result.error:
+            counts["failed"] += 1
+        elif not result.ok:
+            counts["unconfirmed"] += 1
+        else:
+            self._latencies.setdefault(result.name, deque(maxlen=self.history)).append(result.latency_ms)
+
+    def summary(self):
+        """{命令名: {count, unconfirmed, failed, last_ms, p50_ms, p95_ms, max_ms}}"""
+        result = {}
+        for name, counts in self._counts.items():
+            entry = dict(counts)
+            latencies = self._latencies.get(name)
+            if latencies:
+                values = np.fromiter(latencies, dtype=np.float64)
+                p50, p95 = np.percentile(values, [50, 95])
+                entry.update(last_ms=round(latencies[-1], 2), p50_ms=round(float(p50), 2),
+                             p95_ms=round(float(p95), 2), max_ms=round(float(values.max()), 2))
+            result[name] = entry
+        return result
+
+
+class CommandQueue:
+    """
+    单设备命令队列
+
+    write 为异步写入函数 write(bytes)；数据回调中调用 notify_data(now) 供确认使用，
+    每次 (重新) 订阅通知完成后调用 mark_subscribed(now)
+    """
+
+    def __init__(self, write, confirm_timeout=2.0, silence_seconds=0.3, stats=None):
+        self.write = write
+        self.confirm_timeout = confirm_timeout
+        self.silence_seconds = silence_seconds
+        self.stats = stats or CommandStats()
+        self.last_result = None
+        self.pending = 0
+        self._lock = asyncio.Lock()
+        self._data_event = asyncio.Event()
+        self._waiting = False
+        self._last_data = None
+        self._subscribed_at = None
+
+    def mark_subscribed(self, now):
+        """订阅完成时刻: 此前到达的通知来自旧订阅，不再用于确认"""
+        self._subscribed_at = now
+        self._data_event.clear()
+
+    def notify_data(self, now):
+        """数据回调中调用 - 仅在有命令等待确认、且通知到达于订阅之后时触发事件"""
+        self._last_data = now
+        if self._waiting and (self._subscribed_at is None or now >= self._subscribed_at):
+            self._data_event.set()
+
+    async def submit(self, command, expect=None, name=None, timeout=None):
+        """排队执行一条命令，返回 CommandResult (写入异常记录在 error 中，不向上抛出)"""
+        if isinstance(command, str):
+            command = command.encode()
+        result = CommandResult(name or command.decode(errors="replace"), command, expect, time.monotonic())
+        self.pending += 1
+        try:
+            async with self._lock:
+                await self._execute(result, self.confirm_timeout if timeout is None else timeout)
+        finally:
+            self.pending -= 1
+        self.last_result = result
+        self.stats.record(result)
+        return result
+
+    async def _execute(self, result, timeout):
+        self._data_event.clear()
+        self._waiting = result.expect is not None
+        try:
+            result.sent_at = time.monotonic()
+            try:
+                await self.write(result.command)
+            except Exception as e:
+                result.error = str(e)
+                return
+            result.written_at = time.monotonic()
+
+            if result.expect == EXPECT_DATA:
+                await self._wait_data(result, timeout)
+            elif result.expect == EXPECT_SILENCE:
+                await self._wait_silence(result, timeout)
+            else:
+                result.confirmed_at = result.written_at
+                result.ok = True
+        finally:
+            self._waiting = False
+
+    async def _wait_data(self, result, timeout):
+        """等待命令发出后的首个数据 (事件在写入前清除，写入期间到达的数据同样计入)"""
+        if not self._data_event.is_set():
+            try:
+                await asyncio.wait_for(self._data_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+        result.confirmed_at = self._last_data
+        result.ok = True
+
+    async def _wait_silence(self, result, timeout):
+        """等待数据停止: 连续 silence_seconds 无数据即确认，确认时刻为最后一个数据到达时刻"""
+        deadline = result.sent_at + timeout
+        while True:
+            self._data_event.clear()
+            if deadline - time.monotonic() < self.silence_seconds:
+                return  # 超时前已无法确认静默
+            try:
+                await asyncio.wait_for(self._data_event.wait(), self.silence_seconds)
+            except asyncio.TimeoutError:
+                break
+        last = self._last_data
+        result.confirmed_at = max(result.sent_at, last) if last is not None else result.written_at
+        result.ok = True
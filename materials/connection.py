@@ -0,0 +1,157 @@
+"""
+connection.py - BLE 连接监督状态机
+功能说明：
+1. LinkSupervisor 维护连接状态: 空闲 → 连接中 → 已连接 → (意外断开) → 重连中 → 已连接 / 失败
+2. 意外断开后按有上限的指数退避重连，用户主动断开时不重连
+3. GattHandleCache 缓存写入/通知特征句柄，重连后直接按句柄订阅与写入，跳过服务枚举
+4. 断开到首个数据到达之间的间隙记录为 StreamGap，可写入会话时间线
+"""
+
+import time
+from collections import deque
+
+# 连接状态
+STATE_IDLE = "idle"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_RECONNECTING = "reconnecting"
+STATE_CLOSING = "closing"
+STATE_FAILED = "failed"
+
+STATE_NAMES = {
+    STATE_IDLE: "空闲",
+    STATE_CONNECTING: "连接中",
+    STATE_CONNECTED: "已连接",
+    STATE_RECONNECTING: "重连中",
+    STATE_CLOSING: "断开中",
+    STATE_FAILED: "重连失败",
+}
+
+
+class ExponentialBackoff:
+    """有上限的指数退避: initial, initial*factor, ... 不超过 maximum，最多 max_attempts 次"""
+
+    def __init__(self, initial=0.05, factor=2.0, maximum=2.0, max_attempts=12):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.max_attempts = max_attempts
+
+    def delays(self):
+        """依次产生每次重连前的等待时长 (秒)"""
+        delay = self.initial
+        for _ in range(self.max_attempts):
+            yield delay
+            delay = min(self.maximum, delay * self.factor)
+
+
+class GattHandleCache:
+    """特征句柄缓存 - 首次连接时记录，重连后按句柄直接解析"""
+
+    def __init__(self):
+        self.address = None
+        self.write_handle = None
+        self.notify_handle = None
+
+    @property
+    def valid(self):
+        return self.write_handle is not None and self.notify_handle is not None
+
+    def store(self, address, write_char, notify_char):
+        """记录特征句柄"""
+        self.address = address
+        self.write_handle = write_char.handle
+        self.notify_handle = notify_char.handle
+
+    def resolve(self, client):
+        """按句柄从已连接的客户端取回特征对象，句柄失效时返回 (None, None)"""
+        services = client.services
+        if services is None or not self.valid:
+            return None, None
+        return (services.get_characteristic(self.write_handle),
+                services.get_characteristic(self.notify_handle))
+
+    def clear(self):
+        self.address = None
+        self.write_handle = None
+        self.notify_handle = None
+
+
+class StreamGap:
+    """一次数据中断: 断开时已接收的样本数、断开/恢复时刻与估计丢失的样本数"""
+
+    __slots__ = ("start_sample", "drop_time", "resume_time", "missing_samples")
+
+    def __init__(self, start_sample, drop_time):
+        self.start_sample = start_sample
+        self.drop_time = drop_time
+        self.resume_time = None
+        self.missing_samples = 0
+
+    @property
+    def duration(self):
+        """断开到恢复数据的时长 (秒)"""
+        return (self.resume_time or time.monotonic()) - self.drop_time
+
+    def close(self, resume_time, sample_rate=None):
+        """数据恢复时调用，按采样率估计丢失样本数"""
+        self.resume_time = resume_time
+        if sample_rate:
+            self.missing_samples = int(round(self.duration * sample_rate))
+
+    def as_dict(self):
+        return {
+            "start_sample": self.start_sample,
+            "duration_seconds": round(self.duration, 4),
+            "missing_samples": self.missing_samples,
+        }
+
+
+class LinkSupervisor:
+    """连接状态机 - 只记录状态与间隙，具体 BLE 操作由客户端执行"""
+
+    def __init__(self, backoff=None):
+        self.backoff = backoff or ExponentialBackoff()
+        self.state = STATE_IDLE
+        self.handles = GattHandleCache()
+        self.auto_reconnect = True
+        self.pending_gap = None
+        self.gaps = deque(maxlen=256)  # 仅保留最近的间隙记录
+        self.reconnects = 0
+        self.last_recovery_seconds = None
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """订阅状态变化, callback(旧状态, 新状态)"""
+        self._listeners.append(callback)
+
+    def transition(self, state):
+        """切换状态并通知订阅者"""
+        if state == self.state:
+            return
+        old, self.state = self.state, state
+        for callback in list(self._listeners):
+            callback(old, state)
+
+    def should_reconnect(self):
+        """意外断开时是否需要重连 (用户主动断开或未建立过连接时不重连)"""
+        return (self.auto_reconnect and self.handles.valid
+                and self.state in (STATE_CONNECTED, STATE_RECONNECTING))
+
+    def on_drop(self, samples_received, now=None):
+        """记录意外断开，返回新开启的间隙"""
+        if self.pending_gap is None:
+            self.pending_gap = StreamGap(samples_received, now or time.monotonic())
+        return self.pending_gap
+
+    def on_data(self, now, sample_rate=None):
+        """数据恢复时调用，若存在未关闭的间隙则关闭并返回它"""
+        gap = self.pending_gap
+        if gap is None:
+            return None
+        self.pending_gap = None
+        gap.close(now, sample_rate)
+        self.gaps.append(gap)
+        self.reconnects += 1
+        self.last_recovery_seconds = gap.duration
+        return gap
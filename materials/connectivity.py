@@ -0,0 +1,194 @@
+"""
+connectivity.py - 增量式通道相关与 alpha 频段相干矩阵
+功能说明：
+1. 滑动窗口内维护各通道的一阶和与交叉二阶矩之和，新块加入、过期块减去，
+   每次更新代价 O(块长 × 通道数²)，无需对整个窗口重新计算
+2. 相干: 将数据切为定长分段，维护 alpha 频段的互谱密度滑动和，
+   coherence = |Sxy|² / (Sxx · Syy)，在 alpha 各频点上取平均
+3. 结果以矩阵流形式按固定间隔推送给订阅者
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+from spectral import BANDS
+
+EPSILON = 1e-12
+
+
+class ConnectivityResult:
+    """一次矩阵输出"""
+
+    __slots__ = ("timestamp", "correlation", "coherence")
+
+    def __init__(self, timestamp, correlation, coherence):
+        self.timestamp = timestamp
+        self.correlation = correlation
+        self.coherence = coherence
+
+
+class RunningCorrelation:
+    """
+    滑动窗口 Pearson 相关矩阵
+
+    以首个数据块的均值为参考偏移后再累积，避免 24 位原始值带来的大直流分量
+    在 Σx² - (Σx)²/n 中产生数值抵消。
+    """
+
+    def __init__(self, num_channels, window_samples):
+        self.num_channels = num_channels
+        self.window_samples = window_samples
+        self.reset()
+
+    def reset(self):
+        """清空窗口"""
+        self._offset = None
+        self._count = 0
+        self._sum = np.zeros(self.num_channels)
+        self._comoment = np.zeros((self.num_channels, self.num_channels))
+        self._blocks = deque()
+
+    def add(self, block):
+        """加入一个数据块 (n_samples, n_channels)，并移除超出窗口的旧块"""
+        if len(block) == 0:
+            return
+        if self._offset is None:
+            self._offset = block.mean(axis=0)
+        x = block - self._offset
+        block_sum = x.sum(axis=0)
+        block_comoment = x.T @ x
+
+        self._sum += block_sum
+        self._comoment += block_comoment
+        self._count += len(x)
+        self._blocks.append((len(x), block_sum, block_comoment))
+
+        while self._blocks and self._count - self._blocks[0][0] >= self.window_samples:
+            n, old_sum, old_comoment = self._blocks.popleft()
+            self._sum -= old_sum
+            self._comoment -= old_comoment
+            self._count -= n
+
+    def matrix(self):
+        """返回当前窗口的相关矩阵"""
+        if self._count < 2:
+            return np.eye(self.num_channels)
+        mean = self._sum / self._count
+        cov = self._comoment / self._count - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(cov), EPSILON, None))
+        corr = cov / np.outer(std, std)
+        return np.clip(corr, -1.0, 1.0)
+
+
+class RunningCoherence:
+    """
+    滑动窗口频段相干矩阵 (Welch 分段互谱的增量版本)
+
+    每凑满一个分段就对所有通道做一次 rfft，只保留目标频段的频点，
+    互谱 X·Xᴴ 加入滑动和，超出窗口的分段互谱被减去。
+    """
+
+    def __init__(self, num_channels, sample_rate, window_seconds=4.0,
+                 segment_seconds=0.5, band=BANDS["alpha"]):
+        self.num_channels = num_channels
+        self.segment_samples = max(8, int(round(segment_seconds * sample_rate)))
+        self.max_segments = max(2, int(round(window_seconds / segment_seconds)))
+
+        freqs = np.fft.rfftfreq(self.segment_samples, d=1.0 / sample_rate)
+        self.band_index = np.flatnonzero((freqs >= band[0]) & (freqs <= band[1]))
+        if len(self.band_index) == 0:
+            # 分段过短时频段内无频点，退化为最接近频段中心的频点
+            self.band_index = np.array([np.argmin(np.abs(freqs - np.mean(band)))])
+        self.window = np.hanning(self.segment_samples)
+        self.reset()
+
+    def reset(self):
+        """清空窗口"""
+        num_bins = len(self.band_index)
+        self._segment = np.zeros((self.segment_samples, self.num_channels))
+        self._fill = 0
+        self._csd = np.zeros((num_bins, self.num_channels, self.num_channels), dtype=np.complex128)
+        self._segments = deque()
+
+    def add(self, block):
+        """加入一个数据块 (n_samples, n_channels)"""
+        offset = 0
+        n = len(block)
+        while offset < n:
+            take = min(n - offset, self.segment_samples - self._fill)
+            self._segment[self._fill:self._fill + take] = block[offset:offset + take]
+            self._fill += take
+            offset += take
+            if self._fill == self.segment_samples:
+                self._add_segment()
+                self._fill = 0
+
+    def _add_segment(self):
+        """对完整分段计算频段互谱并滑入窗口"""
+        seg = self._segment - self._segment.mean(axis=0)
+        spectrum = np.fft.rfft(seg * self.window[:, None], axis=0)[self.band_index]
+        # (频点, 通道, 通道) 互谱
+        csd = spectrum[:, :, None] * spectrum[:, None, :].conj()
+        self._csd += csd
+        self._segments.append(csd)
+        if len(self._segments) > self.max_segments:
+            self._csd -= self._segments.popleft()
+
+    def matrix(self):
+        """返回当前窗口的频段平均相干矩阵"""
+        if not self._segments:
+            return np.eye(self.num_channels)
+        power = np.real(np.einsum("fii->fi", self._csd))
+        denom = power[:, :, None] * power[:, None, :] + EPSILON
+        coherence = np.abs(self._csd) ** 2 / denom
+        return np.clip(coherence.mean(axis=0), 0.0, 1.0)
+
+
+class ConnectivityStage:
+    """相关 + 相干组合阶段，按固定间隔推送矩阵流"""
+
+    def __init__(self, stream_info, window_seconds=4.0, segment_seconds=0.5, emit_seconds=0.5):
+        self.stream_info = stream_info
+        self.correlation = RunningCorrelation(stream_info.num_channels,
+                                              stream_info.samples(window_seconds))
+        self.coherence = RunningCoherence(stream_info.num_channels, stream_info.sample_rate,
+                                          window_seconds, segment_seconds)
+        self.emit_samples = stream_info.samples(emit_seconds)
+        self._since_emit = 0
+        self._subscribers = []
+        self.latest = None
+
+    def subscribe(self, callback):
+        """订阅矩阵流, callback(ConnectivityResult)"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def reset(self):
+        """清空窗口状态"""
+        self.correlation.reset()
+        self.coherence.reset()
+        self._since_emit = 0
+        self.latest = None
+
+    def push(self, block):
+        """输入一个数据块，达到输出间隔时返回 ConnectivityResult，否则返回 None"""
+        block = np.asarray(block, dtype=np.float64)
+        self.correlation.add(block)
+        self.coherence.add(block)
+        self._since_emit += len(block)
+        if self._since_emit < self.emit_samples:
+            return None
+
+        self._since_emit = 0
+        result = ConnectivityResult(time.monotonic(), self.correlation.matrix(),
+                                    self.coherence.matrix())
+        self.latest = result
+        for callback in list(self._subscribers):
+            callback(result)
+        return result
@@ -0,0 +1,127 @@
+"""
+discovery.py - 定向设备发现 (提前返回)
+功能说明：
+1. 按广播名称前缀 (如 "NV-BrainRF")、服务 UUID 或地址筛选设备，满足任一条件即视为匹配
+2. 发现第一个 (或 N 个) 匹配设备后立即停止扫描，不再固定等待 10-20 秒
+3. DeviceCache 缓存最近发现的设备及 RSSI，连接时可直接复用，跳过扫描
+4. 返回 BLEDevice 对象，BleakClient 直接使用时无需再按地址扫描一次
+5. bleak 在首次扫描时才导入，离线工具导入本模块不加载蓝牙后端
+"""
+
+import asyncio
+import time
+
+
+class SeenDevice:
+    """一次发现记录"""
+
+    __slots__ = ("device", "name", "address", "rssi", "last_seen")
+
+    def __init__(self, device, name, rssi, last_seen):
+        self.device = device
+        self.name = name
+        self.address = device.address
+        self.rssi = rssi
+        self.last_seen = last_seen
+
+    def __repr__(self):
+        return f"{self.name or '未知设备'} - {self.address} (RSSI {self.rssi} dBm)"
+
+
+class DeviceFilter:
+    """设备筛选条件，未设置任何条件时匹配所有设备"""
+
+    def __init__(self, name_prefix=None, service_uuid=None, address=None):
+        self.name_prefix = name_prefix
+        self.service_uuid = service_uuid.lower() if service_uuid else None
+        self.address = address.upper() if address else None
+
+    @property
+    def empty(self):
+        return not (self.name_prefix or self.service_uuid or self.address)
+
+    def matches(self, name, service_uuids, address):
+        """任一条件满足即匹配"""
+        if self.empty:
+            return True
+        if self.address and address.upper() == self.address:
+            return True
+        if self.name_prefix and name and name.startswith(self.name_prefix):
+            return True
+        if self.service_uuid and any(u.lower() == self.service_uuid for u in service_uuids):
+            return True
+        return False
+
+
+class DeviceCache:
+    """最近发现的设备缓存 (按地址索引，超过 ttl 秒视为过期)"""
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._devices = {}
+
+    def update(self, device, name, rssi, service_uuids=()):
+        """记录一次发现"""
+        seen = SeenDevice(device, name, rssi, time.monotonic())
+        seen_uuids = tuple(service_uuids)
+        self._devices[device.address] = (seen, seen_uuids)
+        return seen
+
+    def fresh(self, device_filter=None):
+        """返回未过期且满足筛选条件的设备，按 RSSI 从强到弱排序"""
+        now = time.monotonic()
+        result = []
+        for address, (seen, uuids) in list(self._devices.items()):
+            if now - seen.last_seen > self.ttl:
+                del self._devices[address]
+                continue
+            if device_filter is None or device_filter.matches(seen.name, uuids, address):
+                result.append(seen)
+        return sorted(result, key=lambda s: s.rssi if s.rssi is not None else -999, reverse=True)
+
+    def best(self, device_filter=None):
+        """信号最强的匹配设备，无匹配时返回 None"""
+        devices = self.fresh(device_filter)
+        return devices[0] if devices else None
+
+
+async def discover(device_filter=None, max_matches=1, timeout=10.0, cache=None):
+    """
+    扫描并返回匹配的设备列表 (SeenDevice, 按 RSSI 排序)
+    找到 max_matches 个匹配设备即提前返回；max_matches=None 时扫描满 timeout 秒
+    """
+    from bleak import BleakScanner
+
+    device_filter = device_filter or DeviceFilter()
+    matches = {}
+    done = asyncio.Event()
+
+    def on_detect(device, advertisement):
+        name = advertisement.local_name or device.name
+        uuids = advertisement.service_uuids or []
+        if cache is not None:
+            seen = cache.update(device, name, advertisement.rssi, uuids)
+        else:
+            seen = SeenDevice(device, name, advertisement.rssi, time.monotonic())
+        if device_filter.matches(name, uuids, device.address):
+            matches[device.address] = seen
+            if max_matches and len(matches) >= max_matches:
+                done.set()
+
+    async with BleakScanner(detection_callback=on_detect):
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    return sorted(matches.values(), key=lambda s: s.rssi if s.rssi is not None else -999, reverse=True)
+
+
+async def find_device(device_filter, timeout=10.0, cache=None, use_cache=True):
+    """获取一个用于连接的设备: 优先使用缓存，否则扫描到第一个匹配即返回"""
+    if use_cache and cache is not None:
+        seen = cache.best(device_filter)
+        if seen is not None:
+            return seen
+    found = await discover(device_filter, max_matches=1, timeout=timeout, cache=cache)
+    return found[0] if found else None
@@ -0,0 +1,319 @@
+"""
+display.py - 实时波形显示用数据结构
+功能说明：
+1. DisplayRing: 双写环形缓冲区，每个样本同时写入 i 与 i+N，
+   最新 N 点始终是一段连续视图，刷新时无需 np.concatenate 展开
+2. 时间轴为预分配数组，刷新时原地平移，不再每帧重建
+3. AutoScaler: 基于单调队列的窗口极值跟踪 (稳健模式为整窗分位数) + 滞回的纵轴自动缩放，
+   仅当数据越出滞回带时才变更显示范围，稳态下几乎不触发坐标轴重排
+4. RenderScheduler: 仅在有新数据的通道上重绘，按帧耗时预算自适应调整目标帧率
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+
+class DisplayRing:
+    """双写环形缓冲区 (通道 × 2N)"""
+
+    def __init__(self, num_channels, size):
+        self.num_channels = num_channels
+        self.size = int(size)
+        self.data = np.zeros((num_channels, 2 * self.size))
+        self.ptr = 0  # 下一次写入位置 (0..N-1)
+        self.count = 0  # 累计写入样本数
+
+    def append(self, sample):
+        """写入单个样本 (长度为通道数)"""
+        self.data[:, self.ptr] = sample
+        self.data[:, self.ptr + self.size] = sample
+        self.ptr += 1
+        if self.ptr == self.size:
+            self.ptr = 0
+        self.count += 1
+
+    def extend(self, block):
+        """写入数据块 (n_samples, n_channels)"""
+        n = len(block)
+        if n == 0:
+            return
+        if n >= self.size:
+            block = block[-self.size:]
+            self.count += n - self.size
+            n = self.size
+
+        first = min(n, self.size - self.ptr)
+        cols = block.T
+        self.data[:, self.ptr:self.ptr + first] = cols[:, :first]
+        self.data[:, self.ptr + self.size:self.ptr + self.size + first] = cols[:, :first]
+        rest = n - first
+        if rest:
+            self.data[:, :rest] = cols[:, first:]
+            self.data[:, self.size:self.size + rest] = cols[:, first:]
+        self.ptr = (self.ptr + n) % self.size
+        self.count += n
+
+    def window(self):
+        """最新 N 点的连续视图 (通道 × N)，按时间由旧到新"""
+        return self.data[:, self.ptr:self.ptr + self.size]
+
+    def channel(self, index):
+        """单通道最新 N 点的连续视图"""
+        return self.data[index, self.ptr:self.ptr + self.size]
+
+    def resized(self, size):
+        """返回新尺寸的环形缓冲区，并保留最新数据"""
+        ring = DisplayRing(self.num_channels, size)
+        keep = min(size, self.size, self.count)
+        if keep:
+            ring.extend(self.window()[:, -keep:].T)
+        ring.count = self.count
+        return ring
+
+
+class ScrollingAxis:
+    """预分配的滚动时间轴: x = (基准偏移 + 已写入样本数) / 采样率，原地更新"""
+
+    def __init__(self, size, sample_rate=None):
+        self.size = int(size)
+        self.sample_rate = sample_rate
+        # 最新样本对应 0，最旧样本对应 -(N-1)
+        self._base = np.arange(-self.size + 1, 1, dtype=np.float64)
+        if sample_rate:
+            self._base /= sample_rate
+        self.values = np.empty_like(self._base)
+        self._count = None
+
+    def update(self, count):
+        """平移到最新样本计数，计数未变化时不做任何操作"""
+        if count == self._count:
+            return self.values
+        offset = count - 1
+        if self.sample_rate:
+            offset /= self.sample_rate
+        np.add(self._base, offset, out=self.values)
+        self._count = count
+        return self.values
+
+
+class AutoScaler:
+    """
+    O(1) 滑动窗口极值自动缩放器
+
+    - 样本按固定长度分块 (chunk)，每块得到各通道的极值后压入单调队列，
+      窗口最小/最大值即队首元素，均摊代价与窗口长度无关
+    - 稳健模式保留最近 window_chunks 个完整分块的样本，每完成一块对整个窗口计算分位数
+      (默认 2%/98%)；占窗口不足 2% 的尖峰不会撑大量程
+    - 滞回: 数据越出当前显示范围，或目标量程收缩到当前量程的 shrink_ratio 以下时才更新
+    """
+
+    def __init__(self, num_channels, window_samples, chunk_samples=None, scale_factor=0.3,
+                 min_margin=100.0, shrink_ratio=0.4, robust=False, percentiles=(2.0, 98.0)):
+        self.num_channels = num_channels
+        self.chunk = int(chunk_samples or max(1, window_samples // 16))
+        self.window_chunks = max(1, math.ceil(window_samples / self.chunk))
+        self.scale_factor = scale_factor
+        self.min_margin = min_margin
+        self.shrink_ratio = shrink_ratio
+        self.robust = robust
+        self.percentiles = percentiles
+
+        self._chunk_buf = np.empty((self.chunk, num_channels))
+        self._fill = 0
+        self._chunk_index = 0
+        self._min_queues = [deque() for _ in range(num_channels)]
+        self._max_queues = [deque() for _ in range(num_channels)]
+        self._partial_min = np.full(num_channels, np.inf)
+        self._partial_max = np.full(num_channels, -np.inf)
+        if robust:
+            self._window = np.empty((self.window_chunks * self.chunk, num_channels))
+            self._robust_extrema = None
+        self.ranges = [None] * num_channels
+        self.relayouts = 0
+
+    def extend(self, block):
+        """输入数据块 (n_samples, n_channels)"""
+        offset = 0
+        n = len(block)
+        while offset < n:
+            take = min(n - offset, self.chunk - self._fill)
+            part = block[offset:offset + take]
+            self._chunk_buf[self._fill:self._fill + take] = part
+            if not self.robust:
+                np.minimum(self._partial_min, part.min(axis=0), out=self._partial_min)
+                np.maximum(self._partial_max, part.max(axis=0), out=self._partial_max)
+            self._fill += take
+            offset += take
+            if self._fill == self.chunk:
+                self._close_chunk()
+
+    def _close_chunk(self):
+        """完成一个分块: 计算块极值并更新单调队列 (稳健模式下重算窗口分位数)"""
+        index = self._chunk_index
+        if self.robust:
+            slot = (index % self.window_chunks) * self.chunk
+            self._window[slot:slot + self.chunk] = self._chunk_buf
+            filled = min(index + 1, self.window_chunks) * self.chunk
+            lows, highs = np.percentile(self._window[:filled], self.percentiles, axis=0)
+            self._robust_extrema = (lows.tolist(), highs.tolist())
+            self._chunk_index += 1
+            self._fill = 0
+            return
+
+        lows, highs = self._partial_min, self._partial_max
+        expired = index - self.window_chunks
+        for c, (low, high) in enumerate(zip(lows.tolist(), highs.tolist())):
+            q = self._min_queues[c]
+            while q and q[-1][1] >= low:
+                q.pop()
+            q.append((index, low))
+            if q[0][0] <= expired:
+                q.popleft()
+
+            q = self._max_queues[c]
+            while q and q[-1][1] <= high:
+                q.pop()
+            q.append((index, high))
+            if q[0][0] <= expired:
+                q.popleft()
+
+        self._chunk_index += 1
+        self._fill = 0
+        self._partial_min.fill(np.inf)
+        self._partial_max.fill(-np.inf)
+
+    def extrema(self, channel):
+        """返回通道窗口内 (最小值, 最大值)，无数据时返回 None"""
+        if self.robust:
+            if self._robust_extrema is None:
+                return None
+            return self._robust_extrema[0][channel], self._robust_extrema[1][channel]
+        low = self._min_queues[channel][0][1] if self._min_queues[channel] else math.inf
+        high = self._max_queues[channel][0][1] if self._max_queues[channel] else -math.inf
+        if self._fill:
+            low = min(low, float(self._partial_min[channel]))
+            high = max(high, float(self._partial_max[channel]))
+        if low > high:
+            return None
+        return low, high
+
+    def invalidate(self):
+        """强制下一次 update() 重新输出全部通道的显示范围"""
+        self.ranges = [None] * self.num_channels
+
+    def update(self):
+        """按滞回规则计算需要变更的显示范围，返回 [(通道, 下限, 上限)]"""
+        changes = []
+        for c in range(self.num_channels):
+            extrema = self.extrema(c)
+            if extrema is None:
+                continue
+            low, high = extrema
+            margin = max((high - low) * self.scale_factor, self.min_margin)
+            target = (low - margin, high + margin)
+
+            current = self.ranges[c]
+            if current is not None:
+                outside = low < current[0] or high > current[1]
+                too_loose = (target[1] - target[0]) < (current[1] - current[0]) * self.shrink_ratio
+                if not (outside or too_loose):
+                    continue
+
+            self.ranges[c] = target
+            changes.append((c, target[0], target[1]))
+        self.relayouts += len(changes)
+        return changes
+
+
+class RenderScheduler:
+    """
+    自适应渲染调度器
+
+    - 只有被标记为脏的通道才重绘，没有新数据的定时器周期直接跳过
+    - 帧耗时 (数据准备 + 绘制) 超过帧间隔的 budget 比例时降低目标帧率，
+      低于 headroom 比例时逐步提升，渲染占用的时间片因此有上界，BLE 回调不会被饿死
+    - 统计实际帧率、空闲跳过与超时丢帧
+    """
+
+    def __init__(self, num_channels, target_fps=30.0, min_fps=5.0, max_fps=60.0,
+                 budget=0.5, headroom=0.25):
+        self.num_channels = num_channels
+        self.fps = float(target_fps)
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.budget = budget
+        self.headroom = headroom
+
+        self.dirty = set()  # 需要重绘的通道序号 (原地增删，每帧不分配新容器)
+        self._all_channels = range(num_channels)
+        self.frame_ms = 0.0
+        self.rendered = 0
+        self.skipped_idle = 0
+        self.skipped_late = 0
+        self.achieved_fps = 0.0
+        self._last_tick = None
+        self._window_start = None
+        self._window_rendered = 0
+
+    @property
+    def interval_ms(self):
+        """当前目标帧间隔 (毫秒)"""
+        return 1000.0 / self.fps
+
+    @property
+    def poll_interval(self):
+        """主循环处理 Qt 事件的建议间隔 (秒)，不低于目标帧率"""
+        return min(0.1, 1.0 / self.fps)
+
+    @property
+    def event_budget_ms(self):
+        """单次处理 Qt 事件允许占用的最长时间 (毫秒)"""
+        return max(1, int(self.interval_ms * self.budget))
+
+    def mark_dirty(self, channel=None):
+        """标记需要重绘的通道, channel 为 None 时标记全部"""
+        if channel is None:
+            self.dirty.update(self._all_channels)
+        else:
+            self.dirty.add(channel)
+
+    def begin(self, now):
+        """定时器触发时调用，返回是否需要渲染本帧"""
+        if self._last_tick is not None:
+            late = (now - self._last_tick) * 1000.0 / self.interval_ms
+            if late >= 2.0:
+                self.skipped_late += int(late) - 1
+        self._last_tick = now
+
+        # 每秒统计一次实际帧率 (无新数据时同样更新)
+        if self._window_start is None:
+            self._window_start, self._window_rendered = now, self.rendered
+        elif now - self._window_start >= 1.0:
+            self.achieved_fps = (self.rendered - self._window_rendered) / (now - self._window_start)
+            self._window_start, self._window_rendered = now, self.rendered
+
+        if not self.dirty:
+            self.skipped_idle += 1
+            return False
+        return True
+
+    def end(self, now, frame_ms):
+        """
+        渲染完成后调用，更新统计并自适应调整帧率
+        返回: 目标帧率发生变化时返回新的帧间隔 (毫秒)，否则返回 None
+        """
+        self.dirty.clear()
+        self.rendered += 1
+        self.frame_ms = frame_ms if self.rendered == 1 else self.frame_ms + 0.2 * (frame_ms - self.frame_ms)
+
+        fps = self.fps
+        if self.frame_ms > self.interval_ms * self.budget:
+            fps = max(self.min_fps, fps * 0.8)
+        elif self.frame_ms < self.interval_ms * self.headroom:
+            fps = min(self.max_fps, fps + 1.0)
+        if fps == self.fps:
+            return None
+        self.fps = fps
+        return self.interval_ms
@@ -0,0 +1,116 @@
+"""
+epochs.py - 按事件标记切分分段 (零拷贝视图 + 向量化基线校正)
+功能说明：
+1. sliding_window_view 在 (样本, 通道) 数据上建立 (起点, 通道, 窗长) 的滑动窗口视图，
+   不复制数据；内存映射的会话同样适用，只有实际访问的页会被读入
+2. Epochs 保存窗口视图与各分段起点，单个分段 epochs[i] 为零拷贝视图，
+   数千个分段的切分本身不产生数据复制
+3. get_data() 一次 np.take 将选中的分段收集到输出数组 (同类型时为唯一一次复制)，
+   再以广播一次减去各分段各通道的基线均值，完成基线校正；
+   默认基线为事件前部分，分段不含事件前样本 (tmin >= 0) 时改用整个分段
+4. regular_epochs() 以固定步长切分连续数据，结果本身就是视图 (如睡眠分期的 30 秒分段)
+
+示例:
+    reader = SessionReader(directory)
+    epochs = Epochs.from_markers(reader, label="target", tmin=-0.2, tmax=0.8)
+    data = epochs.get_data(baseline=(-0.2, 0.0))   # (n_epochs, n_channels, n_times)
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_BASELINE = (None, 0.0)  # 分段起点至事件时刻
+
+
+def regular_epochs(data, length, step=None):
+    """
+    固定步长切分 (n_samples, n_channels) 数据，返回视图 (n_epochs, n_channels, length)
+    step 缺省等于 length (不重叠)
+    """
+    step = length if step is None else step
+    if len(data) < length:
+        return np.empty((0, data.shape[1], length), dtype=data.dtype)
+    return sliding_window_view(data, length, axis=0)[::step]
+
+
+class Epochs:
+    """
+    以事件为锚点的分段集合
+
+    data: (n_samples, n_channels) 数组或内存映射
+    onsets: 事件样本序号；tmin/tmax 为相对事件的起止时刻 (秒, 含 tmin 不含 tmax)
+    超出数据范围的事件被丢弃，记录在 dropped 中
+    """
+
+    def __init__(self, data, onsets, sample_rate, tmin=-0.2, tmax=0.8, labels=None):
+        self.sample_rate = float(sample_rate)
+        self.offset = int(round(tmin * self.sample_rate))  # 分段起点相对事件的样本数 (通常为负)
+        self.length = int(round(tmax * self.sample_rate)) - self.offset
+        if self.length <= 0:
+            raise ValueError("tmax 必须大于 tmin")
+        self.tmin = self.offset / self.sample_rate
+        self.num_channels = data.shape[1]
+
+        onsets = np.asarray(onsets, dtype=np.int64)
+        starts = onsets + self.offset
+        valid = (starts >= 0) & (starts + self.length <= len(data))
+        self.onsets = onsets[valid]
+        self.starts = starts[valid]
+        self.dropped = onsets[~valid]
+        self.labels = None if labels is None else np.asarray(labels)[valid]
+        self._windows = sliding_window_view(data, self.length, axis=0) if len(data) >= self.length else None
+
+    @classmethod
+    def from_markers(cls, reader, label=None, tmin=-0.2, tmax=0.8):
+        """由会话中的标记建立分段，label 为 None 时使用全部标记"""
+        markers = [m for m in reader.markers() if label is None or m["label"] == label]
+        onsets = [m["sample"] for m in markers]
+        labels = [m["label"] for m in markers]
+        return cls(reader.samples(), onsets, reader.sample_rate, tmin, tmax, labels)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """第 index 个分段的零拷贝视图 (n_channels, n_times)"""
+        return self._windows[self.starts[index]]
+
+    @property
+    def times(self):
+        """分段内各样本相对事件的时刻 (秒)"""
+        return self.tmin + np.arange(self.length) / self.sample_rate
+
+    def _baseline_slice(self, baseline):
+        start, stop = baseline
+        first = 0 if start is None else int(round(start * self.sample_rate)) - self.offset
+        last = self.length if stop is None else int(round(stop * self.sample_rate)) - self.offset
+        first, last = max(0, first), min(self.length, last)
+        if last <= first and tuple(baseline) == DEFAULT_BASELINE:
+            return slice(0, self.length)  # 无事件前样本，以整个分段为基线
+        if last <= first:
+            raise ValueError(f"基线区间 {baseline} 不在分段范围内")
+        return slice(first, last)
+
+    def get_data(self, baseline=DEFAULT_BASELINE, dtype=np.float32, out=None):
+        """
+        收集全部分段为 (n_epochs, n_channels, n_times) 数组
+        baseline=(起, 止) 秒 (None 表示分段边界)，为 None 时不做基线校正；
+        显式指定的区间与分段不重叠时抛出 ValueError
+        """
+        shape = (len(self), self.num_channels, self.length)
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        if len(self) == 0:
+            return out
+        if out.dtype == self._windows.dtype:
+            np.take(self._windows, self.starts, axis=0, out=out)
+        else:
+            out[...] = self._windows[self.starts]  # 需要类型转换时经一次临时数组
+        if baseline is not None:
+            segment = out[..., self._baseline_slice(baseline)]
+            out -= segment.mean(axis=-1, keepdims=True, dtype=np.float64).astype(out.dtype)
+        return out
+
+    def average(self, baseline=DEFAULT_BASELINE):
+        """平均诱发响应 (n_channels, n_times)"""
+        return self.get_data(baseline, dtype=np.float64).mean(axis=0)
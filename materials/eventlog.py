@@ -0,0 +1,187 @@
+"""
+eventlog.py - 异步结构化日志
+功能说明：
+1. 记录经 QueueHandler 放入队列即返回，格式化与控制台/文件 I/O 由 QueueListener 后台线程完成，
+   BLE 回调与连接流程中的日志调用不会因 I/O 阻塞
+2. 每条记录带结构化字段: event (事件名)、device (设备地址)、fields (计数器等)，
+   文件输出为 JSON Lines，控制台输出保持 "[时刻] 符号 类型: 消息" 格式
+3. RateLimitFilter 在入队前丢弃窗口期内重复的同类消息，放行时附带被抑制的条数；
+   同类按稳定的键判断 (事件名或消息模板)，消息文本中的计数、地址等可变内容不影响归类
+4. StatusCoalescer 合并状态栏更新，每秒最多若干次，只显示最新一条
+5. 日志队列有容量上限，输出端跟不上时丢弃新记录并计数，内存不随积压增长
+6. 异常堆栈 (exc_info) 在入队前转为文本，控制台附在消息之后，JSON 输出为 traceback 字段
+"""
+
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime
+
+LOGGER_NAME = "braincare"
+
+
+class ConsoleFormatter(logging.Formatter):
+    """与原 _emit_log 一致的控制台格式 (时间取自记录创建时刻)"""
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created).strftime("%H:%M:%S.%f")[:-3]
+        symbol = getattr(record, "symbol", "")
+        kind = getattr(record, "kind", record.levelname)
+        text = f"[{timestamp}] {symbol} {kind}: {record.getMessage()}"
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (已抑制 {suppressed} 条重复)"
+        if record.exc_text:
+            text += f"\n{record.exc_text}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式，每行一条结构化记录"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+        }
+        device = getattr(record, "device", None)
+        if device:
+            entry["device"] = device
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry["fields"] = fields
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["traceback"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    同一限流键在 interval 秒内只放行一次，其余计数后丢弃；
+    下一次放行的记录带 suppressed 字段说明期间抑制了多少条
+
+    限流键取记录的 rate_key (调用方给出的事件名等稳定标识)，未给出时取
+    (event, record.msg)；record.msg 为 %-格式模板时与参数值无关
+    """
+
+    def __init__(self, interval=1.0, max_keys=512):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._last = {}  # key -> [上次放行时刻, 抑制计数]
+
+    def filter(self, record):
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            key = (getattr(record, "event", None), record.msg)
+        now = time.monotonic()
+        state = self._last.get(key)
+        if state is not None and now - state[0] < self.interval:
+            state[1] += 1
+            return False
+        record.suppressed = state[1] if state is not None else 0
+        if state is None and len(self._last) >= self.max_keys:
+            self._last.clear()  # 防止消息种类过多时无限增长
+        self._last[key] = [now, 0]
+        return True
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    """入队前不预先格式化消息，保留结构化字段与原始参数给后台线程处理；队列已满时丢弃"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(log_file=None, level=logging.INFO, console=True, rate_limit=1.0, max_queued=10000):
+    """
+    配置 braincare 日志器并启动后台监听线程
+    返回 QueueListener，程序退出前调用 listener.stop() 以写出剩余记录
+    """
+    handlers = []
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(ConsoleFormatter())
+        handlers.append(stream)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(max_queued)
+    queue_handler = _PassThroughQueueHandler(log_queue)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def dropped_records():
+    """因队列已满被丢弃的日志记录数"""
+    return sum(getattr(h, "dropped", 0) for h in logging.getLogger(LOGGER_NAME).handlers)
+
+
+class StatusCoalescer:
+    """
+    合并高频状态更新: 最小间隔 interval 秒，期间只保留最新一条，到期后回调一次
+    无运行中的事件循环时直接回调
+    """
+
+    def __init__(self, callback, interval=0.25):
+        self.callback = callback
+        self.interval = interval
+        self._pending = None
+        self._handle = None
+        self._last_emit = 0.0
+
+    def post(self, message):
+        self._pending = message
+        if self._handle is not None:
+            return
+        delay = self.interval - (time.monotonic() - self._last_emit)
+        if delay <= 0:
+            self._flush()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush()
+            return
+        self._handle = loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        self._handle = None
+        message, self._pending = self._pending, None
+        if message is None:
+            return
+        self._last_emit = time.monotonic()
+        self.callback(message)
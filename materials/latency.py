@@ -0,0 +1,190 @@
+"""
+latency.py - 端到端样本延迟追踪 (BLE 回调 → 屏幕)
+功能说明：
+1. 每个数据块在到达时打上单调时钟时间戳，后续各阶段记录相对到达时刻的延迟:
+   arrival (回调入口) → decoded (解码完成) → delivered (Qt 信号送达) →
+   buffered (写入显示缓冲区) → rendered (包含该块的一帧绘制完成)
+2. 每个阶段一个 HDR 风格直方图: 对数分段 + 段内线性子桶，相对误差约 1%，
+   记录为 O(1) 的整数运算，内存固定 (约 2300 个计数)
+3. rendered 阶段按样本数加权: 一帧可能包含多个待显示的数据块
+4. snapshot() 输出各阶段分位数，dump() 写出 JSON (含非零桶)
+5. 窗口长时间不绘制 (如最小化) 时，待显示列表受 pending_budget 限制，超出部分丢弃最早的块
+
+采集与显示在同一线程内同步执行 (信号为直接连接)，因此 "当前块" 时间戳在
+begin() 与 buffered 之间保持不变，不需要随数据块一起传递。
+"""
+
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+STAGES = ("decoded", "delivered", "buffered", "rendered")
+STAGE_NAMES = {
+    "decoded": "到达→解码",
+    "delivered": "到达→送达",
+    "buffered": "到达→缓冲",
+    "rendered": "到达→显示",
+}
+
+
+class HdrHistogram:
+    """
+    HDR 风格直方图 (整数微秒)
+
+    数值 v 落在第 b 段 (b = max(0, bit_length(v) - sub_bits))，段内按 v >> b 线性细分，
+    每段子桶数为 2^sub_bits / 2，对应 significant_digits 位有效数字
+    """
+
+    def __init__(self, highest_us=10_000_000, significant_digits=2):
+        self.sub_bits = int(np.ceil(np.log2(2 * 10 ** significant_digits)))
+        self.sub_count = 1 << self.sub_bits
+        self.half = self.sub_count >> 1
+        self.highest = int(highest_us)
+        self.counts = np.zeros(self._index(self.highest) + 1, dtype=np.int64)
+        self.total = 0
+        self.max = 0
+        self.sum = 0.0
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bits)
+        return (shift * self.half) + (value >> shift)
+
+    def _value(self, index):
+        """第 index 个桶的上界 (微秒)"""
+        if index < self.sub_count:
+            return index
+        shift = index // self.half - 1
+        sub = index - shift * self.half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds, count=1):
+        value = min(self.highest, max(0, int(seconds * 1e6)))
+        self.counts[self._index(value)] += count
+        self.total += count
+        self.sum += value * count
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """q 分位数 (毫秒)，q 取 0-100"""
+        if self.total == 0:
+            return None
+        target = max(1, int(np.ceil(q / 100.0 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), target))
+        return min(self._value(index), self.max) / 1000.0
+
+    @property
+    def mean_ms(self):
+        return self.sum / self.total / 1000.0 if self.total else None
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.max = 0
+        self.sum = 0.0
+
+    def nonzero_buckets(self):
+        """[(桶上界微秒, 计数)]"""
+        return [(self._value(int(i)), int(self.counts[i])) for i in np.flatnonzero(self.counts)]
+
+
+class LatencyTracer:
+    """按阶段记录当前数据块相对到达时刻的延迟"""
+
+    def __init__(self, enabled=True, clock=time.perf_counter, pending_budget=None):
+        self.enabled = enabled
+        self.clock = clock
+        self.pending_budget = pending_budget  # membudget.MemoryBudget
+        self.histograms = {stage: HdrHistogram() for stage in STAGES}
+        self._arrival = None
+        self._pending = []  # 已缓冲、尚未显示的 (到达时刻, 样本数)
+        self.started = datetime.now().isoformat(timespec="seconds")
+
+    def begin(self, arrival):
+        """回调入口: 记录当前块的到达时刻"""
+        self._arrival = arrival
+
+    def mark(self, stage, now=None):
+        """记录当前块到达 stage 的延迟"""
+        if self._arrival is None:
+            return
+        now = self.clock() if now is None else now
+        self.histograms[stage].record(now - self._arrival)
+
+    def buffered(self, samples, now=None):
+        """当前块写入显示缓冲区，等待下一帧绘制"""
+        if self._arrival is None:
+            return
+        self.mark("buffered", now)
+        self._pending.append((self._arrival, samples))
+        if self.pending_budget is not None:
+            self.pending_budget.enforce(self._pending)
+
+    def rendered(self, now=None):
+        """一帧绘制完成: 对所有已缓冲的块按样本数加权记录"""
+        if not self._pending:
+            return
+        now = self.clock() if now is None else now
+        histogram = self.histograms["rendered"]
+        for arrival, samples in self._pending:
+            histogram.record(now - arrival, samples)
+        self._pending.clear()
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self._pending.clear()
+        self.started = datetime.now().isoformat(timespec="seconds")
+
+    def snapshot(self):
+        """{阶段: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}"""
+        result = {}
+        for stage, h in self.histograms.items():
+            if h.total == 0:
+                result[stage] = {"count": 0}
+                continue
+            result[stage] = {
+                "count": h.total,
+                "mean_ms": round(h.mean_ms, 3),
+                "p50_ms": h.percentile(50),
+                "p90_ms": h.percentile(90),
+                "p99_ms": h.percentile(99),
+                "max_ms": h.max / 1000.0,
+            }
+        return result
+
+    def summary(self):
+        """单行摘要，用于状态栏"""
+        parts = []
+        for stage in ("decoded", "buffered", "rendered"):
+            h = self.histograms[stage]
+            if h.total:
+                parts.append(f"{STAGE_NAMES[stage]} {h.percentile(50):.1f}/{h.percentile(99):.1f}")
+        return "延迟 p50/p99 ms: " + (" | ".join(parts) if parts else "--")
+
+    def report_lines(self):
+        lines = [f"{'阶段':<10}{'样本':>10}{'均值':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'最大':>9}  (ms)"]
+        for stage, entry in self.snapshot().items():
+            if entry["count"] == 0:
+                lines.append(f"{STAGE_NAMES[stage]:<10}{0:>10}")
+                continue
+            lines.append(f"{STAGE_NAMES[stage]:<10}{entry['count']:>10}{entry['mean_ms']:>9.2f}"
+                         f"{entry['p50_ms']:>9.2f}{entry['p90_ms']:>9.2f}{entry['p99_ms']:>9.2f}"
+                         f"{entry['max_ms']:>9.2f}")
+        return lines
+
+    def dump(self, path, extra=None):
+        """写出 JSON: 分位数摘要与各阶段非零桶"""
+        data = {
+            "started": self.started,
+            "dumped": datetime.now().isoformat(timespec="seconds"),
+            "stages": self.snapshot(),
+            "buckets_us": {stage: h.nonzero_buckets() for stage, h in self.histograms.items()},
+        }
+        if extra:
+            data.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
@@ -0,0 +1,170 @@
+"""
+markers.py - 事件标记流 (刺激标记与采样时钟对齐)
+功能说明：
+1. SampleClock 记录最近一次通知的到达时刻与其最后一个样本的序号，
+   按采样率将任意单调时钟时刻换算为样本序号 (可外推到尚未到达的样本)
+2. MarkerStream 为标记打上样本序号后推送给订阅者 (录制器、界面等)，并保留最近的标记
+3. 标记来源:
+   - 函数调用: client.post_marker("stim", code=1)
+   - 本机 UDP (MarkerServer): 每个数据报为一个标记，内容为标签文本或 JSON
+     {"label": "stim", "code": 1, "wall_time": 1700000000.123}，
+     wall_time (time.time()) 可选，用于发送端自带时间戳；回复 JSON 确认 (含样本序号)
+4. 时间戳在接收线程收到数据报时立即打上，不受界面事件处理延迟影响
+
+示例 (刺激程序):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto(b'{"label": "target", "code": 2}', ("127.0.0.1", 9871))
+"""
+
+import json
+import socket
+import threading
+import time
+from collections import deque
+
+
+class Marker:
+    """单个事件标记"""
+
+    __slots__ = ("sample", "timestamp", "label", "code", "source")
+
+    def __init__(self, sample, timestamp, label, code=None, source="api"):
+        self.sample = sample
+        self.timestamp = timestamp
+        self.label = label
+        self.code = code
+        self.source = source
+
+    def as_dict(self):
+        return {"sample": self.sample, "timestamp": round(self.timestamp, 6), "label": self.label,
+                "code": self.code, "source": self.source}
+
+    def __repr__(self):
+        return f"Marker({self.label!r}, code={self.code}, sample={self.sample}, source={self.source})"
+
+
+class SampleClock:
+    """单调时钟时刻 → 样本序号 (以最近一次通知为锚点)"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = float(sample_rate)
+        # (最近一次通知的到达时刻, 该通知最后一个样本之后的序号 即已接收样本数)
+        # 作为一个元组整体替换: 接收线程读取时不会拿到新时刻与旧序号的组合
+        self.anchor = None
+
+    def update(self, arrival_time, total_samples):
+        self.anchor = (arrival_time, total_samples)
+
+    def sample_at(self, timestamp):
+        """timestamp 时刻对应的样本序号；尚无数据时返回 None"""
+        anchor = self.anchor  # 单次读取
+        if anchor is None:
+            return None
+        anchor_time, anchor_sample = anchor
+        # 通知内最后一个样本 (序号 anchor_sample - 1) 对应到达时刻
+        return anchor_sample - 1 + int(round((timestamp - anchor_time) * self.sample_rate))
+
+
+class MarkerStream:
+    """标记打点与分发"""
+
+    def __init__(self, clock, history=256, clock_fn=time.monotonic):
+        self.clock = clock
+        self.clock_fn = clock_fn
+        self.recent = deque(maxlen=history)
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """订阅标记, callback(Marker)"""
+        self._subscribers.append(callback)
+
+    def make(self, label, code=None, timestamp=None, source="api"):
+        """生成标记 (不分发)，timestamp 为单调时钟时刻，缺省为当前时刻"""
+        timestamp = self.clock_fn() if timestamp is None else timestamp
+        return Marker(self.clock.sample_at(timestamp), timestamp, str(label), code, source)
+
+    def publish(self, marker):
+        self.recent.append(marker)
+        for callback in list(self._subscribers):
+            callback(marker)
+        return marker
+
+    def post(self, label, code=None, timestamp=None, source="api"):
+        """打点并分发，返回 Marker"""
+        return self.publish(self.make(label, code, timestamp, source))
+
+
+def parse_datagram(payload, received, wall_received=None):
+    """
+    解析标记数据报，返回 (label, code, 单调时钟时刻)
+    wall_time 表示发送端时刻，按收发两端的 time.time() 差值回推
+    """
+    text = payload.decode("utf-8", errors="replace").strip()
+    if not text.startswith("{"):
+        return text, None, received
+    message = json.loads(text)
+    timestamp = received
+    if message.get("wall_time") is not None:
+        wall_received = time.time() if wall_received is None else wall_received
+        timestamp = received - (wall_received - float(message["wall_time"]))
+    return str(message.get("label", "")), message.get("code"), timestamp
+
+
+class MarkerServer:
+    """后台线程上的本机 UDP 标记入口，标记在事件循环线程中分发"""
+
+    def __init__(self, stream, loop, port=9871, host="127.0.0.1"):
+        self.stream = stream
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.errors = 0
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.5)  # 定期检查停止标志
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._run, name="marker-udp", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        sock = self._sock
+        while not self._stop.is_set():
+            try:
+                payload, address = sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            received = self.stream.clock_fn()
+            try:
+                label, code, timestamp = parse_datagram(payload, received)
+            except (ValueError, TypeError) as e:
+                self.errors += 1
+                self._reply(address, {"ok": False, "error": str(e)})
+                continue
+            marker = self.stream.make(label, code, timestamp, source="udp")
+            self.received += 1
+            self.loop.call_soon_threadsafe(self.stream.publish, marker)
+            self._reply(address, dict(marker.as_dict(), ok=True))
+
+    def _reply(self, address, message):
+        try:
+            self._sock.sendto(json.dumps(message, ensure_ascii=False).encode("utf-8"), address)
+        except OSError:
+            pass
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,244 @@
+"""
+membudget.py - 内存预算与泄漏检测
+功能说明：
+1. MemoryBudget 为单个缓冲区设定上限 (字节数或条目数) 与超限时的丢弃策略:
+   - drop_oldest: 丢弃最早的数据，保留最新部分 (拟合点、待处理队列)
+   - drop_newest: 丢弃超出上限的新数据，保留已有部分
+   - clear:       整体清空 (数据已无法对齐时重新开始)
+   超限次数、丢弃量与历史最高水位均有统计，可导出为指标；
+   持续超限时只在首次超限回调一次，回落到上限以下后重新计起
+2. BudgetSet 集中登记流水线中的全部预算，便于状态报告与指标导出
+3. LeakMonitor 周期性拍摄 tracemalloc 快照并与上一次对比 (tracemalloc 有全局开销，按需开启)，
+   同一代码行连续多次增长且超过阈值时报告 (排除启动预热期的一次性分配)
+4. current_rss() 读取当前常驻内存 (Linux 读 /proc，其余平台退化为峰值 RSS)
+5. acquire_tracing / release_tracing 以引用计数共享 tracemalloc: 泄漏检测与性能分析可同时使用，
+   最后一个使用者释放时才停止跟踪 (跟踪由外部代码开启时不停止)
+"""
+
+import asyncio
+import os
+import sys
+import tracemalloc
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+CLEAR = "clear"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, CLEAR)
+
+_tracing_users = 0
+_tracing_owned = False  # 跟踪是否由本模块开启 (外部开启的跟踪不由本模块停止)
+
+
+def _ensure_tracing(frames):
+    global _tracing_owned
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _tracing_owned = True
+
+
+def acquire_tracing(frames=1):
+    """登记一个 tracemalloc 使用者，尚未跟踪时以 frames 层调用栈开始跟踪"""
+    global _tracing_users
+    _ensure_tracing(frames)
+    _tracing_users += 1
+
+
+def release_tracing():
+    """注销一个使用者；最后一个使用者离开且跟踪由本模块开启时停止跟踪"""
+    global _tracing_users, _tracing_owned
+    if _tracing_users == 0:
+        return
+    _tracing_users -= 1
+    if _tracing_users == 0 and _tracing_owned:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _tracing_owned = False
+
+
+class MemoryBudget:
+    """
+    单个缓冲区的容量预算
+
+    enforce(buffer) 适用于支持 len() 与切片删除的序列 (bytearray / list)，
+    返回本次丢弃的条目数；无法切片的容器 (如队列) 由调用方自行丢弃后以 observe 登记；
+    on_overflow(budget, dropped) 在进入超限状态时调用
+    """
+
+    def __init__(self, name, limit, policy=DROP_OLDEST, unit="条", on_overflow=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知丢弃策略: {policy}")
+        self.name = name
+        self.limit = int(limit)
+        self.policy = policy
+        self.unit = unit
+        self.on_overflow = on_overflow
+        self.overflows = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.saturated = False  # 上次检查时是否超限
+
+    def enforce(self, buffer):
+        size = len(buffer)
+        excess = size - self.limit
+        if excess <= 0:
+            return self.observe(size)
+        if self.policy == DROP_OLDEST:
+            del buffer[:excess]
+            dropped = excess
+        elif self.policy == DROP_NEWEST:
+            del buffer[self.limit:]
+            dropped = excess
+        else:
+            del buffer[:]
+            dropped = size
+        return self.observe(size, dropped)
+
+    def observe(self, size, dropped=0):
+        """登记容器当前 (丢弃前) 的条目数与调用方本次丢弃的条目数，返回 dropped"""
+        if size > self.high_water:
+            self.high_water = size
+        if not dropped:
+            if size < self.limit:
+                self.saturated = False
+            return 0
+        self.overflows += 1
+        self.dropped += dropped
+        if not self.saturated and self.on_overflow is not None:
+            self.on_overflow(self, dropped)
+        self.saturated = True
+        return dropped
+
+    def __repr__(self):
+        return (f"{self.name}: 上限 {self.limit} {self.unit} ({self.policy}), "
+                f"最高 {self.high_water}, 超限 {self.overflows} 次, 丢弃 {self.dropped} {self.unit}")
+
+
+class BudgetSet:
+    """流水线内存预算登记表"""
+
+    def __init__(self, on_overflow=None):
+        self.on_overflow = on_overflow
+        self._budgets = {}
+
+    def add(self, name, limit, policy=DROP_OLDEST, unit="条"):
+        budget = MemoryBudget(name, limit, policy, unit, self.on_overflow)
+        self._budgets[name] = budget
+        return budget
+
+    def __getitem__(self, name):
+        return self._budgets[name]
+
+    def __iter__(self):
+        return iter(self._budgets.values())
+
+    def snapshot(self):
+        """{名称: {limit, policy, high_water, overflows, dropped}}"""
+        return {b.name: {"limit": b.limit, "policy": b.policy, "high_water": b.high_water,
+                         "overflows": b.overflows, "dropped": b.dropped} for b in self}
+
+    def report_lines(self):
+        return [repr(b) for b in self]
+
+
+def current_rss():
+    """当前常驻内存 (字节)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LeakMonitor:
+    """
+    内存增长检测 (tracemalloc 快照对比)
+
+    每 interval 秒拍摄一次快照并按代码行与上一次对比；某一行在连续 consecutive 次
+    对比中都增长、且累计增长超过 threshold_kib 时，调用 on_growth(findings)，
+    findings 为 [(代码位置, 累计增长字节, 当前字节)]
+    """
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, interval=60.0, threshold_kib=256, consecutive=3, on_growth=None, frames=1):
+        self.interval = interval
+        self.threshold = threshold_kib * 1024
+        self.consecutive = consecutive
+        self.on_growth = on_growth
+        self.frames = frames
+        self.checks = 0
+        self._previous = None
+        self._streaks = {}  # 代码位置 -> (连续增长次数, 累计增长字节)
+        self._handle = None
+
+    @property
+    def active(self):
+        return self._previous is not None
+
+    def start(self):
+        if self.active:
+            return
+        acquire_tracing(self.frames)
+        self._previous = self._snapshot()
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._previous is not None:
+            release_tracing()
+        self._previous = None
+        self._streaks.clear()
+
+    def _schedule(self):
+        if self.interval:
+            self._handle = asyncio.get_event_loop().call_later(self.interval, self._tick)
+
+    def _tick(self):
+        self._handle = None
+        self.check()
+        if self.active:
+            self._schedule()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def check(self):
+        """与上一次快照对比，返回本次报告的增长位置列表"""
+        if not tracemalloc.is_tracing():
+            # 外部代码直接停止了跟踪: 重新开始并以当前状态为基线
+            _ensure_tracing(self.frames)
+            self._previous = self._snapshot()
+            self._streaks.clear()
+            return []
+        snapshot = self._snapshot()
+        self.checks += 1
+        streaks = {}
+        findings = []
+        for diff in snapshot.compare_to(self._previous, "lineno"):
+            if diff.size_diff <= 0:
+                continue
+            where = str(diff.traceback[0])
+            count, total = self._streaks.get(where, (0, 0))
+            count, total = count + 1, total + diff.size_diff
+            streaks[where] = (count, total)
+            if count >= self.consecutive and total >= self.threshold:
+                findings.append((where, total, diff.size))
+        self._streaks = streaks
+        self._previous = snapshot
+        findings.sort(key=lambda item: item[1], reverse=True)
+        if findings and self.on_growth is not None:
+            self.on_growth(findings)
+        return findings
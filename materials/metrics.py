@@ -0,0 +1,207 @@
+"""
+metrics.py - 采集指标注册表与本地 Prometheus 文本格式端点
+功能说明：
+1. Counter / Gauge / Histogram 三类指标，热路径上只做整数/浮点加法与一次 bisect，不加锁
+   (写入均发生在事件循环线程，HTTP 线程只读取，读到的值最多滞后一次更新)
+2. Histogram 使用固定桶边界，observe 为 O(log 桶数)，不保存样本
+3. Gauge 可绑定取值函数，在抓取时才计算 (如缓冲区长度、队列深度)；
+   GaugeFamily 以一个标签区分多条序列 (如逐通道统计)，同样在抓取时取值
+4. MetricsServer 在后台守护线程上提供 http://127.0.0.1:<port>/metrics
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认耗时桶 (秒)，覆盖 50 µs 到 1 s
+DURATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Gauge:
+    """瞬时值，可直接 set 或绑定取值函数"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", function=None):
+        self.name = name
+        self.help = help_text
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.function() if self.function is not None else self.value
+
+
+class GaugeFamily:
+    """带一个标签的一组瞬时值，function() 返回 {标签值: 数值}"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, label, function):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.function = function
+
+    def samples(self):
+        for key, value in self.function().items():
+            yield f'{self.name}{{{self.label}="{key}"}}', value
+
+
+class Histogram:
+    """固定桶直方图 (桶计数非累积存储，导出时再累加)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶上界估计分位数 (落在 +Inf 桶时返回最大边界)"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return self.bounds[-1]
+
+    def samples(self):
+        running = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            running += count
+            yield f'{self.name}_bucket{{le="{_format_value(float(bound))}"}}', running
+        yield f"{self.name}_sum", self.sum
+        yield f"{self.name}_count", self.count
+
+
+class MetricsRegistry:
+    """指标注册表，名称统一加前缀"""
+
+    def __init__(self, prefix="braincare_"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._register(Counter(self.prefix + name, help_text))
+
+    def gauge(self, name, help_text="", function=None):
+        return self._register(Gauge(self.prefix + name, help_text, function))
+
+    def gauge_family(self, name, help_text, label, function):
+        return self._register(GaugeFamily(self.prefix + name, help_text, label, function))
+
+    def histogram(self, name, help_text="", buckets=DURATION_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help_text, buckets))
+
+    def get(self, name):
+        return self._metrics.get(self.prefix + name)
+
+    def render(self):
+        """导出 Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for sample_name, value in metric.samples():
+                    lines.append(f"{sample_name} {_format_value(value)}")
+            except Exception:
+                continue  # 取值函数失败 (如对象已释放) 时跳过该指标
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """后台线程上的只读 HTTP 端点，默认仅监听本机"""
+
+    def __init__(self, registry, port=9108, host="127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不在控制台输出每次抓取
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
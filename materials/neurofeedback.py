@@ -0,0 +1,184 @@
+"""
+neurofeedback.py - 流式神经反馈评分引擎 (对应 App 端 src/hooks/useNeuroFeedback.ts)
+功能说明：
+1. 以解码后的数据块为输入，按固定跳步 (hop) 计算各频段功率
+2. 由频段比值得到 放松度 / 专注度 / 疲劳度 (0-100，与 App 端 ParsedEEGData 字段一致)
+3. 指数平滑后以低速率流的形式推送给订阅者 (GUI、网络输出等)
+4. 延迟上界 = 一个跳步 + 一次 FFT 计算，默认 hop=0.2 秒，保证反馈 < 250 ms
+"""
+
+import json
+import socket
+import time
+
+import numpy as np
+
+from spectral import BandPowerAnalyzer
+
+EPSILON = 1e-12
+
+
+def feedback_indices(theta, alpha, beta):
+    """
+    由频段功率计算 放松度 / 专注度 / 疲劳度 (0-100)
+    输入可为标量或同形数组 (离线批处理按分段向量化计算)，结果在首维堆叠
+    """
+    return np.stack([
+        alpha / (alpha + beta + EPSILON),
+        beta / (alpha + theta + beta + EPSILON),
+        (theta + alpha) / (theta + alpha + beta + EPSILON),
+    ]) * 100.0
+
+
+class FeedbackScores:
+    """单次反馈结果"""
+
+    __slots__ = ("timestamp", "relaxation", "focus", "fatigue", "band_powers")
+
+    def __init__(self, timestamp, relaxation, focus, fatigue, band_powers):
+        self.timestamp = timestamp
+        self.relaxation = relaxation
+        self.focus = focus
+        self.fatigue = fatigue
+        self.band_powers = band_powers
+
+    def as_dict(self):
+        """转换为可序列化字典"""
+        return {
+            "timestamp": self.timestamp,
+            "relaxation": round(self.relaxation, 2),
+            "focus": round(self.focus, 2),
+            "fatigue": round(self.fatigue, 2),
+            "band_powers": {k: float(v) for k, v in self.band_powers.items()},
+        }
+
+
+class NeuroFeedbackEngine:
+    """
+    流式神经反馈评分引擎
+
+    - 窗口与跳步均按秒配置，依据 StreamInfo 换算为采样点并一次性预分配环形缓冲区
+    - push() 每累积满一个跳步即计算一次，因此任一样本最多等待一个跳步即可反映到评分
+    - 评分指标:
+        放松度 = alpha / (alpha + beta)
+        专注度 = beta / (alpha + theta + beta)
+        疲劳度 = (theta + alpha) / (theta + alpha + beta)
+    """
+
+    def __init__(self, stream_info, window_seconds=1.0, hop_seconds=0.2,
+                 smoothing=0.3, channels=None):
+        self.stream_info = stream_info
+        self.window = stream_info.samples(window_seconds)
+        self.hop = stream_info.samples(hop_seconds)
+        self.smoothing = smoothing
+        self.channels = list(channels) if channels is not None else list(range(stream_info.num_channels))
+
+        self.analyzer = BandPowerAnalyzer(stream_info.sample_rate, self.window)
+        self._ring = np.zeros((len(self.channels), self.window))
+        self._ordered = np.empty_like(self._ring)
+        self._write = 0
+        self._filled = 0
+        self._since_hop = 0
+        self._smoothed = None
+        self._subscribers = []
+        self.latest = None
+
+    # 订阅接口 --------------------------------------------------
+    def subscribe(self, callback):
+        """订阅评分流, callback(FeedbackScores)"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    # 数据输入 --------------------------------------------------
+    def reset(self):
+        """清空缓冲区与平滑状态"""
+        self._ring[:] = 0
+        self._write = 0
+        self._filled = 0
+        self._since_hop = 0
+        self._smoothed = None
+        self.latest = None
+
+    def push(self, block):
+        """
+        输入一个数据块 (n_samples, n_channels)
+        返回本次产生的评分列表 (通常为 0 或 1 个)
+        """
+        block = np.asarray(block, dtype=np.float64)
+        results = []
+        offset = 0
+        n = len(block)
+        while offset < n:
+            # 每次最多写到下一个跳步边界，保证每个跳步都会触发评分
+            take = min(n - offset, self.hop - self._since_hop)
+            self._write_ring(block[offset:offset + take, self.channels])
+            offset += take
+            self._since_hop += take
+            if self._since_hop >= self.hop:
+                self._since_hop = 0
+                if self._filled >= self.window:
+                    results.append(self._score())
+        return results
+
+    def _write_ring(self, samples):
+        """写入环形缓冲区 (通道 × 时间)"""
+        n = len(samples)
+        end = self._write + n
+        if end <= self.window:
+            self._ring[:, self._write:end] = samples.T
+        else:
+            split = self.window - self._write
+            self._ring[:, self._write:] = samples[:split].T
+            self._ring[:, :end - self.window] = samples[split:].T
+        self._write = end % self.window
+        self._filled = min(self.window, self._filled + n)
+
+    def _score(self):
+        """计算一次评分并推送"""
+        # 按时间顺序展开环形缓冲区 (写入预分配数组，避免每次申请内存)
+        split = self.window - self._write
+        self._ordered[:, :split] = self._ring[:, self._write:]
+        self._ordered[:, split:] = self._ring[:, :self._write]
+
+        powers = self.analyzer.compute(self._ordered)
+        # 跨通道取平均功率
+        mean_powers = {name: float(np.mean(p)) for name, p in powers.items()}
+        theta = mean_powers["theta"]
+        alpha = mean_powers["alpha"]
+        beta = mean_powers["beta"]
+
+        raw = feedback_indices(theta, alpha, beta)
+
+        if self._smoothed is None:
+            self._smoothed = raw
+        else:
+            self._smoothed = self._smoothed + self.smoothing * (raw - self._smoothed)
+
+        scores = FeedbackScores(time.monotonic(), *self._smoothed.tolist(), mean_powers)
+        self.latest = scores
+        for callback in list(self._subscribers):
+            callback(scores)
+        return scores
+
+
+class UdpScoreSink:
+    """将评分以 JSON 行形式通过 UDP 发送 (可直接作为订阅回调)"""
+
+    def __init__(self, host="127.0.0.1", port=9870):
+        self.address = (host, port)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def __call__(self, scores):
+        try:
+            self._sock.sendto(json.dumps(scores.as_dict()).encode(), self.address)
+        except OSError:
+            pass  # 网络输出不可影响采集
+
+    def close(self):
+        """关闭套接字"""
+        self._sock.close()
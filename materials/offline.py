@@ -0,0 +1,139 @@
+"""
+offline.py - 无界面命令行工具
+功能说明：
+1. info:     打印录制会话的元数据与基本统计
+2. export:   将会话原始数据转换为 CSV (分块读取内存映射，不整体载入内存)
+3. epochs:   按事件标记切分分段并做基线校正，保存为 .npz
+4. profiles: 列出已注册的设备协议
+5. scan:     扫描附近的 BLE 设备 (仅此命令加载 bleak)
+
+本模块及其依赖不导入 Qt / pyqtgraph / bleak，离线任务启动时不承担 GUI 的导入开销。
+"""
+
+import argparse
+import os
+import sys
+
+
+def info_main(argv=None):
+    """打印会话信息"""
+    parser = argparse.ArgumentParser(prog="info", description="显示录制会话信息")
+    parser.add_argument("directory", help="会话目录")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    from recording import SessionReader
+
+    reader = SessionReader(args.directory)
+    meta = reader.meta
+    print(f"会话目录: {args.directory}")
+    print(f"设备: {meta.get('device') or '--'}")
+    print(f"开始时间: {meta.get('start_time', '--')}")
+    print(f"采样率: {reader.sample_rate:g} Hz, {reader.num_channels} 通道")
+    print(f"样本数: {reader.n_samples} ({reader.duration:.1f} 秒)")
+    print(f"金字塔层级: {reader.levels}")
+    if reader.n_samples:
+        data = reader.samples()
+        print(f"{'通道':<6}{'均值':>14}{'标准差':>14}{'最小':>12}{'最大':>12}")
+        for ch in range(reader.num_channels):
+            column = np.asarray(data[:, ch], dtype=np.float64)
+            print(f"Ch{ch + 1:<4}{column.mean():>14.2f}{column.std():>14.2f}"
+                  f"{column.min():>12.1f}{column.max():>12.1f}")
+    return 0
+
+
+def export_main(argv=None):
+    """会话原始数据导出为 CSV"""
+    parser = argparse.ArgumentParser(prog="export", description="将会话原始数据导出为 CSV")
+    parser.add_argument("directory", help="会话目录")
+    parser.add_argument("output", help="输出 CSV 文件")
+    parser.add_argument("--chunk", type=int, default=65536, help="每次读取的样本数")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    from recording import SessionReader
+
+    reader = SessionReader(args.directory)
+    data = reader.samples()
+    header = "time," + ",".join(f"ch{i + 1}" for i in range(reader.num_channels))
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        f.write(header + "\n")
+        for start in range(0, reader.n_samples, args.chunk):
+            block = np.asarray(data[start:start + args.chunk])
+            t = (np.arange(start, start + len(block)) / reader.sample_rate)[:, None]
+            np.savetxt(f, np.hstack([t, block]), fmt=["%.4f"] + ["%.6g"] * reader.num_channels,
+                       delimiter=",")
+    print(f"已导出 {reader.n_samples} 个样本 → {args.output}")
+    return 0
+
+
+def epochs_main(argv=None):
+    """按事件标记切分分段"""
+    parser = argparse.ArgumentParser(prog="epochs", description="按事件标记切分分段并做基线校正")
+    parser.add_argument("directory", help="会话目录")
+    parser.add_argument("output", help="输出 .npz 文件")
+    parser.add_argument("--label", default=None, help="只使用该标签的标记 (默认全部)")
+    parser.add_argument("--tmin", type=float, default=-0.2, help="分段起点 (秒，相对事件)")
+    parser.add_argument("--tmax", type=float, default=0.8, help="分段终点 (秒，相对事件)")
+    parser.add_argument("--no-baseline", action="store_true", help="不做基线校正 (默认以事件前为基线)")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    from epochs import DEFAULT_BASELINE, Epochs
+    from recording import META_FILE, SessionReader
+
+    if not os.path.isfile(os.path.join(args.directory, META_FILE)):
+        parser.error(f"不是会话目录 (缺少 {META_FILE}): {args.directory}")
+    reader = SessionReader(args.directory)
+    try:
+        epochs = Epochs.from_markers(reader, args.label, args.tmin, args.tmax)
+        data = epochs.get_data(baseline=None if args.no_baseline else DEFAULT_BASELINE)
+    except ValueError as e:
+        parser.error(str(e))
+    np.savez(args.output, data=data, times=epochs.times, onsets=epochs.onsets,
+             labels=epochs.labels if epochs.labels is not None else np.empty(0, dtype=str),
+             sample_rate=reader.sample_rate)
+    print(f"{len(epochs)} 个分段 {data.shape} → {args.output} (超出数据范围丢弃 {len(epochs.dropped)} 个)")
+    return 0
+
+
+def profiles_main(argv=None):
+    """列出设备协议"""
+    parser = argparse.ArgumentParser(prog="profiles", description="列出已注册的设备协议")
+    parser.add_argument("--load", metavar="JSON", help="额外加载的协议文件")
+    args = parser.parse_args(argv)
+
+    from profiles import available_profiles, get_profile, load_profiles
+
+    if args.load:
+        load_profiles(args.load)
+    for key in available_profiles():
+        print(get_profile(key))
+    return 0
+
+
+def scan_main(argv=None):
+    """扫描 BLE 设备"""
+    parser = argparse.ArgumentParser(prog="scan", description="扫描附近的 BLE 设备")
+    parser.add_argument("--prefix", default=None, help="广播名称前缀")
+    parser.add_argument("--timeout", type=float, default=10.0, help="扫描时长 (秒)")
+    args = parser.parse_args(argv)
+
+    import asyncio
+
+    from discovery import DeviceFilter, discover
+
+    devices = asyncio.run(discover(DeviceFilter(name_prefix=args.prefix), max_matches=None,
+                                   timeout=args.timeout))
+    for seen in devices:
+        print(seen)
+    print(f"共发现 {len(devices)} 个设备")
+    return 0
+
+
+if __name__ == "__main__":
+    print("请通过 main.py 调用，例如: python main.py info <会话目录>")
+    sys.exit(1)
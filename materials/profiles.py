@@ -0,0 +1,284 @@
+"""
+profiles.py - 设备协议描述与向量化解码
+功能说明：
+1. 以数据 (dict / JSON) 声明设备协议: 服务与特征 UUID、启停命令、帧长、帧头帧尾、字段布局
+2. 每个协议只编译一次为 NumPy 结构化 dtype，整块数据帧一次视图转换即可取出全部字段，
+   24 位整数用移位合并向量化完成，不再逐样本 int.from_bytes
+3. split_frames 在缓冲区内整块切分帧: 对齐时一次比较完成，失步时才逐帧重新同步
+4. 新增设备只需增加一条协议描述，无需编写新的解析代码
+
+内置协议:
+    nv-brainrf-8ch   NV-BrainRF 8 通道 (Nordic UART Service)
+    ble-fff0-8ch     旧版 8 通道模块 (0xFFF0 服务，Ble_prog 笔记本)
+    nv-brainrf-2ch   NV-BrainRF 2 通道 FP1/FP2 (同一 33 字节帧，通道 3 为温度)
+"""
+
+import json
+
+import numpy as np
+
+# 字段类型: 名称 -> (每个值的字节数, 基础 dtype)；24 位整数无对应 dtype，按 3 字节取出
+FIELD_TYPES = {
+    "u8": (1, "u1"),
+    "i8": (1, "i1"),
+    "u16be": (2, ">u2"),
+    "i16be": (2, ">i2"),
+    "u16le": (2, "<u2"),
+    "i16le": (2, "<i2"),
+    "u24be": (3, None),
+    "i24be": (3, None),
+}
+
+_NORDIC_UART = {
+    "service_uuid": "6e400001-b5a3-f393-e0a9-e50e24dcca9e",
+    "write_uuid": "6e400002-b5a3-f393-e0a9-e50e24dcca9e",
+    "notify_uuid": "6e400003-b5a3-f393-e0a9-e50e24dcca9e",
+}
+
+# 33 字节帧: 0xA0 | 帧计数 | 8 × 24 位通道 | 3 × 16 位辅助数据 | 0xC0
+_OPENBCI_FRAME = {
+    "frame_length": 33,
+    "header": 0xA0,
+    "footer": 0xC0,
+    "sample_rate": 250,
+    "commands": {"start": "b", "stop": "s"},
+}
+
+BUILTIN_PROFILES = {
+    "nv-brainrf-8ch": dict(
+        _NORDIC_UART, **_OPENBCI_FRAME,
+        name="NV-BrainRF 8 通道",
+        name_prefix="NV-BrainRF",
+        eeg_field="eeg",
+        accel_field="aux",  # 辅助数据为三轴加速度
+        fields=[
+            {"name": "counter", "offset": 1, "type": "u8"},
+            {"name": "eeg", "offset": 2, "type": "i24be", "count": 8},
+            {"name": "aux", "offset": 26, "type": "i16be", "count": 3},
+        ],
+        channel_names=[f"Ch{i + 1}" for i in range(8)],
+    ),
+    "ble-fff0-8ch": dict(
+        _OPENBCI_FRAME,
+        name="8 通道模块 (0xFFF0 服务)",
+        name_prefix=None,
+        service_uuid="0000fff0-0000-1000-8000-00805f9b34fb",
+        write_uuid="0000fff2-0000-1000-8000-00805f9b34fb",
+        notify_uuid="0000fff1-0000-1000-8000-00805f9b34fb",
+        eeg_field="eeg",
+        accel_field="aux",  # 辅助数据为三轴加速度
+        fields=[
+            {"name": "counter", "offset": 1, "type": "u8"},
+            {"name": "eeg", "offset": 2, "type": "i24be", "count": 8},
+            {"name": "aux", "offset": 26, "type": "i16be", "count": 3},
+        ],
+        channel_names=[f"Ch{i + 1}" for i in range(8)],
+    ),
+    "nv-brainrf-2ch": dict(
+        _NORDIC_UART, **_OPENBCI_FRAME,
+        name="NV-BrainRF 2 通道 (FP1/FP2)",
+        name_prefix="NV-BrainRF",
+        eeg_field="eeg",
+        accel_field="accel",
+        fields=[
+            {"name": "counter", "offset": 1, "type": "u8"},
+            {"name": "eeg", "offset": 2, "type": "i24be", "count": 2},
+            {"name": "temperature", "offset": 8, "type": "i24be", "scale": 1.0, "bias": -273.15},
+            {"name": "gyro", "offset": 20, "type": "i16be", "count": 3, "scale": 0.00875},
+            {"name": "accel", "offset": 26, "type": "i16be", "count": 3},
+        ],
+        channel_names=["FP1", "FP2"],
+    ),
+}
+
+
+class DeviceProfile:
+    """编译后的设备协议 (结构化 dtype + 向量化解码器)"""
+
+    def __init__(self, key, spec):
+        self.key = key
+        self.spec = spec
+        self.name = spec.get("name", key)
+        self.name_prefix = spec.get("name_prefix")
+        self.service_uuid = spec["service_uuid"].lower()
+        self.write_uuid = spec["write_uuid"].lower()
+        self.notify_uuid = spec["notify_uuid"].lower()
+        self.commands = {k: v.encode() if isinstance(v, str) else bytes(v)
+                         for k, v in spec.get("commands", {}).items()}
+        self.frame_length = int(spec["frame_length"])
+        self.header = spec.get("header")
+        self.footer = spec.get("footer")
+        self.sample_rate = spec.get("sample_rate")
+        self.eeg_field = spec.get("eeg_field", "eeg")
+        self.accel_field = spec.get("accel_field")  # 三轴加速度字段，无则为 None
+        self._fields = [self._compile_field(f) for f in spec["fields"]]
+        self.dtype = np.dtype({
+            "names": [f["name"] for f in self._fields],
+            "formats": [f["format"] for f in self._fields],
+            "offsets": [f["offset"] for f in self._fields],
+            "itemsize": self.frame_length,
+        })
+        eeg = self.field(self.eeg_field)
+        self.num_channels = eeg["count"]
+        self.channel_names = list(spec.get("channel_names") or
+                                  [f"Ch{i + 1}" for i in range(self.num_channels)])
+
+    def _compile_field(self, field):
+        kind = field["type"]
+        if kind not in FIELD_TYPES:
+            raise ValueError(f"未知字段类型: {kind}")
+        width, base = FIELD_TYPES[kind]
+        count = int(field.get("count", 1))
+        offset = int(field["offset"])
+        if offset < 0 or offset + width * count > self.frame_length:
+            raise ValueError(f"字段 {field['name']} 超出帧长 {self.frame_length}")
+        if base is None:
+            fmt = ("u1", (count, 3))  # 24 位整数按字节取出后移位合并
+        else:
+            fmt = (base, (count,))
+        return {
+            "name": field["name"],
+            "kind": kind,
+            "count": count,
+            "offset": offset,
+            "format": fmt,
+            "scale": field.get("scale"),
+            "bias": field.get("bias"),
+        }
+
+    def field(self, name):
+        for f in self._fields:
+            if f["name"] == name:
+                return f
+        raise KeyError(name)
+
+    @property
+    def field_names(self):
+        return [f["name"] for f in self._fields]
+
+    def command(self, name):
+        return self.commands[name]
+
+    # ---------------------------------------------------------------
+    def split_frames(self, buffer):
+        """
+        从缓冲区头部切出完整帧
+        返回: (frames (n, frame_length) uint8, 消耗字节数, 帧尾校验失败的帧数)
+        调用方据此删除 buffer[:consumed]；未凑满一帧的尾部保留
+        """
+        length = self.frame_length
+        size = len(buffer)
+        if size < length:
+            return np.empty((0, length), dtype=np.uint8), 0, 0
+
+        # 返回的帧均为副本，函数返回后不再持有缓冲区导出，调用方可直接修改 bytearray
+        view = np.frombuffer(buffer, dtype=np.uint8)
+        count = size // length
+        aligned = view[:count * length].reshape(count, length)
+        if self._frames_valid(aligned).all():
+            # 常见情况: 通知恰好由整帧组成
+            return aligned.copy(), count * length, 0
+        return self._resync(view)
+
+    def _frames_valid(self, frames):
+        valid = np.ones(len(frames), dtype=bool)
+        if self.header is not None:
+            valid &= frames[:, 0] == self.header
+        if self.footer is not None:
+            valid &= frames[:, -1] == self.footer
+        return valid
+
+    def _resync(self, view):
+        """失步时按帧头逐帧重新同步 (与原逐包处理一致: 帧尾错误则丢弃整帧)"""
+        length = self.frame_length
+        size = len(view)
+        starts = []
+        failed = 0
+        pos = 0
+        while size - pos >= length:
+            if self.header is not None:
+                hits = np.flatnonzero(view[pos:] == self.header)
+                if len(hits) == 0:
+                    pos = size  # 无帧头，整段丢弃
+                    break
+                start = pos + int(hits[0])
+                if size - start < length:
+                    pos = start
+                    break
+            else:
+                start = pos
+            if self.footer is None or view[start + length - 1] == self.footer:
+                starts.append(start)
+            else:
+                failed += 1
+            pos = start + length
+        if starts:
+            index = np.asarray(starts)[:, None] + np.arange(length)
+            frames = view[index]
+        else:
+            frames = np.empty((0, length), dtype=np.uint8)
+        return frames, pos, failed
+
+    def decode(self, frames):
+        """
+        解码帧数组 (n, frame_length) uint8 或连续的帧字节
+        返回: {字段名: 数组}，计数类字段为 (n,) 整数，其余为 (n, count)；
+              设置了 scale/bias 的字段为 float64
+        """
+        frames = np.ascontiguousarray(frames, dtype=np.uint8).reshape(-1)
+        records = frames.view(self.dtype)
+        decoded = {}
+        for f in self._fields:
+            raw = records[f["name"]]
+            if f["kind"] in ("i24be", "u24be"):
+                b = raw.astype(np.int32)
+                values = (b[..., 0] << 16) | (b[..., 1] << 8) | b[..., 2]
+                if f["kind"] == "i24be":
+                    values = (values ^ 0x800000) - 0x800000
+            else:
+                values = raw.astype(raw.dtype.newbyteorder("="))
+            if f["scale"] is not None or f["bias"] is not None:
+                values = values * (f["scale"] if f["scale"] is not None else 1.0)
+                if f["bias"] is not None:
+                    values = values + f["bias"]
+            decoded[f["name"]] = values[:, 0] if f["count"] == 1 else values
+        return decoded
+
+    def decode_eeg(self, frames):
+        """仅解码 EEG 字段，返回 (n, num_channels) float64"""
+        return self.decode(frames)[self.eeg_field].astype(np.float64)
+
+    def __repr__(self):
+        return f"{self.name} [{self.key}] {self.num_channels} 通道, 帧长 {self.frame_length}"
+
+
+_registry = {}
+
+
+def register_profile(key, spec):
+    """注册 (或覆盖) 一个协议并返回编译结果"""
+    profile = DeviceProfile(key, spec)
+    _registry[key] = profile
+    return profile
+
+
+def load_profiles(path):
+    """从 JSON 文件加载协议 {key: spec, ...}，返回注册的协议名列表"""
+    with open(path, encoding="utf-8") as f:
+        specs = json.load(f)
+    return [register_profile(key, spec).key for key, spec in specs.items()]
+
+
+def get_profile(key):
+    """按名称获取已编译的协议"""
+    if key not in _registry:
+        raise KeyError(f"未知设备协议: {key} (可用: {', '.join(sorted(_registry))})")
+    return _registry[key]
+
+
+def available_profiles():
+    return sorted(_registry)
+
+
+for _key, _spec in BUILTIN_PROFILES.items():
+    register_profile(_key, _spec)
@@ -0,0 +1,228 @@
+"""
+profiling.py - 运行中按需性能分析
+功能说明：
+1. ProfilingController 在不重启会话的前提下采集固定时长的性能数据，可由菜单、
+   命令行参数 (--profile 秒数) 或 SIGUSR1 信号触发，再次触发则提前结束
+2. 两种 CPU 分析方式:
+   - cprofile: 确定性分析，输出 .pstats (可用 snakeviz / pstats 打开) 与按累计耗时排序的文本
+   - sample:   后台线程定时采样主线程调用栈，开销低，输出 flamegraph 折叠格式与热点函数表
+3. 同时启用 tracemalloc，结束时输出按代码行统计的内存增长；跟踪经 membudget 以引用计数
+   与泄漏检测共享，任一方先结束都不会中断另一方的跟踪
+4. 每次采集写入独立目录，meta.json 记录会话元数据 (设备、采样率、计数器等)
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from membudget import acquire_tracing, release_tracing
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+MODES = (MODE_CPROFILE, MODE_SAMPLE)
+
+
+class StackSampler:
+    """后台线程定时采样目标线程的调用栈，按折叠栈计数"""
+
+    def __init__(self, thread_id, interval=0.005, max_depth=64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_folded(self, path):
+        """flamegraph.pl / speedscope 可读的折叠栈格式"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit=40):
+        """[(函数, 自身样本数, 包含样本数)]，按自身样本数排序"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, n, total[name]) for name, n in own.most_common(limit)]
+
+
+class ProfilingController:
+    """
+    按需性能分析控制器
+
+    metadata 为无参函数，返回写入 meta.json 的会话信息 (在结束时调用)
+    on_finished(directory) 在结果写出后调用
+    """
+
+    def __init__(self, output_root, metadata=None, on_finished=None, memory=True, top=40):
+        self.output_root = output_root
+        self.metadata = metadata
+        self.on_finished = on_finished
+        self.memory = memory
+        self.top = top
+        self.mode = None
+        self.directory = None
+        self._profiler = None
+        self._sampler = None
+        self._timer = None
+        self._started = None
+        self._started_wall = None
+        self._tracing = False
+        self._memory_start = None
+        self._memory_usage = None
+
+    @property
+    def active(self):
+        return self.mode is not None
+
+    def toggle(self, duration=10.0, mode=MODE_CPROFILE):
+        """未在采集时开始一次采集，否则提前结束"""
+        if self.active:
+            return self.stop()
+        self.start(duration, mode)
+        return None
+
+    def start(self, duration=10.0, mode=MODE_CPROFILE):
+        """开始采集，duration 秒后自动结束 (None 表示手动结束)"""
+        if self.active:
+            return
+        if mode not in MODES:
+            raise ValueError(f"未知分析方式: {mode}")
+        self.mode = mode
+        self._started = time.perf_counter()
+        self._started_wall = datetime.now()
+
+        if self.memory:
+            acquire_tracing(16)
+            self._tracing = True
+            self._memory_start = tracemalloc.take_snapshot()
+
+        if mode == MODE_CPROFILE:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+
+        if duration:
+            self._timer = asyncio.get_event_loop().call_later(duration, self.stop)
+
+    def stop(self):
+        """结束采集并写出结果，返回输出目录"""
+        if not self.active:
+            return None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        elapsed = time.perf_counter() - self._started
+
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        memory_end = None
+        if self._memory_start is not None and tracemalloc.is_tracing():  # 外部代码可能直接停止了跟踪
+            memory_end = tracemalloc.take_snapshot()
+            self._memory_usage = tracemalloc.get_traced_memory()
+        if self._tracing:
+            release_tracing()
+
+        directory = os.path.join(
+            self.output_root, f"profile_{self._started_wall.strftime('%Y%m%d_%H%M%S')}_{self.mode}")
+        os.makedirs(directory, exist_ok=True)
+        self._write_cpu(directory)
+        if memory_end is not None:
+            self._write_memory(directory, memory_end)
+        self._write_meta(directory, elapsed)
+
+        self.mode = None
+        self.directory = directory
+        self._profiler = None
+        self._sampler = None
+        self._memory_start = None
+        self._tracing = False
+        if self.on_finished is not None:
+            self.on_finished(directory)
+        return directory
+
+    def _write_cpu(self, directory):
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(directory, "cpu.pstats"))
+            text = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=text)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            stats.sort_stats("tottime").print_stats(self.top)
+            with open(os.path.join(directory, "cpu.txt"), "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+        elif self._sampler is not None:
+            sampler = self._sampler
+            sampler.write_folded(os.path.join(directory, "cpu.folded"))
+            with open(os.path.join(directory, "cpu.txt"), "w", encoding="utf-8") as f:
+                f.write(f"采样间隔 {sampler.interval * 1000:.1f} ms, 共 {sampler.samples} 个样本\n")
+                f.write(f"{'自身%':>8}{'包含%':>8}  函数\n")
+                total = max(1, sampler.samples)
+                for name, own, inclusive in sampler.top_functions(self.top):
+                    f.write(f"{100.0 * own / total:>8.1f}{100.0 * inclusive / total:>8.1f}  {name}\n")
+
+    def _write_memory(self, directory, snapshot):
+        stats = snapshot.compare_to(self._memory_start, "lineno")
+        current, peak = self._memory_usage
+        with open(os.path.join(directory, "memory.txt"), "w", encoding="utf-8") as f:
+            f.write(f"当前跟踪内存 {current / 1024:.1f} KiB, 峰值 {peak / 1024:.1f} KiB\n")
+            f.write(f"采集期间内存增长最多的 {self.top} 行:\n")
+            for stat in stats[:self.top]:
+                f.write(f"{stat}\n")
+
+    def _write_meta(self, directory, elapsed):
+        meta = {
+            "mode": self.mode,
+            "started": self._started_wall.isoformat(timespec="milliseconds"),
+            "duration_seconds": round(elapsed, 3),
+            "pid": os.getpid(),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+        }
+        if self.metadata is not None:
+            try:
+                meta["session"] = self.metadata()
+            except Exception as e:
+                meta["session_error"] = str(e)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
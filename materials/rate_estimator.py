@@ -0,0 +1,132 @@
+"""
+rate_estimator.py - 采样率实测与流元数据
+功能说明：
+1. 在数据流开始的前几秒内，利用帧计数 (packet[1]) 与通知到达时间实测有效采样率
+2. 帧计数回绕 (mod 256) 与丢帧都会被展开，丢帧不会拉低测得的设备采样率
+3. 测得的采样率以 StreamInfo 形式发布，下游环节 (缓冲区/滤波器/频谱窗/录制器)
+   统一按"秒"换算自身长度
+"""
+
+import numpy as np
+
+# 常见 ADS1299 类设备的标称采样率，实测值在容差内时吸附到标称值
+NOMINAL_RATES = (125.0, 250.0, 500.0, 1000.0, 2000.0, 4000.0)
+NOMINAL_TOLERANCE = 0.05
+
+
+def seconds_to_samples(seconds, sample_rate):
+    """将时长(秒)换算为采样点数, 至少为 1"""
+    return max(1, int(round(seconds * sample_rate)))
+
+
+class StreamInfo:
+    """流元数据 - 由采集端发布，下游按需读取"""
+
+    def __init__(self, sample_rate, num_channels, measured_rate=None, source="measured"):
+        self.sample_rate = float(sample_rate)
+        self.num_channels = int(num_channels)
+        self.measured_rate = float(measured_rate if measured_rate is not None else sample_rate)
+        self.source = source
+
+    def samples(self, seconds):
+        """按当前采样率将秒换算为采样点数"""
+        return seconds_to_samples(seconds, self.sample_rate)
+
+    def seconds(self, samples):
+        """将采样点数换算为秒"""
+        return samples / self.sample_rate
+
+    def __repr__(self):
+        return (f"StreamInfo(sample_rate={self.sample_rate:g}, "
+                f"measured_rate={self.measured_rate:.2f}, "
+                f"num_channels={self.num_channels}, source={self.source!r})")
+
+
+class SampleRateEstimator:
+    """
+    基于帧计数与到达时间的采样率估计器
+
+    每次 BLE 通知调用一次 update()，传入该通知内解析出的帧计数。
+    预热时长到达后对 (到达时间, 展开后的帧序号) 做最小二乘拟合，斜率即有效采样率；
+    同一通知内多帧共享到达时间，拟合可抵消 BLE 连接间隔带来的抖动。
+    """
+
+    def __init__(self, num_channels, warmup_seconds=3.0, min_frames=64, counter_modulo=256,
+                 budget=None):
+        self.num_channels = num_channels
+        self.budget = budget  # membudget.MemoryBudget，限制拟合点数 (帧计数异常导致迟迟无法确定时)
+        self.warmup_seconds = warmup_seconds
+        self.min_frames = min_frames
+        self.counter_modulo = counter_modulo
+        self.reset()
+
+    def reset(self):
+        """重置估计状态 (重新连接时调用)"""
+        self.info = None
+        self._times = []
+        self._indices = []
+        self._last_counter = None
+        self._frame_index = 0
+        self._first_time = None
+
+    def lock(self, info):
+        """采样率已知 (回放、仿真) 时跳过实测"""
+        self.info = info
+        self._times = []
+        self._indices = []
+
+    @property
+    def locked(self):
+        """采样率是否已确定"""
+        return self.info is not None
+
+    def update(self, arrival_time, frame_counters):
+        """
+        输入一次通知的到达时间与帧计数列表
+        返回: 首次确定采样率时返回 StreamInfo，其余情况返回 None
+        """
+        if self.locked or not frame_counters:
+            return None
+
+        if self._first_time is None:
+            self._first_time = arrival_time
+
+        for counter in frame_counters:
+            if self._last_counter is not None:
+                step = (counter - self._last_counter) % self.counter_modulo
+                if step == 0:
+                    continue  # 重复帧
+                self._frame_index += step
+            self._last_counter = counter
+        # 通知内最后一帧对应到达时刻
+        self._times.append(arrival_time - self._first_time)
+        self._indices.append(self._frame_index)
+        if self.budget is not None and self.budget.enforce(self._times):
+            del self._indices[:len(self._indices) - len(self._times)]
+
+        elapsed = arrival_time - self._first_time
+        if elapsed < self.warmup_seconds or self._frame_index < self.min_frames:
+            return None
+
+        measured = self._fit_rate()
+        if measured is None:
+            return None
+        self.info = StreamInfo(self._snap(measured), self.num_channels, measured_rate=measured)
+        return self.info
+
+    def _fit_rate(self):
+        """最小二乘拟合帧序号-时间斜率"""
+        t = np.asarray(self._times, dtype=np.float64)
+        n = np.asarray(self._indices, dtype=np.float64)
+        if len(t) < 2 or np.ptp(t) <= 0:
+            return None
+        slope, _ = np.polyfit(t, n, 1)
+        return float(slope) if slope > 0 else None
+
+    @staticmethod
+    def _snap(measured):
+        """实测值接近标称采样率时吸附到标称值"""
+        for nominal in NOMINAL_RATES:
+            if abs(measured - nominal) <= nominal * NOMINAL_TOLERANCE:
+                return nominal
+        return measured
@@ -0,0 +1,535 @@
+"""
+recording.py - 会话录制与多分辨率金字塔
+功能说明：
+1. SessionRecorder: 将数据块追加写入会话目录 (eeg.f32 为按样本交错的 float32 原始值)
+2. 写入的同时增量构建 min/max/mean 金字塔，第 k 层每个条目覆盖 2^k 个样本
+3. SessionReader: 以内存映射方式打开会话，按时间范围与屏幕宽度自动选择金字塔层级，
+   读取量只与屏幕像素数相关，与时间跨度无关
+4. 事件标记 (markers.py) 按会话内样本序号逐行追加到 markers.csv
+5. 写入时以 Welford 累加器维护逐通道均值与标准差，写入元数据供会话目录 (catalog.py) 登记
+6. codec=True 时原始数据以无损块编码 (codec.py) 写入 eeg.egc 代替 eeg.f32，体积约为其 40%；
+   读取时按块头建立索引，read 只解码与请求范围重叠的块
+7. RecordingWriter 在后台线程中执行录制器的全部写操作，采集回调只做入队；
+   空闲时按固定间隔 flush，程序异常退出时元数据与已编码数据最多落后一个间隔；
+   待写数据块受内存预算限制，磁盘跟不上时丢弃新块并作为间隙 (reason=writer_overflow) 写入 meta.json
+
+会话目录结构:
+    meta.json          元数据 (采样率、通道数、设备、开始时间、样本数、金字塔层级、逐通道均值/标准差)
+    eeg.f32            原始数据 (n_samples, n_channels) float32, 24 位整数可无损表示
+    eeg.egc            原始数据的无损编码块 (codec=True 时代替 eeg.f32)
+    pyramid_L{k}.f32   第 k 层 (n_k, 3, n_channels) float32, 依次为 min / max / mean
+    markers.csv        事件标记 (sample, timestamp, label, code, source)，无标记时不存在
+    accel.f32          三轴加速度 (n_samples, 3) float32，与 eeg.f32 逐样本对齐，设备无加速度时不存在
+"""
+
+import bisect
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import codec
+from channel_stats import RunningStats
+
+META_FILE = "meta.json"
+EEG_FILE = "eeg.f32"
+EEG_CODEC_FILE = "eeg.egc"
+CODEC_BLOCK_SAMPLES = 2048  # 编码块长度: 约 8 秒 @250Hz，兼顾压缩比与中断时的丢失量
+PYRAMID_FILE = "pyramid_L{level}.f32"
+MARKERS_FILE = "markers.csv"
+ACCEL_FILE = "accel.f32"
+ACCEL_AXES = 3
+MARKER_FIELDS = ("sample", "timestamp", "label", "code", "source")
+SAMPLE_DTYPE = np.float32
+
+
+def new_session_dir(root, prefix="session"):
+    """在 root 下创建以时间命名的会话目录"""
+    name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class _PyramidLevel:
+    """金字塔单层: 累积不足一个条目的尾部数据并追加写入文件"""
+
+    def __init__(self, path, level):
+        self.level = level
+        self.path = path
+        self.count = 0
+        self.carry = None  # 尚未凑成一对的本层条目 (1, 3, n_channels)
+        self._file = open(path, "ab")
+
+    def write(self, entries):
+        """追加写入条目数组 (n, 3, n_channels)"""
+        if len(entries):
+            self._file.write(np.ascontiguousarray(entries, dtype=SAMPLE_DTYPE).tobytes())
+            self.count += len(entries)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SessionRecorder:
+    """
+    会话录制器
+
+    - 最底层金字塔直接由原始样本按 2^min_level 聚合，其上各层由下一层两两合并
+    - 每层只保留不足一个条目的残留数据，内存占用与录制时长无关
+    - 结束录制时不足一个条目的尾部只存在于原始数据中，查看时按原始层读取即可
+    """
+
+    def __init__(self, directory, stream_info, device="", min_level=3, max_level=16,
+                 extra_meta=None, sample_origin=0, codec=False):
+        self.directory = directory
+        self.stream_info = stream_info
+        self.num_channels = stream_info.num_channels
+        self.min_level = min_level
+        self.max_level = max_level
+        self.samples_written = 0
+        self.sample_origin = sample_origin  # 录制开始时的流样本序号，标记据此换算为会话内序号
+        self.markers_written = 0
+        self.channel_stats = RunningStats(self.num_channels)
+        self._markers = None
+        self._marker_writer = None
+        self._accel = None
+        self.codec = codec
+        self._codec_carry = []  # 尚未凑满一个编码块的数据块
+        self._codec_pending = 0
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+
+        self.meta = {
+            "version": 1,
+            "device": device,
+            "sample_rate": stream_info.sample_rate,
+            "measured_rate": stream_info.measured_rate,
+            "num_channels": self.num_channels,
+            "dtype": "float32",
+            "start_time": datetime.now().isoformat(timespec="milliseconds"),
+            "start_monotonic": time.monotonic(),
+            "pyramid_levels": list(range(min_level, max_level + 1)),
+            "n_samples": 0,
+            "sample_origin": sample_origin,
+        }
+        if codec:
+            self.meta["encoding"] = "egc1"
+        if extra_meta:
+            self.meta.update(extra_meta)
+
+        self._eeg = open(os.path.join(directory, EEG_CODEC_FILE if codec else EEG_FILE), "ab")
+        self._levels = [
+            _PyramidLevel(os.path.join(directory, PYRAMID_FILE.format(level=k)), k)
+            for k in range(min_level, max_level + 1)
+        ]
+        # 最底层的原始样本残留
+        self._base_span = 1 << min_level
+        self._raw_carry = np.empty((0, self.num_channels), dtype=np.float64)
+        self._write_meta()
+
+    def write(self, block, accel=None):
+        """
+        追加一个数据块 (n_samples, n_channels)
+        accel 为同一批帧的三轴加速度 (n_samples, 3)；首次提供时创建 accel.f32，
+        此后缺失的数据块以 NaN 填充，保持与 EEG 逐样本对齐
+        """
+        if self.closed or len(block) == 0:
+            return
+        block = np.asarray(block, dtype=np.float64)
+        if accel is not None or self._accel is not None:
+            self._write_accel(len(block), accel)
+        if self.codec:
+            self._write_codec(block)
+        else:
+            self._eeg.write(block.astype(SAMPLE_DTYPE).tobytes())
+        self.samples_written += len(block)
+        self.channel_stats.add(block)
+
+        data = np.concatenate([self._raw_carry, block]) if len(self._raw_carry) else block
+        full = len(data) // self._base_span * self._base_span
+        self._raw_carry = data[full:].copy()
+        if full:
+            chunks = data[:full].reshape(-1, self._base_span, self.num_channels)
+            entries = np.stack([chunks.min(axis=1), chunks.max(axis=1), chunks.mean(axis=1)], axis=1)
+            self._push_level(0, entries)
+
+    def _write_accel(self, n, accel):
+        if self._accel is None:
+            self._accel = open(os.path.join(self.directory, ACCEL_FILE), "ab")
+            self.meta["accel_axes"] = ACCEL_AXES
+            if self.samples_written:  # 录制中途才出现加速度数据时补齐此前的样本
+                self._accel.write(np.full((self.samples_written, ACCEL_AXES), np.nan, SAMPLE_DTYPE).tobytes())
+        if accel is None:
+            accel = np.full((n, ACCEL_AXES), np.nan)
+        self._accel.write(np.asarray(accel, dtype=SAMPLE_DTYPE).reshape(n, ACCEL_AXES).tobytes())
+
+    def _push_level(self, index, entries):
+        """写入第 index 层并两两合并推进到上一层"""
+        level = self._levels[index]
+        level.write(entries)
+        if index + 1 >= len(self._levels):
+            return
+
+        if level.carry is not None:
+            entries = np.concatenate([level.carry, entries])
+        pairs = len(entries) // 2
+        level.carry = entries[pairs * 2:].copy() if len(entries) % 2 else None
+        if pairs:
+            e = entries[:pairs * 2].reshape(pairs, 2, 3, self.num_channels)
+            merged = np.stack([
+                e[:, :, 0].min(axis=1),
+                e[:, :, 1].max(axis=1),
+                e[:, :, 2].mean(axis=1),
+            ], axis=1)
+            self._push_level(index + 1, merged)
+
+    def mark_gap(self, gap):
+        """在时间线上记录一次数据中断 (位置为当前已写入的样本数)"""
+        record = gap.as_dict()
+        record["sample_index"] = self.samples_written
+        self.meta.setdefault("gaps", []).append(record)
+
+    def mark_dropped(self, samples, reason="writer_overflow"):
+        """记录在当前位置被丢弃、未写入的样本 (与断线间隙一样计入 gaps)"""
+        self.meta.setdefault("gaps", []).append({
+            "duration_seconds": round(samples / self.stream_info.sample_rate, 4),
+            "missing_samples": int(samples),
+            "sample_index": self.samples_written,
+            "reason": reason,
+        })
+
+    def add_marker(self, marker):
+        """追加一个事件标记 (markers.Marker，sample 为流样本序号)"""
+        if self.closed or marker.sample is None:
+            return
+        if self._markers is None:
+            path = os.path.join(self.directory, MARKERS_FILE)
+            new = not os.path.exists(path)
+            self._markers = open(path, "a", encoding="utf-8", newline="")
+            self._marker_writer = csv.writer(self._markers)
+            if new:
+                self._marker_writer.writerow(MARKER_FIELDS)
+        self._marker_writer.writerow([marker.sample - self.sample_origin, f"{marker.timestamp:.6f}",
+                                      marker.label, "" if marker.code is None else marker.code,
+                                      marker.source])
+        self._markers.flush()  # 标记稀少，逐条落盘
+        self.markers_written += 1
+
+    def _write_codec(self, block):
+        """累积到 CODEC_BLOCK_SAMPLES 后整块编码追加"""
+        self._codec_carry.append(block)
+        self._codec_pending += len(block)
+        if self._codec_pending >= CODEC_BLOCK_SAMPLES:
+            self._flush_codec(CODEC_BLOCK_SAMPLES)
+
+    def _flush_codec(self, block_samples=None):
+        """编码残留数据: 指定 block_samples 时只写出整块，否则全部写出"""
+        if not self._codec_pending:
+            return
+        data = np.concatenate(self._codec_carry)
+        end = len(data) if block_samples is None else len(data) // block_samples * block_samples
+        step = block_samples or len(data)
+        for start in range(0, end, step):
+            self._eeg.write(codec.encode_block(data[start:start + step]))
+        self._codec_carry = [data[end:]] if end < len(data) else []
+        self._codec_pending = len(data) - end
+
+    def flush(self):
+        """刷新文件缓冲并更新元数据 (编码模式下残留数据写为一个短块)"""
+        if self.codec:
+            self._flush_codec()
+        self._eeg.flush()
+        if self._accel is not None:
+            self._accel.flush()
+        for level in self._levels:
+            level.flush()
+        self._write_meta()
+
+    def close(self):
+        """结束录制"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.codec:
+            self._flush_codec()
+        self._eeg.close()
+        if self._accel is not None:
+            self._accel.close()
+        for level in self._levels:
+            level.close()
+        if self._markers is not None:
+            self._markers.close()
+        self._write_meta()
+
+    def _write_meta(self):
+        """写入元数据 (先写临时文件再替换，避免中途中断导致损坏)"""
+        self.meta["n_samples"] = self.samples_written
+        self.meta["duration_seconds"] = self.samples_written / self.stream_info.sample_rate
+        self.meta["pyramid_counts"] = {str(level.level): level.count for level in self._levels}
+        self.meta["n_markers"] = self.markers_written
+        self.meta["channel_stats"] = {"mean": self.channel_stats.mean.tolist(),
+                                      "std": self.channel_stats.std.tolist()}
+        path = os.path.join(self.directory, META_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+
+class RecordingWriter:
+    """
+    SessionRecorder 的后台写线程包装 (接口与录制器相同)
+
+    - write / mark_gap / add_marker 只把操作放入队列，按调用顺序在写线程中执行
+    - 距上次落盘超过 flush_seconds 时调用录制器的 flush (更新 meta.json 并写出编码残留)
+    - close 等待队列写完后返回；写线程出错时停止写入，错误保存在 error 中
+    - budget (membudget.MemoryBudget) 限制排队的写操作数: 已满时丢弃新数据块 (drop_newest)，
+      丢弃的样本数在下一次写入前以 mark_dropped 记入时间线，close 的等待时间因此有上限
+    """
+
+    def __init__(self, recorder, flush_seconds=5.0, budget=None):
+        self.recorder = recorder
+        self.flush_seconds = flush_seconds
+        self.budget = budget
+        self.error = None
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+        self._unmarked = 0  # 已丢弃、尚未记入时间线的样本数 (仅调用方线程访问)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def directory(self):
+        return self.recorder.directory
+
+    @property
+    def meta(self):
+        return self.recorder.meta
+
+    @property
+    def samples_written(self):
+        return self.recorder.samples_written
+
+    @property
+    def pending(self):
+        """尚未执行的写操作数"""
+        return self._queue.qsize()
+
+    def write(self, block, accel=None):
+        if self.budget is not None:
+            pending = self._queue.qsize() + 1
+            if pending > self.budget.limit:
+                self.budget.observe(pending, 1)
+                self.dropped_blocks += 1
+                self.dropped_samples += len(block)
+                self._unmarked += len(block)
+                return
+            self.budget.observe(pending)
+        self._mark_dropped()
+        self._queue.put((self.recorder.write, (block, accel)))
+
+    def _mark_dropped(self):
+        if self._unmarked:
+            self._queue.put((self.recorder.mark_dropped, (self._unmarked,)))
+            self._unmarked = 0
+
+    def mark_gap(self, gap):
+        self._queue.put((self.recorder.mark_gap, (gap,)))
+
+    def add_marker(self, marker):
+        self._queue.put((self.recorder.add_marker, (marker,)))
+
+    def flush(self):
+        self._queue.put((self.recorder.flush, ()))
+
+    def close(self):
+        """写完队列中的操作并结束录制"""
+        if not self._thread.is_alive():
+            return
+        self._mark_dropped()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = (self.recorder.flush, ())
+            if item is None:
+                break
+            if self.error is not None:
+                continue  # 出错后丢弃后续写入，等待 close
+            function, args = item
+            try:
+                function(*args)
+                now = time.monotonic()
+                if function == self.recorder.flush:
+                    last_flush = now
+                elif now - last_flush >= self.flush_seconds:
+                    self.recorder.flush()
+                    last_flush = now
+            except (OSError, ValueError) as e:
+                self.error = e
+        try:
+            self.recorder.close()
+        except OSError as e:
+            self.error = self.error or e
+
+
+class SessionReader:
+    """只读打开会话目录 (内存映射；编码会话按块索引解码)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.sample_rate = float(self.meta["sample_rate"])
+        self.num_channels = int(self.meta["num_channels"])
+        self.levels = list(self.meta.get("pyramid_levels", []))
+        self._codec_index = None
+        if (not os.path.exists(os.path.join(directory, EEG_FILE))
+                and os.path.exists(os.path.join(directory, EEG_CODEC_FILE))):
+            with open(os.path.join(directory, EEG_CODEC_FILE), "rb") as f:
+                self._codec_index = codec.scan_index(f)
+            self._eeg = None  # samples() 首次调用时整体解码
+        else:
+            self._eeg = self._map(EEG_FILE, (self.num_channels,))
+        self._pyramid = {}
+
+    def _map(self, name, row_shape):
+        """内存映射一个数据文件，空文件返回空数组"""
+        path = os.path.join(self.directory, name)
+        row_size = int(np.prod(row_shape))
+        if not os.path.exists(path) or os.path.getsize(path) < row_size * 4:
+            return np.empty((0,) + row_shape, dtype=SAMPLE_DTYPE)
+        flat = np.memmap(path, dtype=SAMPLE_DTYPE, mode="r")
+        rows = len(flat) // row_size
+        return flat[:rows * row_size].reshape((rows,) + row_shape)
+
+    @property
+    def encoded(self):
+        return self._codec_index is not None
+
+    @property
+    def n_samples(self):
+        if self.encoded:
+            return self._codec_index[-1][1] + self._codec_index[-1][2] if self._codec_index else 0
+        return len(self._eeg)
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sample_rate
+
+    def samples(self):
+        """原始数据的内存映射视图 (n_samples, n_channels)；编码会话首次调用时整体解码并缓存"""
+        if self._eeg is None:
+            self._eeg = self.read(0, self.n_samples)
+        return self._eeg
+
+    def read(self, start, end, name=EEG_FILE):
+        """
+        以普通文件读取 [start, end) 样本 (不经内存映射)，整夜数据流式处理时常驻内存只有当前块
+        name 为 ACCEL_FILE 时读取加速度；编码会话只解码与范围重叠的块
+        """
+        if name == EEG_FILE and self.encoded:
+            return self._read_encoded(start, end)
+        columns = self.num_channels if name == EEG_FILE else int(self.meta.get("accel_axes", ACCEL_AXES))
+        row_bytes = columns * np.dtype(SAMPLE_DTYPE).itemsize
+        with open(os.path.join(self.directory, name), "rb") as f:
+            f.seek(start * row_bytes)
+            data = np.fromfile(f, dtype=SAMPLE_DTYPE, count=max(0, end - start) * columns)
+        return data[:len(data) // columns * columns].reshape(-1, columns)
+
+    def _read_encoded(self, start, end):
+        start, end = max(0, start), min(end, self.n_samples)
+        if end <= start:
+            return np.empty((0, self.num_channels), dtype=SAMPLE_DTYPE)
+        starts = [entry[1] for entry in self._codec_index]
+        first = bisect.bisect_right(starts, start) - 1
+        last = bisect.bisect_left(starts, end)
+        offset = self._codec_index[first][0]
+        with open(os.path.join(self.directory, EEG_CODEC_FILE), "rb") as f:
+            f.seek(offset)
+            if last < len(self._codec_index):
+                buffer = f.read(self._codec_index[last][0] - offset)
+            else:
+                buffer = f.read()
+        blocks, position = [], 0
+        for _ in range(last - first):  # 只解码索引内的块，末尾不完整块不读取
+            block, position = codec.decode_block(buffer, position)
+            blocks.append(block)
+        data = np.concatenate(blocks)
+        skip = start - self._codec_index[first][1]
+        return data[skip:skip + end - start].astype(SAMPLE_DTYPE)
+
+    def accel(self):
+        """三轴加速度的内存映射视图 (n_samples, 3)，会话无加速度数据时返回 None"""
+        if not os.path.exists(os.path.join(self.directory, ACCEL_FILE)):
+            return None
+        return self._map(ACCEL_FILE, (int(self.meta.get("accel_axes", ACCEL_AXES)),))
+
+    def markers(self):
+        """事件标记列表 [{sample, timestamp, label, code, source}]，sample 为会话内样本序号"""
+        path = os.path.join(self.directory, MARKERS_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["sample"] = int(row["sample"])
+            row["timestamp"] = float(row["timestamp"])
+            row["code"] = int(row["code"]) if row["code"].lstrip("-").isdigit() else (row["code"] or None)
+        return rows
+
+    def pyramid(self, level):
+        """第 level 层的内存映射视图 (n, 3, n_channels)"""
+        if level not in self._pyramid:
+            self._pyramid[level] = self._map(PYRAMID_FILE.format(level=level), (3, self.num_channels))
+        return self._pyramid[level]
+
+    def choose_level(self, n_samples, max_points):
+        """选择使条目数不超过 max_points 的最低层级, 原始数据已足够时返回 0"""
+        if n_samples <= max_points:
+            return 0
+        for level in self.levels:
+            if n_samples >> level <= max_points:
+                return level
+        return self.levels[-1] if self.levels else 0
+
+    def fetch(self, t_start, t_end, max_points):
+        """
+        读取 [t_start, t_end) 秒范围内的数据，条目数不超过 max_points (通常为屏幕像素宽度)
+        返回: (level, x 秒, min, max, mean)，后三者形状为 (n_channels, m)；原始层 min=max=mean
+        """
+        start = max(0, int(t_start * self.sample_rate))
+        end = min(self.n_samples, int(np.ceil(t_end * self.sample_rate)))
+        if end <= start:
+            empty = np.empty((self.num_channels, 0))
+            return 0, np.empty(0), empty, empty, empty
+
+        level = self.choose_level(end - start, max_points)
+        if level == 0:
+            raw = self._eeg[start:end] if self._eeg is not None else self.read(start, end)
+            data = np.asarray(raw, dtype=np.float64).T
+            x = np.arange(start, end) / self.sample_rate
+            return 0, x, data, data, data
+
+        span = 1 << level
+        table = self.pyramid(level)
+        i0 = start // span
+        i1 = min(len(table), -(-end // span))
+        entries = np.asarray(table[i0:i1], dtype=np.float64)
+        x = (np.arange(i0, i1) * span + span / 2) / self.sample_rate
+        return level, x, entries[:, 0].T, entries[:, 1].T, entries[:, 2].T
@@ -0,0 +1,117 @@
+"""
+session_review.py - 会话回看窗口 (基于多分辨率金字塔)
+功能说明：
+1. 打开 recording.py 录制的会话目录，8 通道共享 x 轴
+2. 平移/缩放时按当前可见时间范围与视图像素宽度选择金字塔层级，
+   读取量由屏幕宽度决定，与会话时长无关，数小时的录制同样可以流畅浏览
+3. 金字塔层以 min/max 包络折线绘制，放大到原始分辨率后自动切换为原始波形
+
+用法:
+    python session_review.py <会话目录>
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore, QtWidgets
+
+from recording import META_FILE, SessionReader
+
+
+class SessionReviewWindow(QtWidgets.QMainWindow):
+    def __init__(self, directory):
+        super().__init__()
+        self.reader = SessionReader(directory)
+        self.setWindowTitle(f"会话回看 - {directory}")
+        self._init_ui()
+        self._reload_timer = QtCore.QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(30)  # 合并连续的平移/缩放事件
+        self._reload_timer.timeout.connect(self._reload)
+        self.plots[0].setXRange(0, max(self.reader.duration, 1e-3), padding=0)
+        self._reload()
+
+    def _init_ui(self):
+        """初始化界面"""
+        main_widget = QtWidgets.QWidget()
+        self.setCentralWidget(main_widget)
+        layout = QtWidgets.QVBoxLayout(main_widget)
+
+        meta = self.reader.meta
+        self.info_label = QtWidgets.QLabel(
+            f"设备: {meta.get('device') or '未知'} | 开始: {meta.get('start_time', '--')} | "
+            f"采样率: {self.reader.sample_rate:g} Hz | 时长: {self.reader.duration:.1f} 秒", self)
+        layout.addWidget(self.info_label)
+
+        self.graph = pg.GraphicsLayoutWidget()
+        layout.addWidget(self.graph)
+        self.level_label = QtWidgets.QLabel("层级: --", self)
+        self.statusBar().addPermanentWidget(self.level_label)
+
+        self.plots = []
+        self.curves = []
+        for i in range(self.reader.num_channels):
+            plot = self.graph.addPlot(row=i, col=0)
+            plot.setLabel('left', f'Ch{i + 1}')
+            plot.showGrid(x=True, y=True)
+            plot.setLimits(xMin=0, xMax=max(self.reader.duration, 1e-3))
+            if self.plots:
+                plot.setXLink(self.plots[0])
+            curve = plot.plot(pen=pg.mkPen(color=pg.intColor(i)))
+            curve.setClipToView(True)
+            self.plots.append(plot)
+            self.curves.append(curve)
+        self.plots[-1].setLabel('bottom', '时间', 's')
+        self.plots[0].sigXRangeChanged.connect(lambda *args: self._reload_timer.start())
+
+    def _reload(self):
+        """按当前可见范围读取合适层级的数据"""
+        view = self.plots[0].getViewBox()
+        t_start, t_end = view.viewRange()[0]
+        max_points = max(64, int(view.width()))
+        level, x, low, high, mean = self.reader.fetch(t_start, t_end, max_points)
+
+        if level == 0:
+            for curve, y in zip(self.curves, low):
+                curve.setData(x, y)
+        else:
+            # min/max 交错为包络折线，每个条目绘制一条竖线段
+            xx = np.repeat(x, 2)
+            for curve, lo, hi in zip(self.curves, low, high):
+                yy = np.empty(len(lo) * 2)
+                yy[0::2] = lo
+                yy[1::2] = hi
+                curve.setData(xx, yy)
+
+        for plot in self.plots:
+            plot.enableAutoRange(axis='y')
+        name = "原始" if level == 0 else f"L{level} (每点 {1 << level} 样本)"
+        self.level_label.setText(f"层级: {name} | 点数: {len(x)}")
+
+
+def parse_args(argv):
+    """命令行参数 (其余参数交给 Qt)；目录不是会话目录时报告用法错误"""
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]) if argv else None,
+                                     description="会话回看 (多分辨率金字塔)")
+    parser.add_argument("directory", help="会话目录 (含 meta.json)")
+    args, qt_args = parser.parse_known_args(argv[1:])
+    if not os.path.isfile(os.path.join(args.directory, META_FILE)):
+        parser.error(f"不是会话目录 (缺少 {META_FILE}): {args.directory}")
+    return args, qt_args
+
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    args, qt_args = parse_args(argv)
+    app = QtWidgets.QApplication(argv[:1] + qt_args)
+    window = SessionReviewWindow(args.directory)
+    window.resize(1280, 900)
+    window.show()
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
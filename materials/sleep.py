@@ -0,0 +1,212 @@
+"""
+sleep.py - 睡眠分期特征提取 (30 秒分段，离线向量化)
+功能说明：
+1. 整夜录制按块从文件流式读取 (默认每块 20 个分段，不经内存映射)，regular_epochs 在块上建立
+   (分段, 通道, 样本) 视图，再以滑动窗口视图切出 Welch 子段，
+   一次批量 FFT 得到全部分段、全部通道的功率谱，内存占用与录制时长无关
+2. 每个分段一行特征 (通道平均):
+   - 频谱: 各睡眠频段绝对/相对功率、delta/beta 比、95% 频谱边缘频率、归一化频谱熵
+   - 幅度: 标准差、峰峰值、Hjorth 活动度/复杂度
+   - 质量: 平线、饱和比例、是否含断线间隙
+   - 加速度 (会话含 accel.f32 时): 合加速度标准差、体动秒数比例、三轴均值 (体位)
+3. 输出 CSV 特征表 (分段序号、起始秒数与时钟时刻)，可直接用于分期模型与睡眠图
+
+用法:
+    python main.py sleep <会话目录> <输出 csv> [--epoch-seconds 30] [--channels Ch1,Ch2]
+"""
+
+import argparse
+import csv
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from batch import CLIP_LEVEL, FLAT_STD
+from epochs import regular_epochs
+from recording import ACCEL_FILE, SessionReader
+from spectral import BandPowerAnalyzer
+
+# 睡眠频段 (Hz)，sigma 为纺锤波频段
+SLEEP_BANDS = {
+    "delta": (0.5, 4.0),
+    "theta": (4.0, 8.0),
+    "alpha": (8.0, 12.0),
+    "sigma": (12.0, 16.0),
+    "beta": (16.0, 30.0),
+}
+ANALYSIS_RANGE = (0.5, 30.0)  # 总功率、频谱边缘与频谱熵的频率范围
+EDGE_FRACTION = 0.95
+MOVEMENT_STD = 20.0  # 1 秒窗口内合加速度标准差超过该值 (原始计数) 视为体动
+
+
+class SleepFeatureExtractor:
+    """
+    固定分段长度的睡眠特征计算器
+
+    compute(epochs, accel) 输入 (n_epochs, n_channels, epoch_samples) 与可选的
+    (n_epochs, 3, epoch_samples) 加速度，返回 {列名: 长度 n_epochs 的数组}
+    """
+
+    def __init__(self, sample_rate, epoch_seconds=30.0, welch_seconds=4.0, movement_std=MOVEMENT_STD):
+        self.sample_rate = float(sample_rate)
+        self.epoch_samples = int(round(epoch_seconds * self.sample_rate))
+        self.welch_samples = min(self.epoch_samples, int(round(welch_seconds * self.sample_rate)))
+        self.welch_step = max(1, self.welch_samples // 2)
+        self.movement_std = movement_std
+        self.analyzer = BandPowerAnalyzer(self.sample_rate, self.welch_samples, SLEEP_BANDS)
+        freqs = self.analyzer.freqs
+        self.df = freqs[1] - freqs[0]
+        self.range_mask = (freqs >= ANALYSIS_RANGE[0]) & (freqs < ANALYSIS_RANGE[1])
+        self.range_freqs = freqs[self.range_mask]
+        self.second = max(1, int(round(self.sample_rate)))
+
+    def compute(self, epochs, accel=None):
+        columns = {}
+        epochs = np.asarray(epochs, dtype=np.float64)
+
+        # Welch: (分段, 通道, 子段, 子段样本) 视图上一次批量 FFT，子段平均后再跨通道平均
+        segments = sliding_window_view(epochs, self.welch_samples, axis=-1)[..., ::self.welch_step, :]
+        psd = self.analyzer.psd(segments).mean(axis=(1, 2))  # (分段, 频点)
+        band_power = {name: psd[:, mask].sum(axis=-1) * self.df for name, mask in self.analyzer.masks.items()}
+        in_range = psd[:, self.range_mask]
+        total = np.maximum(in_range.sum(axis=-1) * self.df, 1e-12)
+        for name, power in band_power.items():
+            columns[f"{name}_power"] = power
+        for name, power in band_power.items():
+            columns[f"{name}_relative"] = power / total
+        columns["delta_beta_ratio"] = band_power["delta"] / np.maximum(band_power["beta"], 1e-12)
+        cumulative = np.cumsum(in_range, axis=-1)
+        edge = np.argmax(cumulative >= EDGE_FRACTION * cumulative[:, -1:], axis=-1)
+        columns["spectral_edge_hz"] = self.range_freqs[edge]
+        p = in_range / np.maximum(in_range.sum(axis=-1, keepdims=True), 1e-300)
+        columns["spectral_entropy"] = -(p * np.log(np.where(p > 0, p, 1.0))).sum(axis=-1) / np.log(p.shape[-1])
+
+        # 幅度与 Hjorth 参数 (逐通道计算后平均)
+        centered = epochs - epochs.mean(axis=-1, keepdims=True)
+        activity = np.square(centered).mean(axis=-1)
+        d1 = np.diff(epochs, axis=-1)
+        d2 = np.diff(d1, axis=-1)
+        var1 = np.square(d1).mean(axis=-1)
+        var2 = np.square(d2).mean(axis=-1)
+        mobility = np.sqrt(var1 / np.maximum(activity, 1e-12))
+        complexity = np.sqrt(var2 / np.maximum(var1, 1e-12)) / np.maximum(mobility, 1e-12)
+        std = np.sqrt(activity)
+        columns["std"] = std.mean(axis=1)
+        columns["ptp"] = np.ptp(epochs, axis=-1).mean(axis=1)
+        columns["hjorth_mobility"] = mobility.mean(axis=1)
+        columns["hjorth_complexity"] = complexity.mean(axis=1)
+        columns["flat"] = (std < FLAT_STD).any(axis=1).astype(np.int8)
+        columns["clipped_fraction"] = (np.abs(epochs) >= CLIP_LEVEL).mean(axis=(1, 2))
+
+        if accel is not None:
+            columns.update(self._motion(np.asarray(accel, dtype=np.float64)))
+        return columns
+
+    def _motion(self, accel):
+        """体动与体位特征，加速度缺失 (NaN) 的部分不计入，整段缺失的分段各列均为 NaN"""
+        magnitude = np.sqrt(np.square(accel).sum(axis=1))  # (分段, 样本)
+        n_seconds = magnitude.shape[-1] // self.second
+        per_second = magnitude[:, :n_seconds * self.second].reshape(len(magnitude), n_seconds, self.second)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # 整段缺失时结果为 NaN
+            second_std = np.nanstd(per_second, axis=-1)  # 整秒缺失为 NaN
+            valid = np.count_nonzero(~np.isnan(second_std), axis=-1)
+            moving = np.count_nonzero(second_std > self.movement_std, axis=-1)
+            columns = {"motion": np.nanstd(magnitude, axis=-1),
+                       # 只在有加速度数据的秒数中计算比例，整段缺失时为 NaN (而不是 "无体动")
+                       "movement_fraction": np.where(valid > 0, moving / np.maximum(valid, 1), np.nan)}
+            means = np.nanmean(accel, axis=-1)
+        for axis, name in enumerate("xyz"):
+            columns[f"accel_{name}"] = means[:, axis]
+        return columns
+
+
+def iter_features(reader, extractor, chunk_epochs=20, channels=None):
+    """
+    按块计算整个会话的特征，逐块产出 (首个分段序号, {列名: 数组})
+    channels 为通道序号列表，None 表示全部通道
+    """
+    has_accel = reader.accel() is not None
+    length = extractor.epoch_samples
+    n_epochs = reader.n_samples // length
+    gap_starts = np.array(sorted(g["sample_index"] for g in reader.meta.get("gaps", []) if "sample_index" in g),
+                          dtype=np.int64)
+    for first in range(0, n_epochs, chunk_epochs):
+        last = min(first + chunk_epochs, n_epochs)
+        start, end = first * length, last * length
+        block = reader.read(start, end).astype(np.float64)
+        if channels is not None:
+            block = block[:, channels]
+        motion = None
+        if has_accel:
+            accel = reader.read(start, end, ACCEL_FILE)
+            if len(accel) == len(block):
+                motion = regular_epochs(accel.astype(np.float64), length)
+        columns = extractor.compute(regular_epochs(block, length), motion)
+
+        # 间隙记录在重连后首个样本的序号上: 序号落在 [分段起点, 分段终点) 内即标记该分段
+        bounds = np.arange(first, last + 1) * length
+        counts = np.searchsorted(gap_starts, bounds, side="left")
+        columns["gap"] = (np.diff(counts) > 0).astype(np.int8)
+        yield first, columns
+
+
+def write_table(path, reader, extractor, chunk_epochs=20, channels=None):
+    """流式写出 CSV 特征表，返回分段数"""
+    start_time = None
+    try:
+        start_time = datetime.fromisoformat(reader.meta.get("start_time", ""))
+    except ValueError:
+        pass
+    epoch_seconds = extractor.epoch_samples / extractor.sample_rate
+    total = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        for first, columns in iter_features(reader, extractor, chunk_epochs, channels):
+            n = len(columns["gap"])
+            index = np.arange(first, first + n)
+            offsets = index * epoch_seconds
+            if writer is None:
+                writer = csv.writer(f)
+                writer.writerow(["epoch", "start_seconds", "clock_time"] + list(columns))
+            clock = ([(start_time + timedelta(seconds=s)).isoformat(timespec="seconds") for s in offsets.tolist()]
+                     if start_time is not None else [""] * n)
+            values = [np.round(v, 6).tolist() if v.dtype.kind == "f" else v.tolist() for v in columns.values()]
+            writer.writerows(zip(index.tolist(), offsets.tolist(), clock, *values))
+            total += n
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sleep", description="整夜录制的睡眠分期特征 (30 秒分段)")
+    parser.add_argument("directory", help="会话目录")
+    parser.add_argument("output", help="输出 CSV 特征表")
+    parser.add_argument("--epoch-seconds", type=float, default=30.0, help="分段长度 (秒)")
+    parser.add_argument("--welch-seconds", type=float, default=4.0, help="Welch 子段长度 (秒)")
+    parser.add_argument("--chunk-epochs", type=int, default=20, help="每次读取的分段数 (决定内存占用)")
+    parser.add_argument("--channels", default=None, help="参与计算的通道名，逗号分隔 (默认全部)")
+    parser.add_argument("--movement-std", type=float, default=MOVEMENT_STD, help="体动判定阈值 (加速度原始计数)")
+    args = parser.parse_args(argv)
+
+    reader = SessionReader(args.directory)
+    channels = None
+    if args.channels:
+        names = reader.meta.get("channel_names") or [f"Ch{i + 1}" for i in range(reader.num_channels)]
+        channels = [names.index(name) for name in args.channels.split(",")]
+    extractor = SleepFeatureExtractor(reader.sample_rate, args.epoch_seconds, args.welch_seconds, args.movement_std)
+
+    started = time.perf_counter()
+    n = write_table(args.output, reader, extractor, args.chunk_epochs, channels)
+    elapsed = time.perf_counter() - started
+    hours = reader.duration / 3600
+    print(f"{n} 个分段 ({hours:.2f} 小时, 加速度: {'有' if reader.accel() is not None else '无'}) → {args.output}, "
+          f"用时 {elapsed:.2f} 秒 ({hours * 3600 / max(elapsed, 1e-9):.0f}× 实时)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
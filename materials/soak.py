@@ -0,0 +1,222 @@
+"""
+soak.py - 长时间会话内存浸泡测试 (无界面，合成数据)
+功能说明：
+1. 以最快速度向采集客户端的通知回调回放若干小时 (默认 8 小时) 的合成数据帧，
+   经过与实际运行相同的流水线: 帧切分解码 → 指标 → 神经反馈 / 连通性 → 显示缓冲与延迟追踪
+2. 周期性注入异常: 长段无帧头的噪声与截断帧 (帧切分后接收缓冲区残留不得超过一帧)、
+   每个周期最后 1/6 不绘制 (模拟窗口最小化，待显示列表按预算丢弃最早的块)
+3. 每个检查点 (默认模拟 10 分钟) 记录一次常驻内存 (RSS)，以下任一情况判定失败 (退出码 1):
+   - 预热期后 RSS 增长超过容差
+   - 注入噪声后接收缓冲区残留超过一帧
+   - 内存预算在注入异常以外的时段超限 (最小化期间待显示列表的超限为预期行为，单独报告)
+4. 可选 --leak-check: 每模拟 1 小时做一次 tracemalloc 快照对比并输出持续增长的代码行
+
+用法:
+    python main.py soak [--hours 8] [--tolerance-mib 16] [--leak-check] [--record 目录]
+"""
+
+import argparse
+import gc
+import logging
+import sys
+import time
+
+import numpy as np
+
+SIM_CHECKPOINT_SECONDS = 600  # 每模拟 10 分钟记录一次 RSS
+CYCLE_MINUTES = 60  # 异常注入周期: 每半个周期注入一次噪声，最后 1/6 不绘制
+RAW_NOISE_BYTES = 256 * 1024  # 无帧头噪声段长度
+PAUSE_EXPECTED = ("latency_pending",)  # 不绘制期间允许超限的预算
+
+
+def synthetic_frames(profile, count, rng):
+    """按设备协议生成 count 个合成数据帧 (帧计数连续递增)，返回 bytes"""
+    frames = np.zeros((count, profile.frame_length), dtype=np.uint8)
+    if profile.header is not None:
+        frames[:, 0] = profile.header
+    if profile.footer is not None:
+        frames[:, -1] = profile.footer
+    counter = profile.field("counter")
+    frames[:, counter["offset"]] = np.arange(count) % 256
+    eeg = profile.field(profile.eeg_field)
+    t = np.arange(count)[:, None]
+    values = (20000 * np.sin(2 * np.pi * 10 * t / profile.sample_rate + np.arange(eeg["count"]))
+              + rng.normal(0, 2000, (count, eeg["count"]))).astype(np.int32) & 0xFFFFFF
+    for i, shift in enumerate((16, 8, 0)):
+        frames[:, eeg["offset"] + i:eeg["offset"] + 3 * eeg["count"]:3] = (values >> shift) & 0xFF
+    return frames.tobytes()
+
+
+class DisplaySink:
+    """无界面的显示端: 写入显示环形缓冲区并按固定帧率模拟绘制"""
+
+    def __init__(self, client, capacity, render_every=8):
+        from display import DisplayRing
+
+        self.tracer = client.tracer
+        self.ring = DisplayRing(client.profile.num_channels, capacity)
+        self.render_every = render_every
+        self.paused = False  # 模拟窗口最小化: 只缓冲不绘制
+        self._blocks = 0
+
+    def on_block(self, block):
+        if self.tracer.enabled:
+            self.tracer.mark("delivered")
+        self.ring.extend(block)
+        if self.tracer.enabled:
+            self.tracer.buffered(len(block))
+        self._blocks += 1
+        if not self.paused and self._blocks % self.render_every == 0:
+            self.render()
+
+    def render(self):
+        self.ring.window()
+        self.tracer.rendered()
+
+    def set_paused(self, paused):
+        """窗口最小化 / 恢复；恢复时立即重绘 (与界面恢复显示时的重绘一致)"""
+        if self.paused and not paused:
+            self.render()
+        self.paused = paused
+
+
+def run(hours=8.0, frames_per_notification=7, tolerance_mib=16.0, warmup_minutes=30.0,
+        leak_check=False, record=None, seed=0, out=print,
+        checkpoint_seconds=SIM_CHECKPOINT_SECONDS, cycle_minutes=CYCLE_MINUTES):
+    """执行浸泡测试，返回 (是否通过, [(模拟小时, RSS 字节)])"""
+    import test_nv_brainrf_modified_new as app
+    from membudget import LeakMonitor, current_rss
+    from rate_estimator import StreamInfo
+
+    client = app.BCIBluetoothClient(leak_check=False)  # 泄漏检测由本函数按模拟小时进行
+    client.debug_enabled = False
+    profile = client.profile
+    rate = float(profile.sample_rate or app.NOMINAL_SAMPLE_RATE)
+    info = StreamInfo(rate, profile.num_channels, source="synthetic")
+
+    sink = DisplaySink(client, info.samples(app.DISPLAY_SECONDS))
+    client.block_parsed.connect(sink.on_block)
+    client.use_stream_info(info)
+    recorder = None
+    if record:
+        from recording import SessionRecorder, new_session_dir
+
+        recorder = SessionRecorder(new_session_dir(record, "soak"), info, device="synthetic")
+        client.block_parsed.connect(recorder.write)
+
+    monitor = None
+    if leak_check:
+        monitor = LeakMonitor(interval=None, threshold_kib=64, consecutive=2)
+
+    rng = np.random.default_rng(seed)
+    # 256 的整数倍帧，循环回放时帧计数保持连续
+    pool = synthetic_frames(profile, 256 * 20, rng)
+    step = frames_per_notification * profile.frame_length
+    notifications = [pool[i:i + step] for i in range(0, len(pool) - step + 1, step)]
+    noise = bytes(rng.integers(0, 0xA0, RAW_NOISE_BYTES, dtype=np.uint8))
+    truncated = pool[:profile.frame_length // 2]
+
+    total_frames = int(hours * 3600 * rate)
+    checkpoint_frames = int(checkpoint_seconds * rate)
+    warmup_frames = int(warmup_minutes * 60 * rate)
+    hour_frames = int(3600 * rate)
+    samples = []
+    baseline = None
+    frames_sent = 0
+    next_checkpoint = checkpoint_frames
+    index = 0
+    failures = []
+    overflows = {budget.name: budget.overflows for budget in client.budgets}
+    expected = dict.fromkeys(overflows, 0)
+    started = time.perf_counter()
+
+    gc.collect()
+    out(f"浸泡测试: 模拟 {hours:g} 小时 @ {rate:g} Hz, 每次通知 {frames_per_notification} 帧, "
+        f"初始 RSS {current_rss() / 1048576:.1f} MiB")
+    while frames_sent < total_frames:
+        client._data_pipeline(None, notifications[index])
+        index = (index + 1) % len(notifications)
+        frames_sent += frames_per_notification
+
+        if frames_sent >= next_checkpoint:
+            # 上一段的预算超限: 不绘制期间的 latency_pending 为预期，其余均判定失败
+            for budget in client.budgets:
+                delta = budget.overflows - overflows[budget.name]
+                overflows[budget.name] = budget.overflows
+                if sink.paused and budget.name in PAUSE_EXPECTED:
+                    expected[budget.name] += delta
+                elif delta:
+                    failures.append(f"{budget.name} 在正常运行时段超限 {delta} 次")
+
+            minute = next_checkpoint // int(60 * rate)
+            # 异常注入: 每半个周期一段无帧头噪声与一个截断帧；每个周期最后 1/6 不绘制
+            if minute % (cycle_minutes // 2) == 0:
+                client._data_pipeline(None, noise)
+                client._data_pipeline(None, truncated)
+                if len(client.raw_buffer) > profile.frame_length:
+                    failures.append(f"注入噪声后接收缓冲区残留 {len(client.raw_buffer)} 字节")
+            sink.set_paused(minute % cycle_minutes >= cycle_minutes * 5 // 6)
+            if monitor is not None:
+                if not monitor.active:
+                    if frames_sent >= warmup_frames:
+                        monitor.start()
+                elif next_checkpoint % hour_frames == 0:
+                    for where, growth, size in monitor.check():
+                        out(f"  [增长] {where}: +{growth / 1024:.0f} KiB (当前 {size / 1024:.0f} KiB)")
+
+            gc.collect()
+            rss = current_rss()
+            sim_hours = frames_sent / rate / 3600
+            samples.append((sim_hours, rss))
+            if baseline is None and frames_sent >= warmup_frames:
+                baseline = rss
+            out(f"  模拟 {sim_hours:5.2f} h | RSS {rss / 1048576:7.1f} MiB | "
+                f"实际耗时 {time.perf_counter() - started:6.1f} s")
+            next_checkpoint += checkpoint_frames
+
+    if recorder is not None:
+        recorder.close()
+    if monitor is not None:
+        monitor.stop()
+
+    for line in client.budgets.report_lines():
+        out(f"[内存预算] {line}")
+    for name, count in expected.items():
+        if count:
+            out(f"[内存预算] {name}: 不绘制期间超限 {count} 次 (预期)")
+    for failure in dict.fromkeys(failures):
+        out(f"[失败] {failure}")
+    if baseline is None:
+        out("模拟时长短于预热期，未判定 RSS 增长")
+        return not failures, samples
+    after = [rss for sim_hours, rss in samples if sim_hours * 60 >= warmup_minutes]
+    growth = (max(after) - baseline) / 1048576
+    passed = growth <= tolerance_mib and not failures
+    out(f"预热后 RSS 增长 {growth:.1f} MiB (容差 {tolerance_mib:g} MiB): {'通过' if passed else '失败'}")
+    return passed, samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="soak", description="长时间会话内存浸泡测试 (合成数据)")
+    parser.add_argument("--hours", type=float, default=8.0, help="模拟时长 (小时)")
+    parser.add_argument("--frames", type=int, default=7, help="每次通知的帧数")
+    parser.add_argument("--tolerance-mib", type=float, default=16.0, help="预热后允许的 RSS 增长 (MiB)")
+    parser.add_argument("--warmup-minutes", type=float, default=30.0, help="预热时长 (模拟分钟)")
+    parser.add_argument("--leak-check", action="store_true", help="每模拟小时对比 tracemalloc 快照")
+    parser.add_argument("--record", metavar="目录", default=None, help="同时录制到该目录")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from eventlog import setup_logging
+
+    listener = setup_logging(level=logging.WARNING)
+    try:
+        passed, _ = run(args.hours, args.frames, args.tolerance_mib, args.warmup_minutes,
+                        args.leak_check, args.record, args.seed)
+    finally:
+        listener.stop()
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+spectral.py - 向量化频谱特征
+功能说明：
+1. 标准脑电频段定义 (delta/theta/alpha/beta/gamma)
+2. 对任意前导维度的分段数据一次性加窗 + rfft，输出各频段功率
+3. 在线反馈、离线批处理与睡眠分期共用同一套特征计算
+"""
+
+import numpy as np
+
+# 频段定义 (Hz)，区间为 [low, high)
+BANDS = {
+    "delta": (1.0, 4.0),
+    "theta": (4.0, 8.0),
+    "alpha": (8.0, 13.0),
+    "beta": (13.0, 30.0),
+    "gamma": (30.0, 45.0),
+}
+
+
+def band_masks(freqs, bands=None):
+    """预计算各频段在 rfft 频率轴上的布尔掩码"""
+    bands = bands or BANDS
+    return {name: (freqs >= low) & (freqs < high) for name, (low, high) in bands.items()}
+
+
+class BandPowerAnalyzer:
+    """
+    固定段长的频段功率计算器
+
+    窗函数、频率轴与频段掩码在构造时一次性生成，
+    compute() 对形如 (..., n_samples) 的数据在最后一维上做批量 FFT。
+    """
+
+    def __init__(self, sample_rate, segment_samples, bands=None):
+        self.sample_rate = float(sample_rate)
+        self.segment_samples = int(segment_samples)
+        self.bands = dict(bands or BANDS)
+        self.window = np.hanning(self.segment_samples)
+        self.freqs = np.fft.rfftfreq(self.segment_samples, d=1.0 / self.sample_rate)
+        self.masks = band_masks(self.freqs, self.bands)
+        # 单边功率谱密度归一化系数
+        self._scale = 2.0 / (self.sample_rate * np.sum(self.window ** 2))
+
+    def psd(self, segments):
+        """计算单边功率谱密度, 输入 (..., n_samples)"""
+        x = segments - segments.mean(axis=-1, keepdims=True)
+        spectrum = np.fft.rfft(x * self.window, axis=-1)
+        return (spectrum.real ** 2 + spectrum.imag ** 2) * self._scale
+
+    def compute(self, segments):
+        """返回 {频段: 功率数组 (...)}，功率为频段内 PSD 之和乘频率分辨率"""
+        psd = self.psd(segments)
+        df = self.freqs[1] - self.freqs[0]
+        return {name: psd[..., mask].sum(axis=-1) * df for name, mask in self.masks.items()}
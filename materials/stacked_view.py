@@ -0,0 +1,98 @@
+"""
+stacked_view.py - 单 PlotItem 多通道叠加显示
+功能说明：
+1. 所有通道绘制在同一个 PlotItem 中，按通道偏移上下排列，共享 x 轴
+2. 整个刷新只调用一次 setData，使用 connect 数组在通道之间断开，生成单条路径
+3. 每通道独立增益，归一化量程来自 AutoScaler 的滞回结果
+4. TimedGraphicsLayoutWidget 统计每帧绘制耗时，用于对比分离布局与叠加布局，
+   并可在每次绘制完成时回调 paint_callback(完成时刻)，用于端到端延迟追踪
+"""
+
+import time
+
+import numpy as np
+import pyqtgraph as pg
+
+
+class TimedGraphicsLayoutWidget(pg.GraphicsLayoutWidget):
+    """记录每次绘制耗时 (毫秒，指数平均) 的 GraphicsLayoutWidget"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paint_ms = 0.0
+        self.paint_count = 0
+        self.paint_callback = None
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        end = time.perf_counter()
+        elapsed = (end - start) * 1000.0
+        self.paint_ms = elapsed if self.paint_count == 0 else self.paint_ms + 0.1 * (elapsed - self.paint_ms)
+        self.paint_count += 1
+        if self.paint_callback is not None:
+            self.paint_callback(end)
+
+
+class StackedRenderer:
+    """叠加视图渲染器 - 一条带断点的路径绘制全部通道"""
+
+    def __init__(self, plot_item, num_channels, size, spacing=1.0, default_span=2000.0, channel_names=None):
+        self.plot = plot_item
+        self.num_channels = num_channels
+        self.spacing = spacing
+        self.default_span = default_span
+        self.gains = np.ones(num_channels)
+        self._spans = np.full(num_channels, default_span)
+        self._offsets = ((num_channels - 1 - np.arange(num_channels)) * spacing)[:, None]
+        self._scale = np.empty((num_channels, 1))
+        self._mean = np.empty((num_channels, 1))
+        self._update_scale()
+
+        self.curve = pg.PlotCurveItem(pen=pg.mkPen(color=(80, 200, 255), width=1))
+        self.plot.addItem(self.curve)
+        self.plot.showGrid(x=True, y=False)
+        self.plot.setYRange(-spacing * 0.6, (num_channels - 0.4) * spacing, padding=0)
+        names = channel_names or [f'Ch{i + 1}' for i in range(num_channels)]
+        self.plot.getAxis('left').setTicks(
+            [[(float(self._offsets[i, 0]), names[i]) for i in range(num_channels)]])
+        self.resize(size)
+
+    def resize(self, size):
+        """按显示窗口长度预分配路径数组"""
+        self.size = int(size)
+        total = self.num_channels * self.size
+        self._x = np.empty(total)
+        self._y = np.empty(total)
+        self._connect = np.ones(total, dtype=bool)
+        self._connect[self.size - 1::self.size] = False  # 通道末点不与下一通道相连
+
+    def set_gain(self, channel, gain):
+        """设置增益, channel 为 None 时作用于全部通道"""
+        if channel is None:
+            self.gains[:] = gain
+        else:
+            self.gains[channel] = gain
+        self._update_scale()
+
+    def set_ranges(self, changes):
+        """接收 AutoScaler 的量程变更 [(通道, 下限, 上限)]"""
+        if not changes:
+            return
+        for channel, low, high in changes:
+            self._spans[channel] = max(high - low, 1e-9)
+        self._update_scale()
+
+    def _update_scale(self):
+        """量程归一化到 0.8 个通道间距再乘以增益"""
+        self._scale[:, 0] = self.gains * (0.8 * self.spacing) / self._spans
+
+    def render(self, x, window):
+        """绘制一帧: x 为共享时间轴 (N)，window 为最新数据视图 (通道 × N)"""
+        y = self._y.reshape(self.num_channels, self.size)
+        np.mean(window, axis=1, keepdims=True, out=self._mean)
+        np.subtract(window, self._mean, out=y)
+        np.multiply(y, self._scale, out=y)
+        np.add(y, self._offsets, out=y)
+        self._x.reshape(self.num_channels, self.size)[:] = x
+        self.curve.setData(self._x, self._y, connect=self._connect, skipFiniteCheck=True)
@@ -0,0 +1,125 @@
+"""
+stall_watchdog.py - 事件驱动的数据流停滞看门狗
+功能说明：
+1. 数据回调每次只记录到达时刻 (一次赋值)，不创建或取消定时器
+2. 事件循环上只挂一个定时器，到期时若期间有数据则顺延到新的截止时刻，
+   数据正常时每个超时周期最多唤醒一次，没有固定频率的轮询
+3. 超过 stall_periods 个采样周期无数据即判定停滞，按恢复策略依次升级处理
+   (默认: 重发启动命令 → 重发启动命令 → 重连)
+4. 数据恢复后回调 on_recover 并重置升级计数
+"""
+
+import asyncio
+import time
+
+ACTION_RESEND_START = "resend_start"
+ACTION_RECONNECT = "reconnect"
+
+ACTION_NAMES = {
+    ACTION_RESEND_START: "重发启动命令",
+    ACTION_RECONNECT: "重新连接",
+}
+
+
+def stall_timeout(sample_rate, stall_periods, min_timeout=0.25):
+    """stall_periods 个采样周期对应的超时时长 (秒)，不低于 min_timeout"""
+    return max(min_timeout, stall_periods / float(sample_rate))
+
+
+class RecoveryPolicy:
+    """停滞恢复策略: 第 n 次连续停滞执行 actions[n-1]，超出后重复最后一项"""
+
+    def __init__(self, actions=(ACTION_RESEND_START, ACTION_RESEND_START, ACTION_RECONNECT),
+                 retry_factor=4.0):
+        if not actions:
+            raise ValueError("恢复策略至少需要一个动作")
+        self.actions = tuple(actions)
+        self.retry_factor = retry_factor  # 两次恢复动作之间等待的超时倍数
+
+    def action(self, consecutive):
+        return self.actions[min(consecutive, len(self.actions)) - 1]
+
+
+class StallWatchdog:
+    """
+    数据流停滞看门狗
+
+    on_stall(action, silent_seconds, consecutive) 在停滞时调用
+    on_recover(stall_seconds) 在停滞后首个数据到达时调用
+    """
+
+    def __init__(self, on_stall, on_recover=None, timeout=0.5, policy=None):
+        self.on_stall = on_stall
+        self.on_recover = on_recover
+        self.timeout = timeout
+        self.policy = policy or RecoveryPolicy()
+        self.armed = False
+        self.consecutive = 0
+        self.stalls = 0
+        self.wakeups = 0
+        self._last_feed = 0.0
+        self._stall_start = None
+        self._handle = None
+
+    @property
+    def stalled(self):
+        return self._stall_start is not None
+
+    def configure(self, sample_rate, stall_periods, min_timeout=0.25):
+        """按采样率设置超时，已启动时从下一次检查起生效"""
+        self.timeout = stall_timeout(sample_rate, stall_periods, min_timeout)
+
+    def arm(self, grace=None):
+        """开始监视，grace 为首个数据允许的等待时长 (默认等于超时)"""
+        self.disarm()
+        self.armed = True
+        self.consecutive = 0
+        self._stall_start = None
+        self._last_feed = time.monotonic()
+        self._schedule(grace if grace is not None else self.timeout)
+
+    def disarm(self):
+        """停止监视 (主动停止数据流、断开或进入重连时调用)"""
+        self.armed = False
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def feed(self, now):
+        """数据回调中调用 - 仅记录到达时刻"""
+        self._last_feed = now
+        if self._stall_start is not None:
+            self._recover(now)
+
+    def _schedule(self, delay):
+        self._handle = asyncio.get_event_loop().call_later(delay, self._check)
+
+    def _check(self):
+        """定时器到期: 有新数据则顺延，否则判定停滞"""
+        self._handle = None
+        if not self.armed:
+            return
+        self.wakeups += 1
+        silent = time.monotonic() - self._last_feed
+        if silent < self.timeout and self._stall_start is None:
+            self._schedule(self.timeout - silent)
+            return
+
+        if self._stall_start is None:
+            self._stall_start = self._last_feed
+        self.stalls += 1
+        self.consecutive += 1
+        action = self.policy.action(self.consecutive)
+        self._schedule(self.timeout * self.policy.retry_factor)
+        self.on_stall(action, silent, self.consecutive)
+
+    def _recover(self, now):
+        stall_seconds = now - self._stall_start
+        self._stall_start = None
+        self.consecutive = 0
+        if self.armed and self._handle is not None:
+            # 停滞期间的重试定时器较长，改回正常超时
+            self._handle.cancel()
+            self._schedule(self.timeout)
+        if self.on_recover is not None:
+            self.on_recover(stall_seconds)
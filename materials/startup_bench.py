@@ -0,0 +1,160 @@
+"""
+startup_bench.py - 子命令启动耗时基准 (python -X importtime)
+功能说明：
+1. 对每个子命令在新进程中以 `python -X importtime` 运行一次真实调用，
+   解析标准错误中的导入耗时，统计顶层模块累计导入时间与进程总耗时
+2. 离线命令在临时生成的小型夹具会话上完整执行 (入口函数在解析参数之后才导入 numpy 等依赖，
+   只测 --help 会漏掉这部分)；无法在基准中执行的命令 (GUI 事件循环、BLE 扫描、浸泡仿真)
+   改为导入入口模块及其在入口函数内导入的模块
+3. 报告各命令是否加载了 Qt / pyqtgraph / bleak，验证离线命令未承担 GUI 导入开销
+4. 每个命令重复 repeat 次取中位数，以 gui 命令为基准给出相对比例
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MATERIALS_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(os.path.dirname(MATERIALS_DIR), "main.py")
+HEAVY_MODULES = ("PyQt5", "pyqtgraph", "bleak")
+
+# 真实调用的参数: {session} 为夹具会话，{root} 为其所在录制目录，{out} 为本次调用独占的输出目录
+RUN_ARGS = {
+    "info": ["{session}"],
+    "export": ["{session}", "{out}/export.csv"],
+    "epochs": ["{session}", "{out}/epochs.npz"],
+    "profiles": [],
+    "batch": ["{root}", "--workers", "1", "--out", "{out}", "--no-catalog"],
+    "catalog": ["{root}", "--db", "{out}/catalog.sqlite", "--index"],
+    "sleep": ["{session}", "{out}/sleep.csv"],
+    "codec": ["{session}"],
+}
+# 无法在基准中执行的命令: 入口模块之外还需导入的模块 (入口函数内的延迟导入)
+IMPORT_ONLY = {
+    "gui": [],
+    "review": [],
+    "scan": ["discovery", "bleak"],
+    "soak": ["test_nv_brainrf_modified_new", "membudget", "rate_estimator"],
+}
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 输出
+    返回: (顶层模块累计导入时间 µs, 已导入的顶层包名集合)
+    """
+    total = 0
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        packages.add(name.split(".")[0])
+        if depth == 0:
+            total += int(cumulative)
+    return total, packages
+
+
+def make_fixture(directory, seconds=60.0, sample_rate=250.0, num_channels=4):
+    """在 directory/rec/session 生成基准用的小型会话 (含事件标记)，返回 directory"""
+    import numpy as np
+
+    from markers import Marker
+    from rate_estimator import StreamInfo
+    from recording import SessionRecorder
+
+    rng = np.random.default_rng(0)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    data = 2000 * np.sin(2 * np.pi * 10 * t)[:, None] + rng.normal(0, 200, (n, num_channels))
+    recorder = SessionRecorder(os.path.join(directory, "rec", "session"), StreamInfo(sample_rate, num_channels),
+                               device="bench")
+    recorder.write(np.round(data))
+    for second in range(2, int(seconds) - 1):
+        recorder.add_marker(Marker(int(second * sample_rate), float(second), "stim"))
+    recorder.close()
+    os.makedirs(os.path.join(directory, "runs"), exist_ok=True)
+    return directory
+
+
+def invocation(command, fixture):
+    """子命令的基准调用 (python -X importtime 之后的参数)"""
+    if command in RUN_ARGS:
+        values = {"session": os.path.join(fixture, "rec", "session"), "root": os.path.join(fixture, "rec"),
+                  "out": tempfile.mkdtemp(prefix=f"{command}_", dir=os.path.join(fixture, "runs"))}
+        return [MAIN_SCRIPT, command] + [arg.format(**values) for arg in RUN_ARGS[command]]
+    if command not in IMPORT_ONLY:
+        raise ValueError(f"未知子命令: {command}")
+    if os.path.dirname(MAIN_SCRIPT) not in sys.path:
+        sys.path.insert(0, os.path.dirname(MAIN_SCRIPT))
+    from main import COMMANDS
+
+    modules = [COMMANDS[command][0]] + IMPORT_ONLY[command]
+    return ["-c", f"import sys; sys.path.insert(0, {MATERIALS_DIR!r}); " + "; ".join(f"import {m}" for m in modules)]
+
+
+def measure(command, fixture, python=sys.executable):
+    """
+    运行一次子命令的基准调用 (fixture 为 make_fixture 生成的目录)
+    返回 (导入 µs, 进程总耗时 s, 顶层包集合)；调用失败时抛出 RuntimeError
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    started = time.perf_counter()
+    result = subprocess.run([python, "-X", "importtime"] + invocation(command, fixture),
+                            capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"{command} 退出码 {result.returncode}: " + "\n".join(errors[-5:]))
+    import_us, packages = parse_importtime(result.stderr)
+    return import_us, elapsed, packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="importtime", description="测量各子命令的导入耗时")
+    parser.add_argument("commands", nargs="*", help="要测量的子命令 (默认全部)")
+    parser.add_argument("--repeat", type=int, default=5, help="每个命令的重复次数")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(MAIN_SCRIPT))
+    from main import COMMANDS
+
+    commands = args.commands or [name for name in COMMANDS if name != "importtime"]
+    unknown = [name for name in commands if name not in RUN_ARGS and name not in IMPORT_ONLY]
+    if unknown:
+        parser.error(f"无法测量的子命令: {', '.join(unknown)}")
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="importtime_") as fixture:
+        make_fixture(fixture)
+        for command in commands:
+            imports, walls, packages = [], [], set()
+            for _ in range(args.repeat):
+                try:
+                    import_us, elapsed, loaded = measure(command, fixture)
+                except RuntimeError as e:
+                    print(e, file=sys.stderr)
+                    return 1
+                imports.append(import_us)
+                walls.append(elapsed)
+                packages |= loaded
+            heavy = [name for name in HEAVY_MODULES if name in packages]
+            how = "执行" if command in RUN_ARGS else "仅导入"
+            rows.append((command, how, statistics.median(imports) / 1000.0, statistics.median(walls) * 1000.0,
+                         heavy))
+
+    baseline = next((row[2] for row in rows if row[0] == "gui"), None)
+    print(f"{'命令':<12}{'方式':<8}{'导入 ms':>10}{'进程 ms':>10}{'相对 gui':>10}  加载的重型依赖")
+    for command, how, import_ms, wall_ms, heavy in rows:
+        ratio = f"{import_ms / baseline:.2f}" if baseline else "--"
+        print(f"{command:<12}{how:<8}{import_ms:>10.1f}{wall_ms:>10.1f}{ratio:>10}  {', '.join(heavy) or '无'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
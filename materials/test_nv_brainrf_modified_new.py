@@ -15,18 +15,42 @@ brainBCI_visualizer.py v3.0 - 脑电信号蓝牙实时监测系统 (NV-BrainRF 
 
 import sys
 import os
+import argparse
+import signal
+import sqlite3
 import numpy as np
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
-from bleak import BleakClient, BleakScanner
+from bleak import BleakClient
 import asyncio
 import nest_asyncio
+import time
 from datetime import datetime
 import logging
 
-# 初始化异步环境
-nest_asyncio.apply()
-logging.basicConfig(level=logging.INFO)
+from catalog import CATALOG_FILE, SessionCatalog
+from channel_stats import STATUS_OK, ChannelStatsStage
+from codec import BlockPublisher
+from commands import EXPECT_DATA, EXPECT_SILENCE, CommandQueue
+from connection import STATE_CLOSING, STATE_CONNECTED, STATE_CONNECTING, STATE_FAILED, STATE_IDLE, \
+    STATE_NAMES, STATE_RECONNECTING, LinkSupervisor
+from connectivity import ConnectivityStage
+from discovery import DeviceCache, DeviceFilter, discover, find_device
+from display import AutoScaler, DisplayRing, RenderScheduler, ScrollingAxis
+from eventlog import LOGGER_NAME, StatusCoalescer, dropped_records, setup_logging
+from latency import STAGES, LatencyTracer
+from markers import MarkerServer, MarkerStream, SampleClock
+from membudget import DROP_NEWEST, DROP_OLDEST, BudgetSet, LeakMonitor, current_rss
+from metrics import MetricsRegistry, MetricsServer
+from neurofeedback import NeuroFeedbackEngine, UdpScoreSink
+from profiles import get_profile
+from profiling import MODE_CPROFILE, MODE_SAMPLE, MODES, ProfilingController
+from rate_estimator import SampleRateEstimator
+from recording import RecordingWriter, SessionRecorder, new_session_dir
+from stacked_view import StackedRenderer, TimedGraphicsLayoutWidget
+from stall_watchdog import ACTION_NAMES, ACTION_RECONNECT, ACTION_RESEND_START, StallWatchdog
+
+log = logging.getLogger(LOGGER_NAME + ".client")
 
 # ========== 配置参数 (已适配 NV-BrainRF) ==========
 APP_VERSION = "v3.1 (NV-BrainRF 调试版)"
@@ -34,65 +58,255 @@ BUILD_DATE = "2025-11-11"
 
 # 设备配置 - 请根据扫描结果填写你的设备 MAC 地址
 # TARGET_MAC = "98:0C:33:F1:93:8D"  # 替换为你的 NV-BrainRF MAC 地址
-TARGET_MAC = "45FAF574-F25E-FD62-0A78-B8810E518C7C"
-# Nordic UART Service UUIDs (NV-BrainRF 实际使用的)
-SERVICE_UUID = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
-WRITE_CHAR_UUID = "6e400002-b5a3-f393-e0a9-e50e24dcca9e"  # TX - 写入命令
-NOTIFY_CHAR_UUID = "6e400003-b5a3-f393-e0a9-e50e24dcca9e"  # RX - 接收数据
-# NOTIFY2_CHAR_UUID = "6e400004-b5a3-f393-e0a9-e50e24dcca9e"  # RX2 - 第二接收通道 (可选)
-
-# 启动命令配置
-# 如果设备不发送数据，尝试以下命令:
-# START_CMD = b'b'        # 启动数据流
-# START_CMD = b's'        # 开始采集
-# START_CMD = b'\x01'     # 二进制启动
-# START_CMD = b''         # 不发送命令（设备自动发送）
-START_CMD = b'bb'
-
-BUFFER_SIZE = 800  # 增大缓冲区应对高采样率
+TARGET_MAC = "45FAF574-F25E-FD62-0A78-B8810E518C7C"  # 扫描未找到匹配设备时的回退地址
+DISCOVERY_TIMEOUT = 10.0  # 扫描超时上限 (找到匹配设备即提前返回)
+
+# 设备协议 (UUID、启停命令、帧格式与字段布局，见 profiles.py)
+# DEVICE_PROFILE = "ble-fff0-8ch"    # 旧版 0xFFF0 服务 8 通道模块
+# DEVICE_PROFILE = "nv-brainrf-2ch"  # NV-BrainRF 2 通道 FP1/FP2
+DEVICE_PROFILE = "nv-brainrf-8ch"
+PROFILE = get_profile(DEVICE_PROFILE)
+DEVICE_NAME_PREFIX = PROFILE.name_prefix  # 按广播名称前缀发现设备
+SERVICE_UUID = PROFILE.service_uuid
+WRITE_CHAR_UUID = PROFILE.write_uuid  # TX - 写入命令
+NOTIFY_CHAR_UUID = PROFILE.notify_uuid  # RX - 接收数据
+
+# 启动/停止命令 (如果设备不发送数据，可在协议描述中修改 commands)
+START_CMD = PROFILE.command("start")
+STOP_CMD = PROFILE.command("stop")
+
+BUFFER_SIZE = 800  # 采样率确定前的临时显示缓冲区 (点/通道)
+DISPLAY_SECONDS = 4.0  # 采样率确定后按秒分配显示窗口
+AUTOSCALE_SAMPLES = 200  # 采样率确定前的自动缩放窗口 (点)
+AUTOSCALE_SECONDS = 0.8  # 采样率确定后的自动缩放窗口
+AUTOSCALE_ROBUST = False  # 稳健模式: 以分位数代替极值，抑制单点尖峰
+STACKED_VIEW = False  # 叠加视图: 全部通道绘制在单个 PlotItem 中 (适合 16/32 通道)
+
+# 数据流停滞看门狗 (连续多少个采样周期无数据判定停滞，依次重发启动命令、重连)
+NOMINAL_SAMPLE_RATE = 250.0  # 采样率实测完成前使用
+STALL_SAMPLE_PERIODS = 125
+STALL_MIN_TIMEOUT = 0.25  # 秒，避免高采样率下因 BLE 连接间隔抖动误报
+STALL_START_GRACE = 2.0  # 重连后等待首个数据的时长 (秒)
+
+# 命令队列 (启动命令等待首个数据、停止命令等待数据静默，代替固定延时)
+START_CONFIRM_TIMEOUT = 2.0
+STOP_SILENCE_SECONDS = 0.3
+
+# 本地指标端点 (Prometheus 文本格式, http://127.0.0.1:<端口>/metrics)，设为 None 关闭
+METRICS_PORT = 9108
+
+# 端到端延迟追踪 (到达 → 解码 → 送达 → 缓冲 → 显示)
+TRACE_LATENCY = True
+
+# 按需性能分析 (菜单 诊断 / SIGUSR1 / --profile 秒数)，结果写入 RECORDINGS_DIR/profile_*
+PROFILE_SECONDS = 10.0
+PROFILE_MODE = MODE_CPROFILE  # 或 MODE_SAMPLE (采样分析，开销更低)
+
+# 内存预算 (超限时按策略丢弃并计数，长时间会话的内存占用不随时长增长)
+RATE_FIT_MAX_POINTS = 8192  # 采样率拟合点数 (帧计数异常导致迟迟无法确定时)
+LATENCY_PENDING_MAX = 1024  # 已缓冲、尚未绘制的数据块 (窗口最小化时)
+LOG_QUEUE_MAX = 10000  # 待写出的日志记录
+RECORD_QUEUE_MAX = 2000  # 待写入的录制数据块 (每次通知一块)，磁盘跟不上时丢弃新块并记为间隙
+
+# 内存增长检测：每隔 LEAK_CHECK_INTERVAL 秒对比一次 tracemalloc 快照
+# tracemalloc 会拖慢所有内存分配，默认关闭；排查泄漏时设为 True 或以 --leak-check 启动
+LEAK_CHECK = False
+LEAK_CHECK_INTERVAL = 60.0
+LEAK_THRESHOLD_KIB = 256  # 同一代码行连续 3 次增长且累计超过该值时报告
+
+# 结构化日志 (后台线程写控制台与 JSON Lines 文件；LOG_FILE 设为 None 则只输出控制台)
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+LOG_FILE = os.path.join(LOG_DIR, "client.jsonl")
+LOG_RATE_LIMIT = 1.0  # 相同消息的最小间隔 (秒)
+STATUS_INTERVAL = 0.25  # 状态栏最快每 0.25 秒更新一次
+# 调试模式: 每次通知的缓冲区与解码详情以 DEBUG 级别写入日志 (按事件限流)，也可用 --debug 启动
+DEBUG_MODE = False
+DEBUG_HEX_DUMP = False  # 调试模式下附带原始字节与逐包通道值 (数据量大)
+
+# 会话录制 (每个会话一个目录，写入时同步构建 min/max/mean 金字塔)
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+NUM_CHANNELS = PROFILE.num_channels
+CATALOG_PATH = os.path.join(RECORDINGS_DIR, CATALOG_FILE)  # 会话目录 (录制结束时登记)，设为 None 关闭
+RECORD_FLUSH_SECONDS = 5.0  # 录制在后台线程写入，每隔该时长落盘并更新 meta.json
+RECORD_CODEC = False  # 原始数据以无损编码写入 eeg.egc (约为 eeg.f32 的 40%)，离线工具均可读取
+
+# 原始数据流网络发布 (无损编码后经 UDP 发送到本机，设为 None 关闭；接收端用 BlockPublisher.parse 解码)
+STREAM_UDP_PORT = None  # 如 9872
+STREAM_FLUSH_SAMPLES = 25  # 每个数据报的样本数 (0.1 秒 @250Hz)
+
+# 神经反馈评分 (窗口/跳步按秒配置，跳步决定反馈延迟上界)
+FEEDBACK_WINDOW_SECONDS = 1.0
+FEEDBACK_HOP_SECONDS = 0.2
+FEEDBACK_UDP_PORT = None  # 设为端口号 (如 9870) 即通过 UDP 向本机输出 JSON 评分
+
+# 事件标记 (本机 UDP 端口接收刺激程序的标记，设为 None 关闭；也可调用 client.post_marker)
+MARKER_UDP_PORT = 9871
+
+# 逐通道在线统计 (直流偏移/标准差/RMS，用于检查电极接触)
+CHANNEL_STATS_WINDOW_SECONDS = 2.0
+CHANNEL_STATS_EMIT_SECONDS = 0.5
+SHOW_CHANNEL_STATS = True  # 启动时是否显示统计表 (可在界面中切换)
+
+# 通道相关 / alpha 相干矩阵
+CONNECTIVITY_WINDOW_SECONDS = 4.0
+SHOW_CONNECTIVITY = False  # 启动时是否显示热图 (可在界面中切换)
 # =============================
 
 class BCIBluetoothClient(QtCore.QObject):
-    data_parsed = QtCore.Signal(object)
     status_update = QtCore.Signal(str)
-
-    def __init__(self):
+    stream_info_ready = QtCore.Signal(object)  # 采样率确定后发布 StreamInfo
+    block_parsed = QtCore.Signal(object)  # 每次通知解析出的数据块 (n_samples, n_channels)
+    feedback_updated = QtCore.Signal(object)  # 神经反馈评分 (低速率)
+    connectivity_updated = QtCore.Signal(object)  # 相关/相干矩阵流
+    channel_stats_updated = QtCore.Signal(object)  # 逐通道统计 (channel_stats.ChannelStats)
+    stream_gap = QtCore.Signal(object)  # 断线重连后的数据间隙 (StreamGap)
+    link_state_changed = QtCore.Signal(str)  # 连接状态机状态
+    marker_posted = QtCore.Signal(object)  # 事件标记 (markers.Marker，已对齐到样本序号)
+
+    def __init__(self, leak_check=LEAK_CHECK, debug=DEBUG_MODE):
         super().__init__()
         self.client = None
         self.running = False
         self.data_streaming = False  # 数据流状态
         self.raw_buffer = bytearray()
-        self.packet_size = 33
+        self.profile = PROFILE
+
+        # 内存预算 (各缓冲区上限与超限丢弃策略)
+        self.budgets = BudgetSet(on_overflow=self._on_budget_overflow)
+        self.budgets.add("rate_fit_points", RATE_FIT_MAX_POINTS, DROP_OLDEST)
+        self.budgets.add("latency_pending", LATENCY_PENDING_MAX, DROP_OLDEST)
+        self.budgets.add("record_queue", RECORD_QUEUE_MAX, DROP_NEWEST, unit="块")
+        self.packet_size = PROFILE.frame_length
         self.packet_counter = 0
+        self.last_accel = None
         self.write_char = None
         self.notify_char = None
 
+        # 连接监督 (断线自动重连)
+        self.link = LinkSupervisor()
+        self.link.subscribe(lambda old, new: self.link_state_changed.emit(new))
+        self._reconnect_task = None
+
+        # 停滞看门狗 (仅在数据流启动后监视)
+        self.watchdog = StallWatchdog(self._on_stall, self._on_stall_recovered)
+        self.watchdog.configure(NOMINAL_SAMPLE_RATE, STALL_SAMPLE_PERIODS, STALL_MIN_TIMEOUT)
+        self._recovery_task = None
+
+        # 命令队列 (同一设备的写入逐条执行并统计延迟)
+        self.commands = CommandQueue(self._write_command, confirm_timeout=START_CONFIRM_TIMEOUT,
+                                     silence_seconds=STOP_SILENCE_SECONDS)
+
+        # 采样率实测
+        self.rate_estimator = SampleRateEstimator(NUM_CHANNELS, budget=self.budgets["rate_fit_points"])
+        self.stream_info = None
+        self._frame_counters = []
+
+        # 事件标记 (以最近一次通知为锚点换算样本序号)
+        self.sample_clock = SampleClock(NOMINAL_SAMPLE_RATE)
+        self.markers = MarkerStream(self.sample_clock)
+        self.markers.subscribe(self._on_marker)
+
+        # 神经反馈、连通性与通道统计 (采样率确定后创建)
+        self.feedback = None
+        self.connectivity = None
+        self.channel_stats = None
+        self.stream_publisher = BlockPublisher(port=STREAM_UDP_PORT, flush_samples=STREAM_FLUSH_SAMPLES) \
+            if STREAM_UDP_PORT else None
+
         # 调试统计
-        self.debug_enabled = True  # 启用调试模式
+        self.debug_enabled = debug  # 调试模式 (逐次通知的 DEBUG 日志)
+        self.leak_monitor = None
+        if leak_check and LEAK_CHECK_INTERVAL:
+            self.leak_monitor = LeakMonitor(LEAK_CHECK_INTERVAL, LEAK_THRESHOLD_KIB,
+                                            on_growth=self._on_memory_growth)
         self.total_bytes_received = 0
         self.total_packets_parsed = 0
         self.total_packets_failed = 0
         self.receive_count = 0
 
-    async def connect_device(self, mac_address):
-        """设备连接全生命周期管理"""
+        # 端到端延迟追踪 (显示端在送达/缓冲/绘制时继续打点)
+        self.tracer = LatencyTracer(enabled=TRACE_LATENCY, pending_budget=self.budgets["latency_pending"])
+
+        # 状态栏更新合并 (日志本身经队列异步写出)
+        self._status = StatusCoalescer(self.status_update.emit, STATUS_INTERVAL)
+
+        # 运行指标 (由 MetricsServer 导出)
+        self.metrics = MetricsRegistry()
+        self._init_metrics()
+
+    def _init_metrics(self):
+        """注册采集端指标 - 热路径上只做计数与直方图累加"""
+        m = self.metrics
+        self.m_notifications = m.counter("notifications_total", "收到的 BLE 通知数")
+        self.m_bytes = m.counter("bytes_received_total", "收到的字节数")
+        self.m_frames = m.counter("frames_decoded_total", "解码成功的数据帧数")
+        self.m_frames_failed = m.counter("frames_failed_total", "帧尾校验失败的数据帧数")
+        self.m_resyncs = m.counter("resyncs_total", "帧失步后重新同步的次数")
+        self.m_bytes_discarded = m.counter("bytes_discarded_total", "重新同步时丢弃的字节数")
+        self.m_gaps = m.counter("stream_gaps_total", "断线重连造成的数据间隙数")
+        self.m_stalls = m.counter("stalls_total", "看门狗判定的数据流停滞次数")
+        self.m_markers = m.counter("markers_total", "收到的事件标记数")
+        self.m_callback = m.histogram("callback_seconds", "通知回调总耗时")
+        self.m_decode = m.histogram("decode_seconds", "帧切分与解码耗时")
+        m.gauge("raw_buffer_bytes", "接收缓冲区中未成帧的字节数", lambda: len(self.raw_buffer))
+        m.gauge("command_queue_depth", "排队及执行中的设备命令数", lambda: self.commands.pending)
+        m.gauge("link_connected", "链路是否已连接", lambda: int(self.link.state == STATE_CONNECTED))
+        m.gauge("sample_rate_hz", "实测采样率",
+                lambda: self.stream_info.sample_rate if self.stream_info else 0)
+        m.gauge("resident_memory_bytes", "进程常驻内存", current_rss)
+        m.gauge("log_records_dropped_total", "日志队列已满时丢弃的记录数", dropped_records)
+        for budget in self.budgets:
+            m.gauge(f"budget_{budget.name}_high_water", f"{budget.name} 最高水位 ({budget.unit})",
+                    lambda b=budget: b.high_water)
+            m.gauge(f"budget_{budget.name}_dropped_total", f"{budget.name} 超出预算丢弃量 ({budget.unit})",
+                    lambda b=budget: b.dropped)
+        names = self.profile.channel_names
+        for field, help_text in (("mean", "直流偏移 (窗口均值)"), ("std", "窗口标准差"), ("rms", "窗口 RMS")):
+            m.gauge_family(f"channel_{field}", f"逐通道{help_text}", "channel",
+                           lambda f=field: self._channel_stat(f, names))
+        m.gauge_family("channel_contact_ok", "电极接触是否正常", "channel",
+                       lambda: self._channel_stat("status", names, lambda s: int(s == STATUS_OK)))
+        if self.stream_publisher is not None:
+            m.gauge("stream_bytes_sent_total", "原始数据流发布的字节数", lambda: self.stream_publisher.bytes_sent)
+            m.gauge("stream_compression_ratio", "原始数据流相对 24 位样本的压缩比",
+                    lambda: self.stream_publisher.ratio)
+        for stage in STAGES:
+            m.gauge(f"latency_{stage}_p99_seconds", f"到达至 {stage} 阶段延迟 p99",
+                    lambda h=self.tracer.histograms[stage]: (h.percentile(99) or 0.0) / 1000.0)
+
+    async def connect_device(self, device):
+        """设备连接全生命周期管理 (device 为 BLEDevice 或地址字符串)"""
         self._log_system("正在初始化蓝牙连接...")
+        self.rate_estimator.reset()
+        self._frame_counters.clear()
+        if self.feedback is not None:
+            self.feedback.reset()
+        if self.connectivity is not None:
+            self.connectivity.reset()
+        if self.channel_stats is not None:
+            self.channel_stats.reset()
+        self.link.handles.clear()
+        self.link.pending_gap = None
+        self.link.transition(STATE_CONNECTING)
         try:
-            self.client = BleakClient(mac_address)
+            # 只发现目标服务，并注册断开回调以便自动重连
+            self.client = BleakClient(device, disconnected_callback=self._on_disconnected,
+                                      services=[SERVICE_UUID])
             await self._retry_connect(attempts=3)
             # _quick_initialize() 已经在 _retry_connect() 中调用
-            # 连接成功后，启动后台监听任务
-            asyncio.create_task(self._start_monitoring())
+            self.link.transition(STATE_CONNECTED)
+            self._log_system("进入数据采集状态", "▶")
 
         except Exception as e:
-            self._log_error(f"连接异常: {str(e)}")
+            self._log_error(f"连接异常: {str(e)}", event="connect_error", error=str(e))
+            self.link.transition(STATE_IDLE)
             await self._safe_disconnect()
 
     async def _retry_connect(self, attempts=3):
         """带重试机制的连接"""
         for i in range(attempts):
             try:
-                self._log_operation(f"连接尝试 {i+1}/{attempts}...")
+                self._log_operation(f"连接尝试 {i+1}/{attempts}...", event="connect_attempt", attempt=i + 1)
                 await self.client.connect(timeout=20.0)
                 if self.client.is_connected:
                     self._log_success("蓝牙握手成功 - 立即初始化...")
@@ -121,7 +335,8 @@ class BCIBluetoothClient(QtCore.QObject):
                     return
             except Exception as e:
                 import traceback
-                self._log_warning(f"连接尝试 {i+1}/{attempts} 失败: {str(e)}")
+                self._log_warning(f"连接尝试 {i+1}/{attempts} 失败: {str(e)}", event="connect_failed",
+                                  attempt=i + 1, error=str(e))
                 print(f"错误堆栈:\n{traceback.format_exc()}")
                 if self.client and self.client.is_connected:
                     try:
@@ -168,7 +383,7 @@ class BCIBluetoothClient(QtCore.QObject):
         print(f"[订阅通知] 回调函数: _data_pipeline")
 
         try:
-            await self.client.start_notify(notify_char, self._data_pipeline)
+            await self._subscribe(notify_char)
             print(f"[✓ 订阅成功] 通知订阅已激活，等待数据...")
         except Exception as e:
             print(f"[✗ 订阅失败] 错误: {str(e)}")
@@ -179,6 +394,7 @@ class BCIBluetoothClient(QtCore.QObject):
         # 不再自动发送启动命令，改由用户手动控制
         self.write_char = write_char
         self.notify_char = notify_char
+        self.link.handles.store(self.client.address, write_char, notify_char)
         self.running = True
 
         print(f"\n[✓ 初始化完成] 设备就绪，连接已建立")
@@ -187,6 +403,79 @@ class BCIBluetoothClient(QtCore.QObject):
 
         self._log_success("✓ 设备已连接，等待手动启动数据流")
 
+    def _on_disconnected(self, client):
+        """BLE 断开回调 - 意外断开时启动自动重连"""
+        if client is not self.client or not self.link.should_reconnect():
+            return
+        self.watchdog.disarm()
+        gap = self.link.on_drop(self.packet_counter)
+        self.link.transition(STATE_RECONNECTING)
+        self._log_warning(f"连接意外断开 (已接收 {gap.start_sample} 个样本)，开始自动重连...",
+                          event="link_lost", samples=gap.start_sample)
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.ensure_future(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        """按有上限的指数退避重连，复用缓存句柄并自动恢复数据流"""
+        self.raw_buffer.clear()  # 丢弃断开前的不完整数据包
+        backoff = self.link.backoff
+        for attempt, delay in enumerate(backoff.delays(), 1):
+            await asyncio.sleep(delay)
+            if self.link.state != STATE_RECONNECTING:
+                return  # 用户已主动断开
+            try:
+                await self.client.connect(dangerous_use_bleak_cache=True)
+                await self._fast_resubscribe()
+                self.link.transition(STATE_CONNECTED)
+                if self.data_streaming:
+                    self.watchdog.arm(grace=STALL_START_GRACE)
+                self._log_success(f"自动重连成功 (第 {attempt} 次尝试)", event="reconnected", attempt=attempt)
+                return
+            except Exception as e:
+                self._log_warning(f"自动重连 {attempt}/{backoff.max_attempts} 失败: {str(e)}", event="reconnect_failed",
+                                  attempt=attempt, error=str(e))
+                if self.client.is_connected:
+                    try:
+                        await self.client.disconnect()
+                    except Exception:
+                        pass
+
+        self.running = False
+        self.data_streaming = False
+        self.link.pending_gap = None
+        self.watchdog.disarm()
+        self.link.transition(STATE_FAILED)
+        self._log_error("自动重连失败，已停止重试")
+
+    async def _fast_resubscribe(self):
+        """使用缓存的特征句柄重新订阅，断开前正在采集则自动重发启动命令"""
+        write_char, notify_char = self.link.handles.resolve(self.client)
+        if write_char is None or notify_char is None:
+            # 句柄失效 (如设备固件更新)，退回完整初始化
+            await self._quick_initialize()
+        else:
+            await self._subscribe(notify_char)
+            self.write_char = write_char
+            self.notify_char = notify_char
+
+        if self.data_streaming:
+            result = await self.commands.submit(START_CMD, name="restart")
+            if result.error:
+                raise ConnectionError(f"重发启动命令失败: {result.error}")
+
+    async def request_disconnect(self):
+        """用户主动断开 - 不触发自动重连"""
+        self.link.transition(STATE_CLOSING)
+        self.running = False
+        self.watchdog.disarm()
+        if self.leak_monitor is not None:
+            self.leak_monitor.stop()
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+        await self._safe_disconnect()
+        self.link.pending_gap = None
+        self.link.transition(STATE_IDLE)
+
     async def _initialize_device(self):
         """设备初始化协议 - 快速操作避免超时"""
         # 查找正确的特征对象
@@ -211,10 +500,10 @@ class BCIBluetoothClient(QtCore.QObject):
         # 立即订阅通知 - 不等待！
         self._log_operation(f"订阅通知...")
         try:
-            await self.client.start_notify(notify_char, self._data_pipeline)
+            await self._subscribe(notify_char)
             self._log_success("✓ 订阅成功")
         except Exception as e:
-            self._log_error(f"订阅失败: {str(e)}")
+            self._log_error(f"订阅失败: {str(e)}", event="subscribe_failed", error=str(e))
             # 检查是否因为连接断开
             if not self.client.is_connected:
                 raise ConnectionError("设备在订阅时断开连接，可能需要保持活跃")
@@ -238,64 +527,107 @@ class BCIBluetoothClient(QtCore.QObject):
         self.running = True
         self._log_success(f"✓ 初始化完成")
 
-    async def _start_monitoring(self):
-        """进入数据监听模式"""
-        self._log_system("进入数据采集状态", "▶")
-        print("\n[监听模式] 开始监听数据...")
-        print("[监听模式] 将每5秒打印一次状态信息")
-        print("="*80)
-
-        last_packet_count = 0
-        monitoring_seconds = 0
-
-        while self.running:
-            await asyncio.sleep(1.0)
-            monitoring_seconds += 1
-
-            # 每5秒打印一次状态
-            if monitoring_seconds % 5 == 0:
-                new_packets = self.packet_counter - last_packet_count
-                last_packet_count = self.packet_counter
-
-                print(f"\n{'='*80}")
-                print(f"[状态报告] 监听时长: {monitoring_seconds} 秒")
-                print(f"[接收统计] 收到数据次数: {self.receive_count}")
-                print(f"[接收统计] 累计接收字节: {self.total_bytes_received}")
-                print(f"[数据包统计] 成功解析: {self.total_packets_parsed} | 失败: {self.total_packets_failed}")
-                print(f"[最近5秒] 新增数据包: {new_packets} 个")
-                print(f"[连接状态] {'✓ 已连接' if self.client and self.client.is_connected else '✗ 已断开'}")
-                print(f"[缓冲区] 当前大小: {len(self.raw_buffer)} 字节")
-
-                if self.receive_count == 0:
-                    print(f"\n[⚠ 警告] 未收到任何数据！可能的原因:")
-                    print(f"  1. 设备未启动数据发送")
-                    print(f"  2. 启动命令 '{START_CMD.decode() if len(START_CMD) == 1 else START_CMD.hex()}' 不正确")
-                    print(f"  3. 设备需要手动启动或按钮触发")
-                    print(f"  4. 通知订阅未成功")
-                    print(f"\n[建议] 尝试以下操作:")
-                    print(f"  - 检查设备是否有LED指示灯显示数据传输状态")
-                    print(f"  - 尝试修改 START_CMD (当前: {START_CMD})")
-                    print(f"  - 查看设备文档了解启动流程")
-
-                print(f"{'='*80}\n")
-
-    async def send_custom_command(self, cmd):
-        """发送自定义命令（用于调试）"""
+    def _on_stall(self, action, silent_seconds, consecutive):
+        """看门狗回调 - 数据流停滞，按恢复策略执行动作"""
+        self.m_stalls.inc()
+        self._log_warning(f"数据流停滞 {silent_seconds:.2f} 秒 (第 {consecutive} 次)，{ACTION_NAMES[action]}...",
+                          event="stall", action=action, consecutive=consecutive,
+                          notifications=self.receive_count, packets=self.total_packets_parsed)
+        self._print_status_report()
+        if self._recovery_task is not None and not self._recovery_task.done():
+            return  # 上一次恢复动作尚未完成
+        if action == ACTION_RESEND_START:
+            self._recovery_task = asyncio.ensure_future(self._resend_start())
+        elif action == ACTION_RECONNECT:
+            self._recovery_task = asyncio.ensure_future(self._force_reconnect())
+
+    def _on_stall_recovered(self, stall_seconds):
+        """看门狗回调 - 停滞后数据恢复"""
+        self._log_success(f"数据流已恢复 (停滞 {stall_seconds:.2f} 秒)")
+
+    async def _resend_start(self):
+        """恢复动作: 重发启动命令"""
+        if self.client and self.client.is_connected and self.write_char:
+            result = await self.commands.submit(START_CMD, name="resend_start")
+            if result.error:
+                self._log_warning(f"重发启动命令失败: {result.error}", event="resend_failed", error=str(result.error))
+
+    async def _force_reconnect(self):
+        """恢复动作: 主动断开链路，由断开回调进入自动重连"""
+        if self.client and self.client.is_connected:
+            try:
+                await self.client.disconnect()
+            except Exception as e:
+                self._log_warning(f"断开链路失败: {str(e)}", event="disconnect_failed", error=str(e))
+
+    def _print_status_report(self):
+        """打印接收统计 (停滞时输出，用于排查)"""
+        print(f"\n{'='*80}")
+        print(f"[接收统计] 收到数据次数: {self.receive_count}")
+        print(f"[接收统计] 累计接收字节: {self.total_bytes_received}")
+        print(f"[数据包统计] 成功解析: {self.total_packets_parsed} | 失败: {self.total_packets_failed}")
+        print(f"[连接状态] {'✓ 已连接' if self.client and self.client.is_connected else '✗ 已断开'}")
+        print(f"[缓冲区] 当前大小: {len(self.raw_buffer)} 字节")
+        print(f"[看门狗] 超时 {self.watchdog.timeout:.2f} 秒 | 累计停滞 {self.watchdog.stalls} 次")
+        for name, entry in self.command_stats().items():
+            print(f"[命令] {name}: {entry}")
+        print(f"[内存] 常驻 {current_rss() / 1048576:.1f} MiB")
+        for line in self.budgets.report_lines():
+            print(f"[内存预算] {line}")
+        stats = self.channel_stats.latest if self.channel_stats is not None else None
+        if stats is not None:
+            for name, mean, std, rms, ptp, status in stats.rows(self.profile.channel_names):
+                print(f"[通道] {name}: 直流 {mean:.1f} | 标准差 {std:.1f} | RMS {rms:.1f} | 峰峰 {ptp:.1f} | {status}")
+
+        if self.receive_count == 0:
+            print(f"\n[⚠ 警告] 未收到任何数据！可能的原因:")
+            print(f"  1. 设备未启动数据发送")
+            print(f"  2. 启动命令 '{START_CMD.decode() if len(START_CMD) == 1 else START_CMD.hex()}' 不正确")
+            print(f"  3. 设备需要手动启动或按钮触发")
+            print(f"  4. 通知订阅未成功")
+            print(f"\n[建议] 尝试以下操作:")
+            print(f"  - 检查设备是否有LED指示灯显示数据传输状态")
+            print(f"  - 尝试修改 START_CMD (当前: {START_CMD})")
+            print(f"  - 查看设备文档了解启动流程")
+
+        print(f"{'='*80}\n")
+
+    def _on_budget_overflow(self, budget, dropped):
+        """缓冲区超出内存预算 - 已按策略丢弃"""
+        self._log_warning(f"{budget.name} 超出内存预算 ({budget.limit} {budget.unit})，已按 {budget.policy} 丢弃",
+                          event="budget_overflow", budget=budget.name, dropped=dropped,
+                          total_dropped=budget.dropped, overflows=budget.overflows)
+
+    def _on_memory_growth(self, findings):
+        """泄漏检测: 快照对比发现持续增长的代码行"""
+        where, growth, size = findings[0]
+        self._log_warning(f"内存持续增长: {where} 累计 +{growth / 1024:.0f} KiB (共 {len(findings)} 处)",
+                          event="memory_growth", rss=current_rss(),
+                          findings=[(w, g, s) for w, g, s in findings[:10]])
+
+    async def _write_command(self, cmd):
+        """命令队列的写入函数"""
+        await self.client.write_gatt_char(self.write_char, cmd, response=False)
+
+    def command_stats(self):
+        """各命令的次数、未确认/失败次数与延迟分位数 (毫秒)"""
+        return self.commands.stats.summary()
+
+    async def send_custom_command(self, cmd, expect=None):
+        """发送自定义命令（用于调试）, expect 可为 EXPECT_DATA / EXPECT_SILENCE"""
         if not self.write_char:
             print("[错误] 设备未初始化，无法发送命令")
             return False
 
-        try:
-            if isinstance(cmd, str):
-                cmd = cmd.encode()
-
-            print(f"\n[发送自定义命令] 命令内容: {cmd} (十六进制: {cmd.hex()})")
-            await self.client.write_gatt_char(self.write_char, cmd, response=False)
-            print(f"[✓ 发送成功]")
-            return True
-        except Exception as e:
-            print(f"[✗ 发送失败] 错误: {str(e)}")
+        if isinstance(cmd, str):
+            cmd = cmd.encode()
+        print(f"\n[发送自定义命令] 命令内容: {cmd} (十六进制: {cmd.hex()})")
+        result = await self.commands.submit(cmd, expect=expect, name=f"custom:{cmd.hex()}")
+        if result.error:
+            print(f"[✗ 发送失败] 错误: {result.error}")
             return False
+        print(f"[✓ 发送成功] {result}")
+        return result.ok
 
     async def _safe_disconnect(self):
         """安全断开连接"""
@@ -306,14 +638,14 @@ class BCIBluetoothClient(QtCore.QObject):
                 try:
                     await self.client.stop_notify(self.notify_char)
                 except Exception as e:
-                    self._log_warning(f"停止通知失败: {str(e)}")
+                    self._log_warning(f"停止通知失败: {str(e)}", event="stop_notify_failed", error=str(e))
 
             await self.client.disconnect()
             self.data_streaming = False  # 重置数据流状态
             self._log_system("连接安全终止", "⏹")
 
     async def start_data_stream(self):
-        """启动数据流 - 发送 'b' 命令"""
+        """启动数据流 - 发送协议的启动命令"""
         if not self.client or not self.client.is_connected:
             print("[错误] 设备未连接，无法启动数据流")
             self._log_error("设备未连接")
@@ -324,22 +656,26 @@ class BCIBluetoothClient(QtCore.QObject):
             self._log_error("设备未初始化")
             return False
 
-        try:
-            print(f"\n[启动数据流] 发送启动命令 'b'...")
-            await self.client.write_gatt_char(self.write_char, b'b', response=False)
-            await asyncio.sleep(0.2)  # 等待命令处理
-            
-            self.data_streaming = True
-            self._log_success("✓ 数据流已启动")
-            print(f"[状态] 数据流已启动，等待数据接收...\n")
-            return True
-        except Exception as e:
-            print(f"[✗ 启动失败] 错误: {str(e)}")
-            self._log_error(f"启动数据流失败: {str(e)}")
+        print(f"\n[启动数据流] 发送启动命令 {START_CMD!r}...")
+        result = await self.commands.submit(START_CMD, expect=EXPECT_DATA, name="start")
+        if result.error:
+            print(f"[✗ 启动失败] 错误: {result.error}")
+            self._log_error(f"启动数据流失败: {result.error}", event="stream_start_failed", error=str(result.error))
             return False
 
+        self.data_streaming = True
+        self.watchdog.arm()
+        if self.leak_monitor is not None and not self.leak_monitor.active:
+            self.leak_monitor.start()  # 以数据流开始后的状态为基线，排除连接阶段的分配
+        if result.ok:
+            self._log_success(f"✓ 数据流已启动 (启动至首个数据 {result.latency_ms:.1f} ms)",
+                              event="stream_started", latency_ms=round(result.latency_ms, 2))
+        else:
+            self._log_warning(f"启动命令已发送，但 {START_CONFIRM_TIMEOUT:g} 秒内未收到数据，由看门狗继续恢复")
+        return True
+
     async def stop_data_stream(self):
-        """停止数据流 - 发送 'sv' 命令"""
+        """停止数据流 - 发送协议的停止命令"""
         if not self.client or not self.client.is_connected:
             print("[错误] 设备未连接，无法停止数据流")
             self._log_error("设备未连接")
@@ -350,219 +686,277 @@ class BCIBluetoothClient(QtCore.QObject):
             self._log_error("设备未初始化")
             return False
 
-        try:
-            print(f"\n[停止数据流] 发送停止命令 'sv'...")
-            await self.client.write_gatt_char(self.write_char, b's', response=False)
-            await asyncio.sleep(0.2)  # 等待命令处理
-
-            self.data_streaming = False
-            self._log_success("✓ 数据流已停止")
-            print(f"[状态] 数据流已停止\n")
-            return True
-        except Exception as e:
-            print(f"[✗ 停止失败] 错误: {str(e)}")
-            self._log_error(f"停止数据流失败: {str(e)}")
+        print(f"\n[停止数据流] 发送停止命令 {STOP_CMD!r}...")
+        self.watchdog.disarm()
+        result = await self.commands.submit(STOP_CMD, expect=EXPECT_SILENCE, name="stop")
+        if result.error:
+            if self.data_streaming:
+                self.watchdog.arm()
+            print(f"[✗ 停止失败] 错误: {result.error}")
+            self._log_error(f"停止数据流失败: {result.error}", event="stream_stop_failed", error=str(result.error))
             return False
 
+        self.data_streaming = False
+        if result.ok:
+            self._log_success(f"✓ 数据流已停止 (停止至最后一个数据 {result.latency_ms:.1f} ms)",
+                              event="stream_stopped", latency_ms=round(result.latency_ms, 2),
+                              packets=self.total_packets_parsed, failed=self.total_packets_failed)
+        else:
+            self._log_warning("停止命令已发送，但数据仍在到达")
+        return True
+
+    async def _subscribe(self, notify_char):
+        """订阅数据通知；订阅完成前到达的旧通知不作为命令确认"""
+        await self.client.start_notify(notify_char, self._data_pipeline)
+        self.commands.mark_subscribed(time.monotonic())
+
     def _data_pipeline(self, sender, data):
         """数据处理流水线"""
+        arrival_time = time.monotonic()
+        callback_start = time.perf_counter()
+        if self.tracer.enabled:
+            self.tracer.begin(callback_start)
+        self.m_notifications.inc()
+        self.m_bytes.inc(len(data))
+        self.watchdog.feed(arrival_time)
+        self.commands.notify_data(arrival_time)
+        if self.link.pending_gap is not None:
+            self._close_gap(arrival_time)
         try:
             self.receive_count += 1
             data_len = len(data)
             self.total_bytes_received += data_len
 
-            # 首次接收数据的特殊提示
             if self.receive_count == 1:
-                print("\n" + "🎉"*40)
-                print("🎉 首次接收到数据！数据接收回调已成功触发！")
-                print("🎉"*40 + "\n")
-
-            # 详细调试信息
-            if self.debug_enabled:
-                hex_str = ' '.join([f'{b:02x}' for b in data])
-                print(f"\n{'='*80}")
-                print(f"[接收 #{self.receive_count}] 收到 {data_len} 字节数据")
-                print(f"[十六进制] {hex_str}")
-                print(f"[累计接收] {self.total_bytes_received} 字节 | 已解析数据包: {self.total_packets_parsed} | 失败: {self.total_packets_failed}")
-
-                # 检查是否包含起始/结束标记
-                has_start = 0xA0 in data
-                has_end = 0xC0 in data
-                print(f"[标记检查] 起始标记(0xA0): {'✓ 存在' if has_start else '✗ 不存在'} | 结束标记(0xC0): {'✓ 存在' if has_end else '✗ 不存在'}")
-
-                if has_start:
-                    start_pos = data.index(0xA0)
-                    print(f"[起始位置] 0xA0 在第 {start_pos} 字节")
-
-                if has_end:
-                    end_pos = data.index(0xC0)
-                    print(f"[结束位置] 0xC0 在第 {end_pos} 字节")
+                self._log_success("首次接收到数据，数据接收回调已触发", event="first_data", bytes=data_len)
 
             self.raw_buffer += data
 
+            # 调试信息经日志队列以 DEBUG 级别写出，按事件名限流 (每秒至多一条)
             if self.debug_enabled:
-                print(f"[缓冲区状态] 添加后总长度: {len(self.raw_buffer)} 字节")
-                if len(self.raw_buffer) >= self.packet_size:
-                    print(f"[缓冲区状态] ✓ 足够一个完整数据包 (需要 {self.packet_size} 字节)")
-                else:
-                    print(f"[缓冲区状态] ✗ 数据不足 (需要 {self.packet_size} 字节，还差 {self.packet_size - len(self.raw_buffer)} 字节)")
-                print(f"{'='*80}\n")
-
-            self._process_packets()
+                header, footer = self.profile.header, self.profile.footer
+                fields = {"bytes": data_len, "total_bytes": self.total_bytes_received,
+                          "buffer": len(self.raw_buffer), "frame_length": self.packet_size,
+                          "header_at": data.find(header) if header is not None else None,
+                          "footer_at": data.find(footer) if footer is not None else None}
+                if DEBUG_HEX_DUMP:
+                    fields["hex"] = data.hex(" ")
+                self._log_debug(f"接收 #{self.receive_count}: {data_len} 字节, 缓冲区 {len(self.raw_buffer)} 字节",
+                                event="notification_received", **fields)
+
+            block = self._process_packets()
+            self._update_sample_rate(arrival_time)
+            if block is not None:
+                self.sample_clock.update(arrival_time, self.packet_counter)
+                self._publish_block(block)
         except Exception as e:
-            import traceback
-            self._log_error(f"数据处理异常: {str(e)}")
-            print(f"错误堆栈:\n{traceback.format_exc()}")
+            self._log_error(f"数据处理异常: {str(e)}", event="pipeline_error", exc_info=True)
+        self.m_callback.observe(time.perf_counter() - callback_start)
 
     def _process_packets(self):
-        """数据包处理引擎"""
-        processed = 0
-        iteration = 0
+        """数据包处理引擎 - 整块切分帧并按设备协议向量化解码，返回 (n_samples, n_channels) 数据块"""
+        decode_start = time.perf_counter()
+        frames, consumed, failed = self.profile.split_frames(self.raw_buffer)
+        if consumed:
+            del self.raw_buffer[:consumed]
+        self.total_packets_failed += failed
+        discarded = consumed - (len(frames) + failed) * self.packet_size
+        if discarded or failed:
+            self.m_resyncs.inc()
+            self.m_bytes_discarded.inc(discarded)
+            self.m_frames_failed.inc(failed)
+        if len(frames) == 0:
+            if self.debug_enabled and failed:
+                self._log_debug(f"{failed} 个数据包帧头/帧尾校验失败", event="frames_failed",
+                                failed=failed, total_failed=self.total_packets_failed)
+            return None
+
+        decoded = self.profile.decode(frames)
+        block = decoded[self.profile.eeg_field].astype(np.float64)
+        # 同一批帧的加速度 (录制时与 EEG 对齐写入)，在 block_parsed 同步分发期间有效
+        self.last_accel = decoded.get(self.profile.accel_field) if self.profile.accel_field else None
+        processed = len(block)
+        self.m_frames.inc(processed)
+        decoded_time = time.perf_counter()
+        self.m_decode.observe(decoded_time - decode_start)
+        if self.tracer.enabled:
+            self.tracer.mark("decoded", decoded_time)
+        self.packet_counter += processed
+        self.total_packets_parsed += processed
+        if not self.rate_estimator.locked and "counter" in decoded:
+            self._frame_counters.extend(decoded["counter"].tolist())
 
         if self.debug_enabled:
-            print(f"\n[数据包处理] 开始处理，缓冲区当前大小: {len(self.raw_buffer)} 字节")
-
-        while len(self.raw_buffer) >= self.packet_size:
-            iteration += 1
-            if self.debug_enabled:
-                print(f"\n[处理循环 #{iteration}] 缓冲区长度: {len(self.raw_buffer)} 字节")
-
-            start = self.raw_buffer.find(0xA0)
-            if start == -1:
-                # 没有找到起始标记
-                if self.debug_enabled:
-                    hex_str = ' '.join([f'{b:02x}' for b in self.raw_buffer[:min(50, len(self.raw_buffer))]])
-                    print(f"[✗ 失败] 未找到起始标记 0xA0")
-                    print(f"[缓冲区内容] 前 {min(50, len(self.raw_buffer))} 字节: {hex_str}")
-                    print(f"[操作] 清空缓冲区 {len(self.raw_buffer)} 字节")
-                self.raw_buffer.clear()
-                return
-
-            if self.debug_enabled:
-                print(f"[✓ 找到起始] 0xA0 位于位置 {start}")
-                if start > 0:
-                    print(f"[丢弃数据] 起始标记前有 {start} 字节无效数据，将被丢弃")
-
-            if len(self.raw_buffer[start:]) < self.packet_size:
-                # 数据不够一个完整包
-                if self.debug_enabled:
-                    available = len(self.raw_buffer[start:])
-                    print(f"[等待数据] 从起始标记到末尾只有 {available} 字节，需要 {self.packet_size} 字节")
-                    print(f"[等待数据] 还需要 {self.packet_size - available} 字节才能组成完整数据包")
-                return
-
-            packet = self.raw_buffer[start:start+self.packet_size]
-            del self.raw_buffer[:start+self.packet_size]
-
-            if self.debug_enabled:
-                hex_str = ' '.join([f'{b:02x}' for b in packet])
-                print(f"\n[完整数据包 #{self.packet_counter + 1}] 提取 {len(packet)} 字节")
-                print(f"[数据包内容] {hex_str}")
-                print(f"[起始标记] 0x{packet[0]:02x} {'✓ 正确' if packet[0] == 0xA0 else '✗ 错误'}")
-                print(f"[结束标记] 0x{packet[-1]:02x} {'✓ 正确' if packet[-1] == 0xC0 else '✗ 错误'}")
-                print(f"[数据包长度] {len(packet)} 字节 {'✓ 正确' if len(packet) == self.packet_size else '✗ 错误'}")
-
-                # 显示数据包结构
-                print(f"[数据包结构]")
-                print(f"  起始标记: 0x{packet[0]:02x}")
-                print(f"  状态字节: 0x{packet[1]:02x}")
-                print(f"  通道数据: {len(packet[2:-1])} 字节 (应为 {self.packet_size - 3} 字节)")
-                print(f"  结束标记: 0x{packet[-1]:02x}")
-
-            if packet[-1] == 0xC0:
-                if self.debug_enabled:
-                    print(f"[✓ 验证通过] 数据包有效，开始解析...")
-                self._parse_packet(packet)
-                processed += 1
-                self.total_packets_parsed += 1
-            else:
-                # 结束标记不正确
-                if self.debug_enabled:
-                    print(f"[✗ 验证失败] 结束标记错误: 期望 0xC0，实际 0x{packet[-1]:02x}")
-                self.total_packets_failed += 1
-
-        if self.debug_enabled and processed > 0:
-            print(f"\n[处理完成] 本轮处理了 {processed} 个数据包")
-            print(f"[统计] 总解析: {self.total_packets_parsed} | 总失败: {self.total_packets_failed}")
-            print(f"[缓冲区] 剩余 {len(self.raw_buffer)} 字节")
-
-        if processed > 0 and self.packet_counter <= 10:
-            self._log_operation(f"处理完成 {processed} 个数据包 (总计: {self.packet_counter})", "✔")
-
-    def _parse_packet(self, packet):
-        """数据包解析核心"""
-        try:
-            if self.debug_enabled:
-                print(f"\n[开始解析] 数据包 #{self.packet_counter + 1}")
-
-            channels = [
-                int.from_bytes(packet[i:i+3], 'big', signed=True)
-                for i in range(2, 26, 3)
-            ]
-
-            if self.debug_enabled:
-                print(f"[通道数据] 解析出 {len(channels)} 个通道")
-                for idx, value in enumerate(channels):
-                    byte_offset = 2 + idx * 3
-                    raw_bytes = packet[byte_offset:byte_offset+3]
-                    hex_str = ' '.join([f'{b:02x}' for b in raw_bytes])
-                    print(f"  通道 {idx+1}: {value:8d} (原始: {hex_str})")
-
-            self.data_parsed.emit(channels)
-            self.packet_counter += 1
-
-            if self.debug_enabled:
-                print(f"[✓ 解析成功] 数据包 #{self.packet_counter} 已发送到显示系统")
+            self._log_frames(frames, block, failed)
+
+        if self.packet_counter - processed < 10:
+            self._log_operation(f"处理完成 {processed} 个数据包 (总计: {self.packet_counter})", "✔",
+                                event="packets_processed", packets=processed, total=self.packet_counter)
+        return block
+
+    def _log_frames(self, frames, block, failed):
+        """调试日志: 本轮解码统计；DEBUG_HEX_DUMP 时附带每个数据包的原始字节与通道值"""
+        fields = {"packets": len(block), "failed": failed, "total_parsed": self.total_packets_parsed,
+                  "total_failed": self.total_packets_failed, "buffer_left": len(self.raw_buffer)}
+        if DEBUG_HEX_DUMP:
+            first = self.packet_counter - len(block) + 1
+            fields["frames"] = [
+                {"packet": first + i, "hex": bytes(packet).hex(" "),
+                 "channels": dict(zip(self.profile.channel_names, channels.astype(int).tolist()))}
+                for i, (packet, channels) in enumerate(zip(frames, block))]
+        self._log_debug(f"解码 {len(block)} 个数据包 (失败 {failed}), 缓冲区剩余 {len(self.raw_buffer)} 字节",
+                        event="packets_decoded", **fields)
+
+    def _close_gap(self, arrival_time):
+        """重连后首个数据到达 - 记录间隙与恢复耗时"""
+        rate = self.stream_info.sample_rate if self.stream_info else None
+        gap = self.link.on_data(arrival_time, rate)
+        if gap is None:
+            return
+        self.m_gaps.inc()
+        self._log_success(f"数据已恢复: 断开至首个数据 {gap.duration:.3f} 秒, 估计丢失 {gap.missing_samples} 个样本",
+                          event="stream_resumed", **gap.as_dict())
+        self.stream_gap.emit(gap)
+
+    def _update_sample_rate(self, arrival_time):
+        """采样率实测 - 预热期内每次通知更新一次，确定后发布流元数据"""
+        if self.rate_estimator.locked or not self._frame_counters:
+            return
 
-        except Exception as e:
-            import traceback
-            self._log_error(f"数据解析错误: {str(e)}")
-            if self.debug_enabled:
-                print(f"错误堆栈:\n{traceback.format_exc()}")
+        info = self.rate_estimator.update(arrival_time, self._frame_counters)
+        self._frame_counters.clear()
+        if info is not None:
+            self._log_success(f"采样率已确定: {info.sample_rate:g} Hz (实测 {info.measured_rate:.2f} Hz)",
+                              event="rate_locked", sample_rate=info.sample_rate, measured_rate=info.measured_rate)
+            self._apply_stream_info(info)
+
+    def use_stream_info(self, info):
+        """采样率已知 (回放、仿真) 时跳过实测，直接发布流元数据"""
+        self.rate_estimator.lock(info)
+        self._frame_counters.clear()
+        self._apply_stream_info(info)
+
+    def _apply_stream_info(self, info):
+        self.stream_info = info
+        self.sample_clock.sample_rate = info.sample_rate
+        self.watchdog.configure(info.sample_rate, STALL_SAMPLE_PERIODS, STALL_MIN_TIMEOUT)
+        self._init_stages(info)
+        self.stream_info_ready.emit(info)
+
+    def _init_stages(self, info):
+        """按实测采样率创建下游处理阶段 (神经反馈、通道连通性)"""
+        if self.feedback is not None and self.feedback.stream_info.sample_rate == info.sample_rate:
+            return
+        self.feedback = NeuroFeedbackEngine(info, FEEDBACK_WINDOW_SECONDS, FEEDBACK_HOP_SECONDS)
+        self.feedback.subscribe(self.feedback_updated.emit)
+        if FEEDBACK_UDP_PORT:
+            self.feedback.subscribe(UdpScoreSink(port=FEEDBACK_UDP_PORT))
+
+        self.connectivity = ConnectivityStage(info, CONNECTIVITY_WINDOW_SECONDS)
+        self.connectivity.subscribe(self.connectivity_updated.emit)
+
+        self.channel_stats = ChannelStatsStage(info, CHANNEL_STATS_WINDOW_SECONDS, CHANNEL_STATS_EMIT_SECONDS)
+        self.channel_stats.subscribe(self.channel_stats_updated.emit)
+
+    def _channel_stat(self, field, names, convert=float):
+        """最近一次通道统计的某一字段 {通道名: 值}，尚无统计时为空"""
+        stats = self.channel_stats.latest if self.channel_stats is not None else None
+        if stats is None:
+            return {}
+        return {name: convert(value) for name, value in zip(names, getattr(stats, field))}
+
+    def _publish_block(self, block):
+        """将本次通知解析出的数据块 (n_samples, n_channels) 分发给显示与处理阶段"""
+        self.block_parsed.emit(block)
+        if self.feedback is not None:
+            self.feedback.push(block)
+        if self.connectivity is not None:
+            self.connectivity.push(block)
+        if self.channel_stats is not None:
+            self.channel_stats.push(block)
+        if self.stream_publisher is not None:
+            self.stream_publisher(block)
+
+    # 事件标记 ------------------------------------------------
+    def post_marker(self, label, code=None, timestamp=None):
+        """
+        插入事件标记 (刺激开始等)，timestamp 为 time.monotonic() 时刻，缺省为当前时刻
+        返回 Marker；采集开始前 sample 为 None
+        """
+        return self.markers.post(label, code, timestamp)
+
+    def _on_marker(self, marker):
+        self.m_markers.inc()
+        self._log_operation(f"事件标记 {marker.label} (code={marker.code}) @ 样本 {marker.sample}", "⚑",
+                            event="marker", **marker.as_dict())
+        self.marker_posted.emit(marker)
 
     # 日志系统 --------------------------------------------------
-    def _log_system(self, message, symbol="ℹ"):
+    # event 为结构化事件名，其余关键字参数作为计数器等字段写入日志记录
+    def _log_system(self, message, symbol="ℹ", event=None, **fields):
         """系统级日志"""
-        self._emit_log("SYSTEM", symbol, message)
+        self._emit_log(logging.INFO, "SYSTEM", symbol, message, event, fields)
 
-    def _log_operation(self, message, symbol="↔"):
+    def _log_operation(self, message, symbol="↔", event=None, **fields):
         """操作日志"""
-        self._emit_log("OPER", symbol, message)
+        self._emit_log(logging.INFO, "OPER", symbol, message, event, fields)
 
-    def _log_success(self, message):
+    def _log_success(self, message, event=None, **fields):
         """成功日志"""
-        self._emit_log("SUCCESS", "✓", message)
+        self._emit_log(logging.INFO, "SUCCESS", "✓", message, event, fields)
 
-    def _log_warning(self, message):
+    def _log_warning(self, message, event=None, **fields):
         """警告日志"""
-        self._emit_log("WARNING", "⚠", message)
-
-    def _log_error(self, message):
-        """错误日志"""
-        self._emit_log("ERROR", "✗", message)
-
-    def _emit_log(self, log_type, symbol, message):
-        """统一日志发射器"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        log_msg = f"[{timestamp}] {symbol} {log_type}: {message}"
-        print(log_msg)
-        self.status_update.emit(message)
+        self._emit_log(logging.WARNING, "WARNING", "⚠", message, event, fields)
+
+    def _log_error(self, message, event=None, exc_info=None, **fields):
+        """错误日志 (exc_info=True 时附带当前异常的堆栈，由日志线程格式化)"""
+        self._emit_log(logging.ERROR, "ERROR", "✗", message, event, fields, exc_info=exc_info)
+
+    def _log_debug(self, message, event=None, **fields):
+        """调试日志 (仅调试模式下调用；不更新状态栏)"""
+        self._emit_log(logging.DEBUG, "DEBUG", "·", message, event, fields, status=False)
+
+    def _emit_log(self, level, log_type, symbol, message, event, fields, exc_info=None, status=True):
+        """统一日志发射器 - 记录入队即返回，状态栏更新合并后发出"""
+        device = self.client.address if self.client is not None else None
+        log.log(level, message, exc_info=exc_info, extra={
+            "kind": log_type, "symbol": symbol, "event": event or log_type.lower(),
+            "device": device, "fields": fields,
+            "rate_key": event or message,  # 带事件名的记录按事件限流，可变内容在 fields 中
+        })
+        if status:
+            self._status.post(message)
 
 class RealTimePlot(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, leak_check=LEAK_CHECK, debug=DEBUG_MODE):
         super().__init__()
-        self.bt_client = BCIBluetoothClient()
+        self.bt_client = BCIBluetoothClient(leak_check=leak_check, debug=debug)
         self._init_parameters()
         self._init_ui()
         self._init_data()
+        self._init_metrics()
+        self._init_profiling()
+        self._init_markers()
         self._setup_connections()
         self._print_banner()
 
     def _init_parameters(self):
         """初始化运行参数"""
-        self.num_channels = 8
-        self.plot_refresh_rate = 30  # Hz
+        self.num_channels = NUM_CHANNELS
+        self.plot_refresh_rate = 30  # Hz, 初始目标帧率 (由渲染调度器自适应调整)
         self.dynamic_scale_factor = 0.3
+        self.autoscale_robust = AUTOSCALE_ROBUST
+        self.stacked_mode = STACKED_VIEW
+        self.render_ms = 0.0  # 每帧数据准备 + setData 耗时 (指数平均)
+        self._last_render_report = 0.0
+        self.render_scheduler = RenderScheduler(self.num_channels, self.plot_refresh_rate)
+        self.recorder = None
+        self.review_windows = []
+        self.device_cache = DeviceCache()
+        self.device_filter = DeviceFilter(name_prefix=DEVICE_NAME_PREFIX, service_uuid=SERVICE_UUID)
+        self.display_seconds = DISPLAY_SECONDS
+        self.sample_rate = None  # 由采集端实测后发布
 
     def _init_ui(self):
         """初始化用户界面"""
@@ -576,16 +970,46 @@ class RealTimePlot(QtWidgets.QMainWindow):
         # 控制面板
         control_panel = self._create_control_panel()
         layout.addLayout(control_panel)
+        layout.addLayout(self._create_display_panel())
 
-        # 波形显示区
-        self.graph = pg.GraphicsLayoutWidget()
+        # 波形显示区 (分离布局: 每通道一个 PlotItem)
+        self.graph = TimedGraphicsLayoutWidget()
         layout.addWidget(self.graph)
         self._init_plots()
 
+        # 波形显示区 (叠加布局: 单个 PlotItem)
+        self.stacked_graph = TimedGraphicsLayoutWidget()
+        layout.addWidget(self.stacked_graph)
+        self._init_stacked_plot()
+        self.graph.setVisible(not self.stacked_mode)
+        self.stacked_graph.setVisible(self.stacked_mode)
+
+        # 状态栏: 渲染耗时
+        self.render_label = QtWidgets.QLabel("渲染: --", self)
+        self.statusBar().addPermanentWidget(self.render_label)
+        self.latency_label = QtWidgets.QLabel("延迟: --", self)
+        self.statusBar().addPermanentWidget(self.latency_label)
+        if self.bt_client.tracer.enabled:
+            self.graph.paint_callback = self.bt_client.tracer.rendered
+            self.stacked_graph.paint_callback = self.bt_client.tracer.rendered
+
+        # 通道相关 / alpha 相干热图 (可选)
+        self.connectivity_view = pg.GraphicsLayoutWidget()
+        self.connectivity_view.setMaximumHeight(260)
+        layout.addWidget(self.connectivity_view)
+        self._init_connectivity_view()
+        self.connectivity_view.setVisible(SHOW_CONNECTIVITY)
+
+        # 逐通道统计表 (直流偏移/标准差/RMS/峰峰值/接触状态)
+        self.stats_table = self._create_stats_table()
+        layout.addWidget(self.stats_table)
+        self.stats_table.setVisible(SHOW_CHANNEL_STATS)
+
         # 刷新定时器
         self.refresh_timer = QtCore.QTimer()
+        self.refresh_timer.setTimerType(QtCore.Qt.PreciseTimer)
         self.refresh_timer.timeout.connect(self._refresh_plots)
-        self.refresh_timer.start(1000 // self.plot_refresh_rate)
+        self.refresh_timer.start(int(self.render_scheduler.interval_ms))
 
     def _create_control_panel(self):
         """创建控制面板"""
@@ -596,6 +1020,13 @@ class RealTimePlot(QtWidgets.QMainWindow):
         self.start_data_btn = QtWidgets.QPushButton("启动数据流 (b)", self)
         self.stop_data_btn = QtWidgets.QPushButton("停止数据流 (sv)", self)
         self.status_label = QtWidgets.QLabel("状态: 就绪", self)
+        self.feedback_label = QtWidgets.QLabel("放松度: -- | 专注度: -- | 疲劳度: --", self)
+        self.connectivity_cb = QtWidgets.QCheckBox("连通性热图", self)
+        self.robust_scale_cb = QtWidgets.QCheckBox("稳健缩放", self)
+        self.stats_cb = QtWidgets.QCheckBox("通道统计", self)
+        self.stats_cb.setChecked(SHOW_CHANNEL_STATS)
+        self.robust_scale_cb.setChecked(AUTOSCALE_ROBUST)
+        self.connectivity_cb.setChecked(SHOW_CONNECTIVITY)
 
         # 初始状态：数据流控制按钮禁用，直到连接成功
         self.start_data_btn.setEnabled(False)
@@ -605,7 +1036,45 @@ class RealTimePlot(QtWidgets.QMainWindow):
         panel.addWidget(self.connect_btn)
         panel.addWidget(self.start_data_btn)
         panel.addWidget(self.stop_data_btn)
+        panel.addWidget(self.connectivity_cb)
+        panel.addWidget(self.robust_scale_cb)
+        panel.addWidget(self.stats_cb)
         panel.addWidget(self.status_label)
+        panel.addWidget(self.feedback_label)
+        return panel
+
+    def _create_display_panel(self):
+        """创建显示控制面板 (叠加视图与通道增益)"""
+        panel = QtWidgets.QHBoxLayout()
+
+        self.stacked_cb = QtWidgets.QCheckBox("叠加视图", self)
+        self.stacked_cb.setChecked(self.stacked_mode)
+        self.gain_channel_combo = QtWidgets.QComboBox(self)
+        self.gain_channel_combo.addItem("全部通道")
+        self.gain_channel_combo.addItems(PROFILE.channel_names)
+        self.gain_spin = QtWidgets.QDoubleSpinBox(self)
+        self.gain_spin.setRange(0.1, 20.0)
+        self.gain_spin.setSingleStep(0.1)
+        self.gain_spin.setValue(1.0)
+        self.gain_spin.setPrefix("增益 ×")
+
+        self.record_btn = QtWidgets.QPushButton("开始录制", self)
+        self.record_btn.setCheckable(True)
+        self.record_btn.setEnabled(False)  # 采样率确定后才可录制
+        self.review_btn = QtWidgets.QPushButton("回看会话...", self)
+        self.marker_btn = QtWidgets.QPushButton("插入标记", self)
+        self.latency_btn = QtWidgets.QPushButton("导出延迟", self)
+        self.latency_btn.setEnabled(self.bt_client.tracer.enabled)
+
+        panel.addWidget(self.stacked_cb)
+        panel.addWidget(self.gain_channel_combo)
+        panel.addWidget(self.gain_spin)
+        panel.addStretch(1)
+        panel.addWidget(self.marker_btn)
+        panel.addWidget(self.record_btn)
+        panel.addWidget(self.review_btn)
+        panel.addWidget(self.latency_btn)
+        self._update_gain_controls()
         return panel
 
     def _init_plots(self):
@@ -614,16 +1083,154 @@ class RealTimePlot(QtWidgets.QMainWindow):
         self.curves = []
         for i in range(self.num_channels):
             plot = self.graph.addPlot(row=i, col=0)
-            plot.setLabel('left', f'Ch{i+1}', 'μV')
+            plot.setLabel('left', PROFILE.channel_names[i], 'μV')
             plot.showGrid(x=True, y=True)
             plot.setYRange(-1000, 1000)
             self.plots.append(plot)
             self.curves.append(plot.plot(pen=pg.mkPen(color=pg.intColor(i), antialias=True)))
 
+    def _init_stacked_plot(self):
+        """初始化叠加视图"""
+        plot = self.stacked_graph.addPlot(row=0, col=0)
+        plot.setLabel('bottom', '时间')
+        self.stacked = StackedRenderer(plot, self.num_channels, BUFFER_SIZE,
+                                       channel_names=PROFILE.channel_names)
+
+    def _create_stats_table(self):
+        """逐通道统计表: 每行一个通道，单元格预先创建，更新时只改文本"""
+        headers = ["直流偏移", "标准差", "RMS", "峰峰值", "接触"]
+        table = QtWidgets.QTableWidget(self.num_channels, len(headers), self)
+        table.setHorizontalHeaderLabels(headers)
+        table.setVerticalHeaderLabels(PROFILE.channel_names)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        table.verticalHeader().setDefaultSectionSize(18)
+        for row in range(self.num_channels):
+            for col in range(len(headers)):
+                item = QtWidgets.QTableWidgetItem("--")
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                table.setItem(row, col, item)
+        table.setMaximumHeight(24 + 18 * self.num_channels)
+        return table
+
+    def _init_connectivity_view(self):
+        """初始化相关 / 相干热图"""
+        lut = pg.colormap.get('viridis').getLookupTable(nPts=256)
+        ticks = [[(i + 0.5, name) for i, name in enumerate(PROFILE.channel_names)]]
+        self.connectivity_images = {}
+        for col, (key, title, levels) in enumerate((
+                ('correlation', '通道相关', (-1.0, 1.0)),
+                ('coherence', 'Alpha 相干', (0.0, 1.0)))):
+            plot = self.connectivity_view.addPlot(row=0, col=col, title=title)
+            plot.setAspectLocked(True)
+            plot.invertY(True)
+            plot.getAxis('left').setTicks(ticks)
+            plot.getAxis('bottom').setTicks(ticks)
+            image = pg.ImageItem(np.eye(self.num_channels))
+            image.setLookupTable(lut)
+            image.setLevels(levels)
+            plot.addItem(image)
+            self.connectivity_images[key] = (image, levels)
+
     def _init_data(self):
         """初始化数据存储"""
-        self.data = np.zeros((self.num_channels, BUFFER_SIZE))
-        self.ptr = 0
+        self.ring = DisplayRing(self.num_channels, BUFFER_SIZE)
+        self.x_axis = ScrollingAxis(BUFFER_SIZE)
+        self.autoscaler = self._create_autoscaler(AUTOSCALE_SAMPLES)
+
+    def _init_metrics(self):
+        """注册显示端指标并启动本地指标端点"""
+        m = self.bt_client.metrics
+        self.m_render = m.histogram("render_seconds", "每帧数据准备与 setData 耗时")
+        m.gauge("paint_seconds", "每帧绘制耗时 (指数平均)",
+                lambda: (self.stacked_graph if self.stacked_mode else self.graph).paint_ms / 1000.0)
+        m.gauge("render_fps", "实际刷新帧率", lambda: self.render_scheduler.achieved_fps)
+        m.gauge("render_skipped_late", "因超出帧预算跳过的帧数", lambda: self.render_scheduler.skipped_late)
+        m.gauge("display_samples", "显示缓冲区中的样本数", lambda: self.ring.count)
+        m.gauge("recording", "是否正在录制", lambda: int(self.recorder is not None))
+        m.gauge("recording_queue_depth", "录制写线程待执行的操作数",
+                lambda: self.recorder.pending if self.recorder is not None else 0)
+
+        self.metrics_server = None
+        if METRICS_PORT is not None:
+            try:
+                self.metrics_server = MetricsServer(m, port=METRICS_PORT).start()
+            except OSError as e:
+                print(f"[指标] 端口 {METRICS_PORT} 不可用，指标端点未启动: {e}")
+
+    def _init_markers(self):
+        """本机 UDP 标记入口 (时间戳在接收线程打上，分发在事件循环线程)"""
+        self.marker_server = None
+        if MARKER_UDP_PORT is not None:
+            try:
+                self.marker_server = MarkerServer(self.bt_client.markers, asyncio.get_event_loop(),
+                                                  port=MARKER_UDP_PORT).start()
+            except OSError as e:
+                print(f"[标记] 端口 {MARKER_UDP_PORT} 不可用，UDP 标记入口未启动: {e}")
+
+    def _init_profiling(self):
+        """按需性能分析控制器与 诊断 菜单"""
+        self.perf_profiler = ProfilingController(RECORDINGS_DIR, metadata=self._session_metadata,
+                                                 on_finished=self._on_profile_finished)
+        menu = self.menuBar().addMenu("诊断")
+        self.profile_actions = {}
+        for mode, label in ((MODE_CPROFILE, "cProfile"), (MODE_SAMPLE, "采样")):
+            action = menu.addAction(f"性能分析 ({label}, {PROFILE_SECONDS:g} 秒)")
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, mode=mode: self.toggle_profiling(mode=mode))
+            self.profile_actions[mode] = action
+        menu.addSeparator()
+        menu.addAction("导出延迟分布").triggered.connect(self._dump_latency)
+
+    def toggle_profiling(self, duration=PROFILE_SECONDS, mode=PROFILE_MODE):
+        """开始一次固定时长的性能分析，正在分析时提前结束 (菜单、SIGUSR1 与命令行共用)"""
+        if self.perf_profiler.active:
+            self.perf_profiler.stop()
+            return
+        self.perf_profiler.start(duration, mode)
+        for action_mode, action in self.profile_actions.items():
+            action.setChecked(action_mode == mode)
+        print(f"[性能分析] 开始 ({mode}, {duration:g} 秒)，再次触发可提前结束")
+        self._update_status(f"性能分析中 ({mode}, {duration:g} 秒)...")
+
+    def _on_profile_finished(self, directory):
+        for action in self.profile_actions.values():
+            action.setChecked(False)
+        print(f"[性能分析] 结果已写入 {directory}")
+        self._update_status(f"性能分析完成: {directory}")
+
+    def _session_metadata(self):
+        """性能分析结果附带的会话元数据"""
+        client = self.bt_client
+        sched = self.render_scheduler
+        return {
+            "app_version": APP_VERSION,
+            "device_profile": DEVICE_PROFILE,
+            "device": client.client.address if client.client else None,
+            "link_state": client.link.state,
+            "data_streaming": client.data_streaming,
+            "sample_rate": self.sample_rate,
+            "measured_rate": client.stream_info.measured_rate if client.stream_info else None,
+            "notifications": client.receive_count,
+            "bytes_received": client.total_bytes_received,
+            "packets_parsed": client.total_packets_parsed,
+            "packets_failed": client.total_packets_failed,
+            "debug_enabled": client.debug_enabled,
+            "render_mode": "stacked" if self.stacked_mode else "split",
+            "render_ms": round(self.render_ms, 3),
+            "target_fps": sched.fps,
+            "achieved_fps": round(sched.achieved_fps, 2),
+            "recording": self.recorder.directory if self.recorder is not None else None,
+            "latency": client.tracer.snapshot(),
+            "commands": client.command_stats(),
+        }
+
+    def _create_autoscaler(self, window_samples):
+        """创建纵轴自动缩放器"""
+        return AutoScaler(self.num_channels, window_samples,
+                          scale_factor=self.dynamic_scale_factor,
+                          robust=self.autoscale_robust)
 
     def _setup_connections(self):
         """建立信号连接"""
@@ -631,8 +1238,25 @@ class RealTimePlot(QtWidgets.QMainWindow):
         self.connect_btn.clicked.connect(self._toggle_connection)
         self.start_data_btn.clicked.connect(self._start_data_stream)
         self.stop_data_btn.clicked.connect(self._stop_data_stream)
-        self.bt_client.data_parsed.connect(self._update_buffer)
+        self.bt_client.block_parsed.connect(self._update_buffer)
         self.bt_client.status_update.connect(self._update_status)
+        self.bt_client.stream_info_ready.connect(self._on_stream_info)
+        self.bt_client.feedback_updated.connect(self._update_feedback)
+        self.bt_client.connectivity_updated.connect(self._update_connectivity)
+        self.bt_client.channel_stats_updated.connect(self._update_channel_stats)
+        self.bt_client.stream_gap.connect(self._on_stream_gap)
+        self.bt_client.link_state_changed.connect(self._on_link_state)
+        self.bt_client.marker_posted.connect(self._on_marker)
+        self.marker_btn.clicked.connect(lambda: self.bt_client.post_marker("manual"))
+        self.connectivity_cb.toggled.connect(self.connectivity_view.setVisible)
+        self.robust_scale_cb.toggled.connect(self._set_robust_scale)
+        self.stats_cb.toggled.connect(self.stats_table.setVisible)
+        self.stacked_cb.toggled.connect(self._set_stacked_view)
+        self.gain_spin.valueChanged.connect(self._apply_gain)
+        self.gain_channel_combo.currentIndexChanged.connect(self._update_gain_controls)
+        self.record_btn.toggled.connect(self._toggle_recording)
+        self.review_btn.clicked.connect(self._open_review)
+        self.latency_btn.clicked.connect(self._dump_latency)
 
     def _print_banner(self):
         """打印启动信息"""
@@ -641,17 +1265,23 @@ class RealTimePlot(QtWidgets.QMainWindow):
         print(f"Build Date: {BUILD_DATE}")
         print("-"*60)
         print("设备配置:")
-        print(f"  目标设备: NV-BrainRF")
-        print(f"  MAC 地址: {TARGET_MAC}")
+        print(f"  目标设备: 名称前缀 '{DEVICE_NAME_PREFIX}' (扫描超时 {DISCOVERY_TIMEOUT:g} 秒，找到即返回)")
+        print(f"  回退地址: {TARGET_MAC}")
+        print(f"  设备协议: {PROFILE}")
         print(f"  Service UUID: {SERVICE_UUID}")
         print(f"  Write UUID: {WRITE_CHAR_UUID}")
         print(f"  Notify UUID: {NOTIFY_CHAR_UUID}")
         print("-"*60)
         print("系统配置:")
-        print(f"  采样缓冲区: {BUFFER_SIZE} 点/通道")
-        print(f"  显示刷新率: {self.plot_refresh_rate} Hz")
-        print(f"  动态缩放系数: {self.dynamic_scale_factor}")
+        if self.metrics_server is not None:
+            print(f"  指标端点: {self.metrics_server.url}")
+        if self.marker_server is not None:
+            print(f"  标记入口: udp://{self.marker_server.host}:{self.marker_server.port}")
+        print(f"  显示窗口: {self.display_seconds} 秒 (采样率确定前 {BUFFER_SIZE} 点/通道)")
+        print(f"  显示刷新率: {self.plot_refresh_rate} Hz (自适应 {self.render_scheduler.min_fps:g}-{self.render_scheduler.max_fps:g} Hz)")
+        print(f"  动态缩放系数: {self.dynamic_scale_factor} (稳健模式: {'开' if self.autoscale_robust else '关'})")
         print(f"  🐛 调试模式: {'✓ 已启用' if self.bt_client.debug_enabled else '✗ 已禁用'}")
+        print(f"  内存泄漏检测: {'开 (--leak-check)' if self.bt_client.leak_monitor is not None else '关'}")
         print("-"*60)
         print("📊 数据包格式 (33字节):")
         print("  [0]      帧头 0xA0")
@@ -663,7 +1293,7 @@ class RealTimePlot(QtWidgets.QMainWindow):
         print("\n💡 调试提示:")
         print("  1. 控制调试模式:")
         print("     window.bt_client.debug_enabled = False  # 关闭详细调试")
-        print("     window.bt_client.debug_enabled = True   # 开启详细调试")
+        print("     window.bt_client.debug_enabled = True   # 开启详细调试 (需以 --debug 启动或将日志级别设为 DEBUG)")
         print("\n  2. 测试不同启动命令 (在Python控制台):")
         print("     import asyncio")
         print("     asyncio.create_task(window.bt_client.send_custom_command(b's'))")
@@ -671,7 +1301,9 @@ class RealTimePlot(QtWidgets.QMainWindow):
         print("\n  3. 如果没有收到数据，检查:")
         print("     - 设备是否有LED指示数据传输")
         print("     - 设备是否需要物理按钮启动")
-        print("     - 查看5秒状态报告的诊断信息")
+        print("     - 查看数据流停滞时输出的诊断信息与指标端点")
+        print("\n  4. 性能分析 (不中断采集):")
+        print(f"     菜单 诊断 → 性能分析 | kill -USR1 {os.getpid()} | 启动参数 --profile {PROFILE_SECONDS:g}")
         print("="*60)
 
     def _scan_devices(self):
@@ -679,18 +1311,27 @@ class RealTimePlot(QtWidgets.QMainWindow):
         asyncio.create_task(self._async_scan())
 
     async def _async_scan(self):
-        """异步设备扫描"""
-        print("正在扫描蓝牙设备...")
+        """异步设备扫描 - 发现第一个匹配设备即返回，结果写入设备缓存"""
+        print(f"正在扫描蓝牙设备 (名称前缀 '{DEVICE_NAME_PREFIX}')...")
         self._update_status("正在扫描蓝牙设备...")
+        start = time.monotonic()
         try:
-            devices = await BleakScanner.discover(timeout=10.0)
+            devices = await discover(self.device_filter, max_matches=1,
+                                     timeout=DISCOVERY_TIMEOUT, cache=self.device_cache)
+            elapsed = time.monotonic() - start
             if devices:
-                print("[SCAN] 发现以下设备:")
+                print(f"[SCAN] {elapsed:.2f} 秒内发现目标设备:")
                 for i, d in enumerate(devices):
-                    indicator = "✓ 目标设备" if "NV-BrainRF" in (d.name or "") else ""
-                    print(f"  {i+1}. {d.name or '未知设备'} - {d.address} {indicator}")
+                    print(f"  {i+1}. {d} ✓ 目标设备")
+                self._update_status(f"发现设备: {devices[0].name or devices[0].address}")
             else:
-                print("[SCAN] 未找到有效设备")
+                print(f"[SCAN] {elapsed:.1f} 秒内未找到匹配设备")
+                self._update_status("未找到匹配设备")
+            others = [d for d in self.device_cache.fresh() if d not in devices]
+            if others:
+                print(f"[SCAN] 其他附近设备 {len(others)} 个 (按信号强度):")
+                for d in others[:10]:
+                    print(f"     {d}")
         except Exception as e:
             print(f"[ERROR] 扫描失败: {str(e)}")
 
@@ -749,8 +1390,21 @@ class RealTimePlot(QtWidgets.QMainWindow):
         self.connect_btn.setText("断开")
         self.scan_btn.setEnabled(False)
 
+        # 定位设备: 优先使用扫描缓存，否则扫描到第一个匹配设备即返回
+        target = TARGET_MAC
+        try:
+            found = await find_device(self.device_filter, timeout=DISCOVERY_TIMEOUT,
+                                      cache=self.device_cache)
+            if found is not None:
+                target = found.device
+                print(f"[连接] 使用发现的设备: {found}")
+            else:
+                print(f"[连接] 未发现匹配设备，回退到配置地址 {TARGET_MAC}")
+        except Exception as e:
+            print(f"[连接] 设备发现失败 ({str(e)})，回退到配置地址 {TARGET_MAC}")
+
         # 执行连接（这会阻塞直到连接完成或失败）
-        await self.bt_client.connect_device(TARGET_MAC)
+        await self.bt_client.connect_device(target)
 
         # 连接完成后，根据连接状态启用数据流按钮
         if self.bt_client.running and self.bt_client.client and self.bt_client.client.is_connected:
@@ -760,38 +1414,253 @@ class RealTimePlot(QtWidgets.QMainWindow):
     def _disconnect(self):
         """终止连接"""
         self.bt_client.running = False
+        if self.bt_client.link.state not in (STATE_IDLE, STATE_CLOSING, STATE_FAILED):
+            asyncio.ensure_future(self.bt_client.request_disconnect())
+        self._reset_connection_ui()
+
+    def _reset_connection_ui(self):
+        """恢复未连接时的按钮状态"""
         self.connect_btn.setText("连接")
         self.scan_btn.setEnabled(True)
         # 禁用数据流控制按钮
         self.start_data_btn.setEnabled(False)
         self.stop_data_btn.setEnabled(False)
 
-    def _update_buffer(self, eeg_data):
-        """更新数据缓冲区"""
-        self.data[:, self.ptr] = eeg_data
-        self.ptr = (self.ptr + 1) % BUFFER_SIZE
+    def _on_stream_info(self, info):
+        """采样率确定后按秒一次性分配显示缓冲区"""
+        self.sample_rate = info.sample_rate
+        size = info.samples(self.display_seconds)
+
+        # 保留预热期内已接收的最新数据
+        self.ring = self.ring.resized(size)
+        self.x_axis = ScrollingAxis(size, self.sample_rate)
+        self.autoscaler = self._create_autoscaler(info.samples(AUTOSCALE_SECONDS))
+        self.stacked.resize(size)
+        self.plots[-1].setLabel('bottom', '时间', 's')
+        self.stacked.plot.setLabel('bottom', '时间', 's')
+        self.record_btn.setEnabled(True)
+        print(f"[显示] 采样率 {info.sample_rate:g} Hz, 显示窗口 {self.display_seconds} 秒 = {size} 点/通道")
+
+    def _update_buffer(self, block):
+        """更新数据缓冲区 (按数据块写入)"""
+        tracer = self.bt_client.tracer
+        if tracer.enabled:
+            tracer.mark("delivered")
+        self.ring.extend(block)
+        self.autoscaler.extend(block)
+        self.render_scheduler.mark_dirty()
+        if tracer.enabled:
+            tracer.buffered(len(block))
+        if self.recorder is not None:
+            self.recorder.write(block, self.bt_client.last_accel)
 
     def _refresh_plots(self):
-        """定时刷新波形显示"""
-        if self.ptr == 0:
+        """定时刷新波形显示 (双写环形缓冲区的连续视图 + 原地平移的时间轴，无数组分配)"""
+        start = time.perf_counter()
+        if self.ring.count == 0 or not self.render_scheduler.begin(start):
+            self._report_render_stats(start)
             return
 
-        x = np.arange(-BUFFER_SIZE + self.ptr, self.ptr)
-        for i in range(self.num_channels):
-            y = np.concatenate([self.data[i, self.ptr:], self.data[i, :self.ptr]])
-            self.curves[i].setData(x, y)
-            self._adjust_scale(i, y)
-
-    def _adjust_scale(self, ch_index, data):
-        """动态调整显示范围"""
-        visible_data = data[-200:]
-        if len(visible_data) == 0:
+        x = self.x_axis.update(self.ring.count)
+        if self.stacked_mode:
+            self.stacked.set_ranges(self.autoscaler.update())
+            self.stacked.render(x, self.ring.window())
+        else:
+            # 只重绘有新数据的通道
+            for i in self.render_scheduler.dirty:
+                self.curves[i].setData(x, self.ring.channel(i))
+            self._adjust_scale()
+        self._record_render_time(start)
+
+    def _adjust_scale(self):
+        """动态调整显示范围 - 仅当数据越出滞回带时才重设坐标轴"""
+        for ch_index, low, high in self.autoscaler.update():
+            self.plots[ch_index].setYRange(low, high, padding=0)
+
+    def _record_render_time(self, start):
+        """统计每帧渲染耗时 (数据准备 + 绘制)，交给调度器自适应调整帧率"""
+        now = time.perf_counter()
+        self.m_render.observe(now - start)
+        elapsed = (now - start) * 1000.0
+        self.render_ms += 0.1 * (elapsed - self.render_ms)
+        widget = self.stacked_graph if self.stacked_mode else self.graph
+        interval = self.render_scheduler.end(now, elapsed + widget.paint_ms)
+        if interval is not None:
+            self.refresh_timer.setInterval(int(interval))
+        self._report_render_stats(now)
+
+    def _report_render_stats(self, now):
+        """每 0.5 秒在状态栏更新一次渲染统计"""
+        if now - self._last_render_report < 0.5:
+            return
+        self._last_render_report = now
+        sched = self.render_scheduler
+        widget = self.stacked_graph if self.stacked_mode else self.graph
+        mode = "叠加" if self.stacked_mode else "分离"
+        self.render_label.setText(
+            f"渲染({mode}): {self.render_ms + widget.paint_ms:.2f} ms/帧 "
+            f"(数据 {self.render_ms:.2f} + 绘制 {widget.paint_ms:.2f}) | "
+            f"FPS {sched.achieved_fps:.1f}/{sched.fps:.0f} | "
+            f"跳帧 空闲 {sched.skipped_idle} 超时 {sched.skipped_late}")
+        if self.bt_client.tracer.enabled:
+            self.latency_label.setText(self.bt_client.tracer.summary())
+
+    def _dump_latency(self):
+        """打印并导出各阶段延迟分布，随后清零重新统计"""
+        tracer = self.bt_client.tracer
+        print("\n[延迟追踪] " + datetime.now().strftime("%H:%M:%S"))
+        for line in tracer.report_lines():
+            print("  " + line)
+        os.makedirs(RECORDINGS_DIR, exist_ok=True)
+        path = os.path.join(RECORDINGS_DIR, f"latency_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        tracer.dump(path, extra={
+            "sample_rate": self.sample_rate,
+            "render_mode": "stacked" if self.stacked_mode else "split",
+            "target_fps": self.render_scheduler.fps,
+        })
+        tracer.reset()
+        self._update_status(f"延迟分布已导出: {path}")
+
+    def _set_stacked_view(self, enabled):
+        """切换分离 / 叠加布局"""
+        self.stacked_mode = enabled
+        self.graph.setVisible(not enabled)
+        self.stacked_graph.setVisible(enabled)
+        self.autoscaler.invalidate()  # 新布局需要重新下发全部量程
+        self.render_scheduler.mark_dirty()
+        self._update_gain_controls()
+
+    def _update_gain_controls(self, *args):
+        """同步增益控件状态"""
+        self.gain_channel_combo.setEnabled(self.stacked_mode)
+        self.gain_spin.setEnabled(self.stacked_mode)
+        if not hasattr(self, 'stacked'):
             return
+        channel = self.gain_channel_combo.currentIndex() - 1
+        gain = self.stacked.gains[max(channel, 0)]
+        self.gain_spin.blockSignals(True)
+        self.gain_spin.setValue(float(gain))
+        self.gain_spin.blockSignals(False)
+
+    def _apply_gain(self, value):
+        """应用叠加视图通道增益"""
+        channel = self.gain_channel_combo.currentIndex() - 1
+        self.stacked.set_gain(None if channel < 0 else channel, value)
+        self.render_scheduler.mark_dirty(None if channel < 0 else channel)
+
+    def _set_robust_scale(self, enabled):
+        """切换稳健缩放模式 (重建缩放器，下一批数据到达后生效)"""
+        self.autoscale_robust = enabled
+        window = self.autoscaler.window_chunks * self.autoscaler.chunk
+        self.autoscaler = self._create_autoscaler(window)
+
+    def _on_stream_gap(self, gap):
+        """断线重连产生的数据间隙写入录制时间线"""
+        if self.recorder is not None:
+            self.recorder.mark_gap(gap)
+
+    def _on_marker(self, marker):
+        """事件标记写入录制"""
+        if self.recorder is not None:
+            self.recorder.add_marker(marker)
+
+    def _on_link_state(self, state):
+        """连接状态机状态变化"""
+        self._update_status(f"连接{STATE_NAMES.get(state, state)}")
+        if state == STATE_FAILED:
+            self._reset_connection_ui()
+
+    def _toggle_recording(self, enabled):
+        """开始 / 结束会话录制"""
+        if enabled:
+            info = self.bt_client.stream_info
+            if info is None:
+                self.record_btn.setChecked(False)
+                return
+            directory = new_session_dir(RECORDINGS_DIR)
+            client = self.bt_client.client
+            device = client.address if client is not None else TARGET_MAC  # 发现流程可能连接到其它设备
+            recorder = SessionRecorder(directory, info, device=device, extra_meta={
+                "profile": PROFILE.key, "channel_names": PROFILE.channel_names},
+                sample_origin=self.bt_client.packet_counter, codec=RECORD_CODEC)
+            self.recorder = RecordingWriter(recorder, RECORD_FLUSH_SECONDS,
+                                            budget=self.bt_client.budgets["record_queue"])
+            self.record_btn.setText("停止录制")
+            self._update_status(f"录制中: {directory}")
+        else:
+            self._stop_recording()
+
+    def _stop_recording(self):
+        """结束录制并写入元数据"""
+        if self.recorder is None:
+            return
+        recorder, self.recorder = self.recorder, None
+        recorder.close()
+        if recorder.error is not None:
+            print(f"[录制] 写入失败 {recorder.directory}: {recorder.error}")
+        if recorder.dropped_blocks:
+            self.bt_client._log_warning(
+                f"录制写入跟不上，丢弃 {recorder.dropped_blocks} 块 ({recorder.dropped_samples} 点)，已记为间隙",
+                event="record_dropped", blocks=recorder.dropped_blocks, samples=recorder.dropped_samples)
+        self._catalog_recording(recorder)
+        self.record_btn.setChecked(False)
+        self.record_btn.setText("开始录制")
+        self._update_status(f"录制完成: {recorder.samples_written} 点, "
+                            f"{recorder.meta['duration_seconds']:.1f} 秒")
+
+    def _catalog_recording(self, recorder):
+        """在会话目录中登记刚结束的录制 (失败不影响录制结果)"""
+        if CATALOG_PATH is None:
+            return
+        try:
+            with SessionCatalog(CATALOG_PATH) as catalog:
+                catalog.add_recording(recorder.directory, recorder.meta)
+        except (sqlite3.Error, OSError) as e:
+            print(f"[会话目录] 登记失败 {recorder.directory}: {e}")
 
-        min_val = np.min(visible_data)
-        max_val = np.max(visible_data)
-        margin = max((max_val - min_val) * self.dynamic_scale_factor, 100)
-        self.plots[ch_index].setYRange(min_val - margin, max_val + margin)
+    def _open_review(self):
+        """选择会话目录并打开回看窗口"""
+        from session_review import SessionReviewWindow
+
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "选择会话目录", RECORDINGS_DIR)
+        if not directory:
+            return
+        try:
+            window = SessionReviewWindow(directory)
+        except (OSError, ValueError, KeyError) as e:
+            self._update_status(f"无法打开会话: {str(e)}")
+            return
+        window.resize(1280, 900)
+        window.show()
+        # 只保留仍打开的窗口，已关闭的回看窗口随之释放
+        self.review_windows = [w for w in self.review_windows if w.isVisible()]
+        self.review_windows.append(window)
+
+    def _update_feedback(self, scores):
+        """更新神经反馈评分显示"""
+        self.feedback_label.setText(
+            f"放松度: {scores.relaxation:.0f} | 专注度: {scores.focus:.0f} | 疲劳度: {scores.fatigue:.0f}")
+
+    def _update_connectivity(self, result):
+        """更新相关 / 相干热图 (隐藏时跳过绘制)"""
+        if not self.connectivity_view.isVisible():
+            return
+        for key, matrix in (('correlation', result.correlation), ('coherence', result.coherence)):
+            image, levels = self.connectivity_images[key]
+            # ImageItem 以 (x, y) 索引，转置后行对应 y 轴
+            image.setImage(matrix.T, levels=levels, autoLevels=False)
+
+    def _update_channel_stats(self, stats):
+        """更新逐通道统计表 (隐藏时跳过)"""
+        if not self.stats_table.isVisible():
+            return
+        table = self.stats_table
+        for row, (_, mean, std, rms, ptp, status) in enumerate(stats.rows(PROFILE.channel_names)):
+            for col, value in enumerate((mean, std, rms, ptp)):
+                table.item(row, col).setText(f"{value:.1f}")
+            item = table.item(row, 4)
+            item.setText(status)
+            item.setForeground(pg.mkColor("g" if status == STATUS_OK else "r"))
 
     def _update_status(self, message):
         """更新状态显示"""
@@ -800,12 +1669,46 @@ class RealTimePlot(QtWidgets.QMainWindow):
     def closeEvent(self, event):
         """安全关闭程序"""
         self._disconnect()
+        self._stop_recording()
         self.refresh_timer.stop()
+        self.perf_profiler.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.marker_server is not None:
+            self.marker_server.stop()
+        if self.bt_client.stream_publisher is not None:
+            self.bt_client.stream_publisher.close()
         event.accept()
 
-if __name__ == '__main__':
+def parse_args(argv):
+    """命令行参数 (其余参数交给 Qt)"""
+    parser = argparse.ArgumentParser(description="NV-BrainRF 脑电实时监测")
+    parser.add_argument("--profile", type=float, metavar="秒", default=None,
+                        help="启动后立即进行一次指定时长的性能分析")
+    parser.add_argument("--profile-mode", choices=MODES, default=PROFILE_MODE,
+                        help="性能分析方式 (cprofile 或 sample)")
+    parser.add_argument("--debug", action="store_true", default=DEBUG_MODE,
+                        help="调试模式: 以 DEBUG 级别记录每次通知的缓冲区与解码详情")
+    parser.add_argument("--leak-check", action="store_true", default=LEAK_CHECK,
+                        help=f"每 {LEAK_CHECK_INTERVAL:.0f} 秒对比 tracemalloc 快照，报告持续增长的代码行")
+    return parser.parse_known_args(argv[1:])
+
+
+def main(argv=None):
+    """GUI 入口"""
+    argv = sys.argv if argv is None else argv
+    args, qt_args = parse_args(argv)
+
+    # 初始化异步环境 (仅 GUI 入口需要，导入本模块不产生副作用)
+    nest_asyncio.apply()
+    logging.basicConfig(level=logging.INFO)
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    log_listener = setup_logging(LOG_FILE, level=logging.DEBUG if args.debug else logging.INFO,
+                                 rate_limit=LOG_RATE_LIMIT, max_queued=LOG_QUEUE_MAX)
+
     # 创建Qt应用
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication(argv[:1] + qt_args)
 
     # 创建并配置事件循环
     loop = asyncio.new_event_loop()
@@ -816,16 +1719,24 @@ if __name__ == '__main__':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
     # 创建主窗口
-    window = RealTimePlot()
+    window = RealTimePlot(leak_check=args.leak_check, debug=args.debug)
     window.resize(1280, 900)
     window.show()
 
+    # SIGUSR1 切换性能分析 (仅 POSIX)
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, window.toggle_profiling)
+
     # 定义异步主任务
     async def async_main():
         await asyncio.sleep(0.1)  # 保持事件循环活动
+        if args.profile:
+            window.toggle_profiling(args.profile, args.profile_mode)
+        scheduler = window.render_scheduler
         while True:
-            await asyncio.sleep(0.1)  # 持续保持事件循环
-            app.processEvents()      # 关键：处理Qt事件
+            # 轮询间隔跟随目标帧率；单次处理Qt事件的时长有上限，BLE回调不会被渲染饿死
+            await asyncio.sleep(scheduler.poll_interval)
+            app.processEvents(QtCore.QEventLoop.AllEvents, scheduler.event_budget_ms)
 
     # 启动事件循环
     try:
@@ -834,5 +1745,10 @@ if __name__ == '__main__':
         pass
     finally:
         loop.close()
+        log_listener.stop()
 
-    sys.exit(app.exec())
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""测试公共设置: materials 下的模块以顶层模块方式导入 (与 main.py 一致)"""
+
+import os
+import sys
+
+MATERIALS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MATERIALS_DIR not in sys.path:
+    sys.path.insert(0, MATERIALS_DIR)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
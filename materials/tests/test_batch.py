@@ -0,0 +1,90 @@
+"""batch.py: 合成会话的特征、质量指标、断点续算与汇总输出"""
+
+import csv
+import os
+
+import numpy as np
+import pytest
+
+import batch
+from rate_estimator import StreamInfo
+from recording import SessionRecorder
+
+RATE = 250.0
+
+
+def make_session(directory, seconds=120, codec=False):
+    """通道 1: 10 Hz alpha + 噪声；通道 2: 平线；通道 3: 噪声，后 10% 饱和"""
+    rng = np.random.default_rng(0)
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    data = np.column_stack([
+        2000 * np.sin(2 * np.pi * 10 * t) + rng.normal(0, 100, n),
+        np.full(n, 1234.0),
+        rng.normal(0, 500, n),
+    ])
+    data[-n // 10:, 2] = batch.FULL_SCALE
+    recorder = SessionRecorder(str(directory), StreamInfo(RATE, 3), codec=codec)
+    recorder.write(np.round(data))
+    recorder.close()
+    return str(directory)
+
+
+@pytest.mark.parametrize("codec", [False, True])
+def test_features_of_synthetic_session(tmp_path, codec):
+    directory = make_session(tmp_path / "s1", codec=codec)
+    state = batch.process_session(directory, str(tmp_path / "ck.json"), chunk_seconds=30.0)
+    session, channels = state["session"], state["channels"]
+    assert session["epochs"] == 60 and state["processed_samples"] == 30000
+    assert channels[0]["alpha_relative"] > 0.9
+    assert channels[0]["flat_fraction"] == 0.0
+    assert channels[1]["flat_fraction"] == 1.0 and channels[1]["rms"] == 0.0
+    assert channels[2]["clipped_fraction"] == pytest.approx(0.1)
+    assert session["relaxation"] > 90.0
+
+
+def test_resume_matches_uninterrupted_run(tmp_path, monkeypatch):
+    directory = make_session(tmp_path / "s1")
+    full = batch.process_session(directory, str(tmp_path / "full.json"), chunk_seconds=10.0)
+
+    calls = []
+    analyze = batch.analyze_chunk
+
+    def interrupted(acc, analyzer, epochs):
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+        calls.append(1)
+        analyze(acc, analyzer, epochs)
+
+    checkpoint = str(tmp_path / "resume.json")
+    monkeypatch.setattr(batch, "analyze_chunk", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        batch.process_session(directory, checkpoint, chunk_seconds=10.0, checkpoint_every=2)
+    monkeypatch.setattr(batch, "analyze_chunk", analyze)
+    resumed = batch.process_session(directory, checkpoint, chunk_seconds=10.0, checkpoint_every=2)
+    assert resumed["resumed_from"] == 4 * 2500
+    for key, value in full["session"].items():
+        if key != "process_seconds":
+            assert resumed["session"][key] == pytest.approx(value), key
+    assert batch.process_session(directory, checkpoint, chunk_seconds=10.0)["skipped"]
+
+
+def test_artifact_fraction_from_histogram():
+    hist = np.zeros(len(batch.PTP_BINS) - 1)
+    hist[60] = 90  # 峰峰值约 10^3
+    hist[100] = 10  # 约 10^5，超过中位数 5 倍
+    assert batch.artifact_fraction(hist) == pytest.approx(0.1)
+    assert batch.artifact_fraction(np.zeros_like(hist)) == 0.0
+
+
+def test_run_writes_tables_and_catalog(tmp_path):
+    root = tmp_path / "rec"
+    for name in ("a", "b"):
+        make_session(root / name, seconds=20)
+    states, failures = batch.run(str(root), workers=1, out=lambda *args: None)
+    assert failures == [] and len(states) == 2
+    with open(root / "_batch" / "channels.csv", encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == 6
+    assert os.path.exists(root / batch.CATALOG_FILE)
+    states, _ = batch.run(str(root), workers=1, out=lambda *args: None)
+    assert all(s.get("skipped") for s in states)
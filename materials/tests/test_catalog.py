@@ -0,0 +1,87 @@
+"""catalog.py: 元数据与批处理特征的合并登记、条件查询与命令行"""
+
+import pytest
+
+import catalog
+from catalog import SessionCatalog, parse_condition
+
+
+def meta(device, start, minutes, missing=0):
+    n = int(minutes * 60 * 250)
+    return {"device": device, "start_time": start, "sample_rate": 250.0, "num_channels": 2,
+            "n_samples": n, "duration_seconds": minutes * 60.0, "n_markers": 1,
+            "gaps": [{"missing_samples": missing}] if missing else [],
+            "channel_stats": {"mean": [1.0, 2.0], "std": [10.0, 20.0]}}
+
+
+def analysis(path, alpha, missing=0):
+    session = {"session": path.rsplit("/", 1)[-1], "path": path, "duration_seconds": 600.0,
+               "sample_rate": 250.0, "missing_samples": missing, "epochs": 300, "relaxation": 70.0}
+    channels = [{"channel": "Ch1", "alpha_power": alpha, "rms": 5.0},
+                {"channel": "Ch2", "alpha_power": alpha * 3, "rms": 6.0}]
+    return session, channels
+
+
+@pytest.fixture
+def filled(tmp_path):
+    sessions = {"a": ("NV-1", "2025-11-01T10:00:00", 10, 0),
+                "b": ("NV-1", "2025-11-02T10:00:00", 30, 250),
+                "c": ("NV-2", "2025-11-03T10:00:00", 5, 0)}
+    db = SessionCatalog(str(tmp_path / catalog.CATALOG_FILE))
+    for name, (device, start, minutes, missing) in sessions.items():
+        (tmp_path / name).mkdir()
+        db.add_recording(str(tmp_path / name), meta(device, start, minutes, missing))
+    db.add_analysis(*analysis(str(tmp_path / "a"), 50.0))
+    db.add_analysis(*analysis(str(tmp_path / "b"), 150.0, missing=250))
+    yield db, tmp_path
+    db.close()
+
+
+def test_parse_condition():
+    assert parse_condition(" alpha_power >= 1e2 ") == ("alpha_power", ">=", 100.0)
+    assert parse_condition("device=NV-1") == ("device", "=", "NV-1")
+    with pytest.raises(ValueError):
+        parse_condition("alpha_power ~ 3")
+
+
+def test_recording_and_analysis_merge(filled):
+    db, root = filled
+    assert len(db) == 3
+    row = db.query(where=[("alpha_power", ">", 0)], order="start_time")[0]
+    assert row["name"] == "a" and row["device"] == "NV-1"  # 批处理不覆盖元数据字段
+    assert row["alpha_power"] == pytest.approx(100.0)  # 通道平均
+    assert row["recorded_at"] and row["analyzed_at"]
+    channels = {r["channel"]: r for r in db.channels(row["id"])}
+    assert channels["Ch2"]["std"] == 20.0 and channels["Ch2"]["alpha_power"] == 150.0
+
+
+def test_queries(filled):
+    db, root = filled
+    names = lambda rows: [r["name"] for r in rows]  # noqa: E731
+    assert names(db.query(device="NV-1")) == ["a", "b"]
+    assert names(db.query(since="2025-11-02", until="2025-11-03")) == ["b"]
+    assert names(db.query(min_duration=600)) == ["a", "b"]
+    assert names(db.query(where=[("loss_rate", ">", 0)])) == ["b"]
+    assert names(db.query(channel="Ch1", where=[("alpha_power", ">=", 100)])) == ["b"]
+    assert names(db.query(order="duration_seconds", limit=1)) == ["c"]
+    with pytest.raises(ValueError):
+        db.query(where=[("path; DROP TABLE sessions", "=", 1)])
+    with pytest.raises(ValueError):
+        db.query(order="random()")
+
+
+def test_remove_missing(filled):
+    db, root = filled
+    (root / "c").rmdir()
+    assert db.remove_missing() == 1
+    assert len(db) == 2
+
+
+def test_cli_reports_bad_conditions(tmp_path, capsys):
+    for argv in ([str(tmp_path), "--where", "alpha_power~1"],
+                 [str(tmp_path), "--where", "unknown>1"]):
+        with pytest.raises(SystemExit) as error:
+            catalog.main(argv)
+        assert error.value.code == 2
+    assert "不支持的查询条件" in capsys.readouterr().err
+    assert catalog.main([str(tmp_path)]) == 0
@@ -0,0 +1,76 @@
+"""channel_stats.py: Welford 累加、滑动窗口移出与接触判定"""
+
+import numpy as np
+import pytest
+
+from channel_stats import (
+    STATUS_FLAT, STATUS_OFFSET, STATUS_OK, ChannelStatsStage, RunningStats, SlidingStats,
+    contact_status,
+)
+from rate_estimator import StreamInfo
+
+
+def blocks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_running_stats_match_numpy_with_large_offset():
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 3.0, (5000, 3)) + 8_000_000  # 接近 24 位满量程的直流分量
+    stats = RunningStats(3)
+    for block in blocks(data, 37):
+        stats.add(block)
+    assert stats.count == 5000
+    np.testing.assert_allclose(stats.mean, data.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.std, data.std(axis=0), rtol=1e-9)
+    np.testing.assert_allclose(stats.rms, np.sqrt(np.mean(data ** 2, axis=0)), rtol=1e-12)
+
+
+def test_remove_is_inverse_of_merge():
+    rng = np.random.default_rng(1)
+    a, b = rng.normal(5, 2, (300, 2)), rng.normal(-5, 1, (200, 2))
+    stats = RunningStats(2)
+    stats.add(a)
+    stats.add(b)
+    stats.remove(*RunningStats.summarize(a))
+    np.testing.assert_allclose(stats.mean, b.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, b.var(axis=0), rtol=1e-9)
+    stats.remove(*RunningStats.summarize(b))
+    assert stats.count == 0 and not stats.variance.any()
+
+
+def test_sliding_stats_cover_latest_window():
+    rng = np.random.default_rng(2)
+    data = rng.normal(0, 1, (2000, 2)) + np.linspace(0, 100, 2000)[:, None]
+    window = SlidingStats(2, 500)
+    for block in blocks(data, 25):
+        window.add(block)
+    latest = data[-500:]
+    assert window.count == 500
+    np.testing.assert_allclose(window.mean, latest.mean(axis=0))
+    np.testing.assert_allclose(window.std, latest.std(axis=0), rtol=1e-8)
+    np.testing.assert_allclose(window.peak_to_peak, np.ptp(latest, axis=0))
+
+
+def test_contact_status():
+    assert contact_status(0.0, 0.5) == STATUS_FLAT
+    assert contact_status(0.0, float("nan")) == STATUS_FLAT
+    assert contact_status(-5_000_000, 100.0) == STATUS_OFFSET
+    assert contact_status(1000.0, 100.0) == STATUS_OK
+
+
+def test_stage_emits_at_interval():
+    stage = ChannelStatsStage(StreamInfo(250.0, 2), window_seconds=1.0, emit_seconds=0.5)
+    received = []
+    stage.subscribe(received.append)
+    data = np.column_stack([np.random.default_rng(3).normal(0, 50, 1000), np.zeros(1000)])
+    results = [stage.push(block) for block in blocks(data, 25)]
+    emitted = [r for r in results if r is not None]
+    assert len(emitted) == 8 and received == emitted and stage.latest is emitted[-1]
+    assert emitted[-1].session_samples == 1000
+    assert emitted[-1].status == [STATUS_OK, STATUS_FLAT]
+    assert emitted[-1].rows(["Fp1", "Fp2"])[1][0] == "Fp2"
+    assert stage.push(np.empty((0, 2))) is None
+    stage.reset()
+    assert stage.latest is None and stage.session.count == 0
+    assert emitted[-1].std[0] == pytest.approx(data[-250:, 0].std(), rel=1e-9)
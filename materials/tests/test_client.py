@@ -0,0 +1,75 @@
+"""BCIBluetoothClient: 数据流水线的调试输出经日志队列写出，不直接打印"""
+
+import logging
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("bleak")
+pytest.importorskip("nest_asyncio")
+
+import test_nv_brainrf_modified_new as app  # noqa: E402
+from soak import synthetic_frames  # noqa: E402
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured():
+    logger = logging.getLogger(app.LOGGER_NAME)
+    handler, level = Capture(), logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    yield handler.records
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+
+
+def notifications(client, count=3):
+    frames = synthetic_frames(client.profile, 6 * count, np.random.default_rng(0))
+    step = 6 * client.profile.frame_length
+    return [frames[i:i + step] for i in range(0, len(frames), step)]
+
+
+def test_debug_is_off_by_default(captured, capsys):
+    client = app.BCIBluetoothClient()
+    assert not client.debug_enabled and not app.parse_args(["gui"])[0].debug
+    for data in notifications(client):
+        client._data_pipeline(None, data)
+    assert client.total_packets_parsed == 18
+    assert not [r for r in captured if r.levelno == logging.DEBUG]
+    assert capsys.readouterr().out == ""
+
+
+def test_debug_records_are_rate_keyed_and_hex_dump_is_opt_in(captured, capsys, monkeypatch):
+    client = app.BCIBluetoothClient(debug=True)
+    for data in notifications(client):
+        client._data_pipeline(None, data)
+    debug = [r for r in captured if r.levelno == logging.DEBUG]
+    assert {r.rate_key for r in debug} == {"notification_received", "packets_decoded"}
+    assert len(debug) == 6 and not any("hex" in r.fields or "frames" in r.fields for r in debug)
+    assert capsys.readouterr().out == ""
+
+    monkeypatch.setattr(app, "DEBUG_HEX_DUMP", True)
+    captured.clear()
+    client._data_pipeline(None, notifications(client, 1)[0])
+    decoded = next(r for r in captured if r.rate_key == "packets_decoded")
+    assert len(decoded.fields["frames"]) == 6
+    assert decoded.fields["frames"][0]["hex"].startswith("a0 ")
+
+
+def test_pipeline_error_logs_traceback(captured, capsys, monkeypatch):
+    client = app.BCIBluetoothClient()
+    monkeypatch.setattr(client, "_process_packets", lambda: 1 / 0)
+    client._data_pipeline(None, b"\xa0")
+    error = next(r for r in captured if r.event == "pipeline_error")
+    assert error.exc_info[0] is ZeroDivisionError
+    assert capsys.readouterr().out == ""
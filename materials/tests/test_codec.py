@@ -0,0 +1,94 @@
+"""codec.py: 短块、满量程与交替极值的无损往返，容器索引与损坏检测"""
+
+import socket
+
+import numpy as np
+import pytest
+
+import codec
+from codec import BlockPublisher, CodecError, decode_block, encode_block, iter_blocks, scan_index
+
+FULL_SCALE = (-2 ** 23, 2 ** 23 - 1)
+
+
+def round_trip(data):
+    decoded, end = decode_block(encode_block(data))
+    np.testing.assert_array_equal(decoded, data)
+    return end
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 17])
+def test_short_blocks(n):
+    data = np.random.default_rng(n).integers(*FULL_SCALE, (n, 4))
+    assert round_trip(data) == len(encode_block(data))
+
+
+@pytest.mark.parametrize("data", [
+    np.tile(np.array(FULL_SCALE), (50, 1)),  # 两通道分别恒为负/正满量程
+    np.tile(np.array([FULL_SCALE[0], FULL_SCALE[1]]), 32)[:, None],  # 相邻样本满量程跳变
+    np.zeros((100, 3), dtype=np.int64),  # 位宽为 0
+    np.random.default_rng(0).integers(*FULL_SCALE, (500, 8)),  # 白噪声
+], ids=["constant", "alternating", "zeros", "noise"])
+def test_full_scale_round_trip(data):
+    round_trip(data)
+
+
+def test_synthetic_eeg_compresses_and_uses_both_modes():
+    data = codec.synthetic_eeg(2048, 8)
+    encoded = encode_block(data.astype(np.float32))  # 录制器以 float32 写入整数值
+    assert len(encoded) < data.size * 3 * 0.6
+    round_trip(data)
+    order, _, _, _, _, use_rice = codec._plan(data)
+    assert set(order.tolist()) <= {0, 1, 2} and use_rice.any()
+    noise = np.random.default_rng(1).integers(*FULL_SCALE, (500, 2))  # 满量程白噪声: 0 阶 + 位打包
+    order, _, _, _, _, use_rice = codec._plan(noise)
+    assert not order.any() and not use_rice.any()
+
+
+def test_zigzag_inverse():
+    values = np.array([0, -1, 1, -2, 2, -2 ** 23, 2 ** 23 - 1], dtype=np.int64)
+    np.testing.assert_array_equal(codec.zigzag(values)[:5], [0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(codec.unzigzag(codec.zigzag(values)), values)
+
+
+def test_rejects_non_integer_and_corrupt_data():
+    with pytest.raises(CodecError):
+        encode_block(np.array([[0.5]]))
+    with pytest.raises(CodecError):
+        encode_block(np.zeros(4))
+    encoded = bytearray(encode_block(np.arange(40).reshape(20, 2)))
+    with pytest.raises(CodecError):
+        decode_block(b"XXXX" + bytes(encoded[4:]))
+    encoded[codec.BLOCK_HEADER.size] = 7  # 无效预测阶数
+    with pytest.raises(CodecError):
+        decode_block(bytes(encoded))
+
+
+def test_container_index_skips_truncated_tail(tmp_path):
+    blocks = [np.full((n, 2), n, dtype=np.int64) for n in (5, 0, 7)]
+    stream = b"".join(encode_block(b) for b in blocks)
+    assert [len(b) for b in iter_blocks(stream)] == [5, 0, 7]
+    path = tmp_path / "eeg.egc"
+    path.write_bytes(stream + encode_block(np.ones((9, 2), dtype=np.int64))[:-3])  # 录制中断
+    with open(path, "rb") as f:
+        index = scan_index(f)
+    sizes = [len(encode_block(b)) for b in blocks]
+    assert index == [(0, 0, 5), (sizes[0], 5, 0), (sizes[0] + sizes[1], 5, 7)]
+
+
+def test_publisher_datagrams_round_trip():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    publisher = BlockPublisher(port=receiver.getsockname()[1], flush_samples=30)
+    data = codec.synthetic_eeg(100, 4)
+    try:
+        for start in range(0, 100, 20):
+            publisher(data[start:start + 20])
+        publisher.close()
+        received = [BlockPublisher.parse(receiver.recv(65536)) for _ in range(3)]
+    finally:
+        receiver.close()
+    assert [sequence for sequence, _ in received] == [0, 40, 80]
+    np.testing.assert_array_equal(np.concatenate([block for _, block in received]), data)
+    assert publisher.errors == 0 and publisher.ratio > 1.0
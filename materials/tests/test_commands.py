@@ -0,0 +1,102 @@
+"""commands.py: 命令串行化、数据/静默确认与订阅前通知的过滤"""
+
+import asyncio
+import time
+
+from commands import EXPECT_DATA, EXPECT_SILENCE, CommandQueue, CommandResult, CommandStats
+
+
+def test_commands_are_serialized():
+    log = []
+
+    async def write(command):
+        log.append(("begin", command))
+        await asyncio.sleep(0.01)
+        log.append(("end", command))
+
+    async def scenario():
+        queue = CommandQueue(write)
+        results = await asyncio.gather(queue.submit("a"), queue.submit("b"), queue.submit("c"))
+        return queue, results
+
+    queue, results = asyncio.run(scenario())
+    assert [entry[1] for entry in log] == [b"a", b"a", b"b", b"b", b"c", b"c"]
+    assert all(r.ok for r in results) and queue.pending == 0
+    assert results[2].queue_ms >= 15.0
+    assert queue.stats.summary()["a"]["count"] == 1
+
+
+def test_data_confirmation_and_timeout():
+    async def scenario():
+        queue = CommandQueue(None, confirm_timeout=0.05)
+
+        async def write(command):
+            if command == b"b":
+                asyncio.get_running_loop().call_later(0.01, queue.notify_data, time.monotonic() + 0.01)
+
+        queue.write = write
+        confirmed = await queue.submit("b", expect=EXPECT_DATA)
+        unconfirmed = await queue.submit("x", expect=EXPECT_DATA)
+        return confirmed, unconfirmed
+
+    confirmed, unconfirmed = asyncio.run(scenario())
+    assert confirmed.ok and 5.0 <= confirmed.latency_ms < 50.0
+    assert not unconfirmed.ok and unconfirmed.error is None
+
+
+def test_notifications_before_resubscribe_do_not_confirm():
+    async def scenario():
+        queue = CommandQueue(None, confirm_timeout=0.05)
+        subscribed = time.monotonic()
+
+        async def write(command):
+            queue.mark_subscribed(subscribed)
+            queue.notify_data(subscribed - 0.01)  # 旧订阅残留的通知
+
+        queue.write = write
+        stale = await queue.submit("b", expect=EXPECT_DATA)
+
+        async def write_fresh(command):
+            queue.notify_data(time.monotonic())
+
+        queue.write = write_fresh
+        fresh = await queue.submit("b", expect=EXPECT_DATA)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert not stale.ok
+    assert fresh.ok
+
+
+def test_silence_confirmation():
+    async def scenario():
+        queue = CommandQueue(None, confirm_timeout=0.5, silence_seconds=0.03)
+
+        async def write(command):
+            loop = asyncio.get_running_loop()
+            for delay in (0.005, 0.01, 0.015):  # 停止命令后仍在途的数据
+                loop.call_later(delay, lambda: queue.notify_data(time.monotonic()))
+
+        queue.write = write
+        return await queue.submit("s", expect=EXPECT_SILENCE)
+
+    result = asyncio.run(scenario())
+    assert result.ok
+    assert 10.0 <= result.latency_ms < 100.0
+
+
+def test_write_failure_and_stats():
+    async def write(command):
+        raise OSError("未连接")
+
+    result = asyncio.run(CommandQueue(write).submit(b"b", name="start"))
+    assert result.error == "未连接" and not result.ok
+    stats = CommandStats(history=2)
+    stats.record(result)
+    for latency in (10.0, 20.0, 30.0):
+        ok = CommandResult("start", b"b", EXPECT_DATA, 0.0)
+        ok.sent_at, ok.confirmed_at, ok.ok = 0.0, latency / 1000.0, True
+        stats.record(ok)
+    summary = stats.summary()["start"]
+    assert (summary["count"], summary["failed"], summary["unconfirmed"]) == (4, 1, 0)
+    assert summary["p50_ms"] == 25.0 and summary["max_ms"] == 30.0  # 只保留最近 2 条
@@ -0,0 +1,54 @@
+"""connection.py: 指数退避、句柄缓存与连接状态机的间隙记录"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from connection import (
+    STATE_CONNECTED, STATE_IDLE, STATE_RECONNECTING,
+    ExponentialBackoff, GattHandleCache, LinkSupervisor,
+)
+
+
+def test_backoff_is_capped_and_bounded():
+    delays = list(ExponentialBackoff(initial=0.1, factor=3.0, maximum=1.0, max_attempts=5).delays())
+    assert delays == pytest.approx([0.1, 0.3, 0.9, 1.0, 1.0])
+
+
+def test_handle_cache_resolves_by_handle():
+    cache = GattHandleCache()
+    assert cache.resolve(SimpleNamespace(services={})) == (None, None)
+    cache.store("AA:BB", SimpleNamespace(handle=12), SimpleNamespace(handle=15))
+    assert cache.valid
+    services = SimpleNamespace(get_characteristic=lambda handle: f"char-{handle}")
+    assert cache.resolve(SimpleNamespace(services=services)) == ("char-12", "char-15")
+    assert cache.resolve(SimpleNamespace(services=None)) == (None, None)
+    cache.clear()
+    assert not cache.valid and cache.address is None
+
+
+def test_reconnect_only_after_established_connection():
+    supervisor = LinkSupervisor()
+    transitions = []
+    supervisor.subscribe(lambda old, new: transitions.append((old, new)))
+    assert not supervisor.should_reconnect()
+    supervisor.handles.store("AA:BB", SimpleNamespace(handle=1), SimpleNamespace(handle=2))
+    supervisor.transition(STATE_CONNECTED)
+    supervisor.transition(STATE_CONNECTED)  # 重复状态不通知
+    assert supervisor.should_reconnect()
+    supervisor.auto_reconnect = False  # 用户主动断开
+    assert not supervisor.should_reconnect()
+    assert transitions == [(STATE_IDLE, STATE_CONNECTED)]
+
+
+def test_gap_spans_drop_to_first_data():
+    supervisor = LinkSupervisor()
+    assert supervisor.on_data(5.0) is None
+    gap = supervisor.on_drop(1000, now=10.0)
+    assert supervisor.on_drop(1200, now=11.0) is gap  # 重连期间的再次断开并入同一间隙
+    supervisor.transition(STATE_RECONNECTING)
+    assert supervisor.on_data(12.0, sample_rate=250.0) is gap
+    assert gap.as_dict() == {"start_sample": 1000, "duration_seconds": 2.0, "missing_samples": 500}
+    assert supervisor.reconnects == 1
+    assert supervisor.last_recovery_seconds == pytest.approx(2.0)
+    assert supervisor.pending_gap is None and list(supervisor.gaps) == [gap]
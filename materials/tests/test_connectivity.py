@@ -0,0 +1,56 @@
+"""connectivity.py: 滑动相关与 alpha 相干的增量计算"""
+
+import numpy as np
+import pytest
+
+from connectivity import ConnectivityStage, RunningCoherence, RunningCorrelation
+from rate_estimator import StreamInfo
+
+RATE = 250.0
+
+
+def test_running_correlation_matches_corrcoef_over_window():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(2000, 4))
+    data[:, 1] += 0.8 * data[:, 0]
+    data += 5_000_000  # 24 位原始值的大直流分量
+    corr = RunningCorrelation(4, 500)
+    for start in range(0, len(data), 25):
+        corr.add(data[start:start + 25])
+    expected = np.corrcoef(data[-500:].T)
+    np.testing.assert_allclose(corr.matrix(), expected, atol=1e-6)
+
+
+def test_running_correlation_empty_window_is_identity():
+    corr = RunningCorrelation(3, 100)
+    np.testing.assert_array_equal(corr.matrix(), np.eye(3))
+    corr.add(np.empty((0, 3)))
+    np.testing.assert_array_equal(corr.matrix(), np.eye(3))
+
+
+def test_coherence_separates_shared_and_independent_alpha():
+    rng = np.random.default_rng(1)
+    t = np.arange(int(8 * RATE)) / RATE
+    alpha = np.sin(2 * np.pi * 10 * t)
+    data = np.column_stack([alpha + 0.1 * rng.normal(size=len(t)),
+                            0.5 * alpha + 0.1 * rng.normal(size=len(t)),
+                            rng.normal(size=len(t))])
+    coherence = RunningCoherence(3, RATE, window_seconds=4.0, segment_seconds=0.5)
+    coherence.add(data)
+    matrix = coherence.matrix()
+    assert matrix[0, 1] > 0.9
+    assert matrix[0, 2] < 0.5
+    np.testing.assert_allclose(np.diag(matrix), 1.0)
+    assert len(coherence._segments) == coherence.max_segments  # 窗口外的分段已移出
+
+
+def test_stage_emits_at_fixed_interval():
+    stage = ConnectivityStage(StreamInfo(RATE, 2), window_seconds=2.0, emit_seconds=0.5)
+    received = []
+    stage.subscribe(received.append)
+    results = [stage.push(np.random.default_rng(i).normal(size=(25, 2))) for i in range(40)]
+    emitted = [r for r in results if r is not None]
+    assert len(emitted) == 8  # 4 秒数据，每 0.5 秒一次
+    assert received == emitted
+    assert emitted[-1].correlation.shape == (2, 2)
+    assert emitted[-1].coherence[0, 0] == pytest.approx(1.0)
@@ -0,0 +1,55 @@
+"""discovery.py: 设备筛选条件与发现缓存"""
+
+import asyncio
+from types import SimpleNamespace
+
+import discovery
+from discovery import DeviceCache, DeviceFilter, find_device
+
+SERVICE = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
+
+
+def device(address):
+    return SimpleNamespace(address=address)
+
+
+def test_filter_matches_any_condition():
+    flt = DeviceFilter(name_prefix="NV-BrainRF", service_uuid=SERVICE, address="aa:bb:cc:dd:ee:ff")
+    assert flt.matches(None, [], "AA:BB:CC:DD:EE:FF")
+    assert flt.matches("NV-BrainRF-01", [], "11:22")
+    assert flt.matches(None, [SERVICE.lower()], "11:22")
+    assert not flt.matches("Other", ["180d"], "11:22")
+    assert not flt.matches(None, [], "11:22")
+    assert DeviceFilter().empty and DeviceFilter().matches(None, [], "11:22")
+
+
+def test_cache_orders_by_rssi_and_filters():
+    cache = DeviceCache()
+    cache.update(device("11"), "NV-BrainRF-A", -80)
+    cache.update(device("22"), "NV-BrainRF-B", -50)
+    cache.update(device("33"), "Phone", -30)
+    cache.update(device("44"), "NV-BrainRF-C", None)
+    flt = DeviceFilter(name_prefix="NV-BrainRF")
+    assert [s.address for s in cache.fresh(flt)] == ["22", "11", "44"]
+    assert cache.best(flt).address == "22"
+    assert cache.best(DeviceFilter(address="55")) is None
+
+
+def test_cache_expires_old_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(discovery.time, "monotonic", lambda: now[0])
+    cache = DeviceCache(ttl=10.0)
+    cache.update(device("11"), "NV-BrainRF-A", -60)
+    now[0] = 105.0
+    cache.update(device("22"), "NV-BrainRF-B", -70)
+    now[0] = 112.0
+    assert [s.address for s in cache.fresh()] == ["22"]
+    now[0] = 120.0
+    assert cache.best() is None
+
+
+def test_find_device_uses_cache_without_scanning():
+    cache = DeviceCache()
+    cache.update(device("AA"), "NV-BrainRF-A", -40)
+    seen = asyncio.run(find_device(DeviceFilter(address="aa"), cache=cache))
+    assert seen.address == "AA" and seen.name == "NV-BrainRF-A"
@@ -0,0 +1,146 @@
+"""display.py: 双写环形缓冲区、滚动时间轴、自动缩放与渲染调度"""
+
+import numpy as np
+import pytest
+
+from display import AutoScaler, DisplayRing, RenderScheduler, ScrollingAxis
+
+
+def test_ring_window_is_latest_samples_in_order():
+    ring = DisplayRing(3, 10)
+    data = np.arange(37 * 3, dtype=np.float64).reshape(37, 3)
+    for start in range(0, len(data), 4):  # 块长不整除容量，跨越回绕点
+        ring.extend(data[start:start + 4])
+    np.testing.assert_array_equal(ring.window(), data[-10:].T)
+    np.testing.assert_array_equal(ring.channel(1), data[-10:, 1])
+    assert ring.count == 37
+
+
+def test_ring_window_is_a_view():
+    ring = DisplayRing(2, 5)
+    ring.extend(np.ones((3, 2)))
+    assert np.shares_memory(ring.window(), ring.data)
+
+
+def test_ring_block_longer_than_capacity_and_single_samples():
+    ring = DisplayRing(2, 4)
+    data = np.arange(20, dtype=np.float64).reshape(10, 2)
+    ring.extend(data)
+    np.testing.assert_array_equal(ring.window(), data[-4:].T)
+    assert ring.count == 10
+    ring.append([100.0, 101.0])
+    np.testing.assert_array_equal(ring.window()[:, -1], [100.0, 101.0])
+    ring.extend(np.empty((0, 2)))
+    assert ring.count == 11
+
+
+@pytest.mark.parametrize("size", [3, 8])
+def test_ring_resized_keeps_latest_data(size):
+    ring = DisplayRing(2, 5)
+    data = np.arange(14, dtype=np.float64).reshape(7, 2)
+    ring.extend(data)
+    resized = ring.resized(size)
+    keep = min(size, 5)
+    np.testing.assert_array_equal(resized.window()[:, -keep:], data[-keep:].T)
+    assert resized.count == ring.count
+
+
+def test_scrolling_axis_updates_in_place():
+    axis = ScrollingAxis(4, sample_rate=2.0)
+    values = axis.update(10)
+    np.testing.assert_allclose(values, [3.0, 3.5, 4.0, 4.5])
+    assert axis.update(12) is values
+    np.testing.assert_allclose(values, [4.0, 4.5, 5.0, 5.5])
+
+
+@pytest.mark.parametrize("robust", [False, True])
+def test_autoscaler_extrema_follow_sliding_window(robust):
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 100, (1000, 2))
+    data[100, 0] = 5000.0  # 早已滑出窗口的尖峰
+    scaler = AutoScaler(2, window_samples=400, chunk_samples=25, robust=robust)
+    for start in range(0, len(data), 10):
+        scaler.extend(data[start:start + 10])
+    low, high = scaler.extrema(0)
+    window = data[-400:, 0]
+    if robust:
+        assert window.min() <= low and high <= window.max()
+    else:
+        assert (low, high) == (window.min(), window.max())
+    assert high < 5000.0
+    if robust:  # 1000 是窗口长度 400 的整数倍，窗口恰好对齐分块
+        np.testing.assert_allclose((low, high), np.percentile(window, [2.0, 98.0]))
+
+
+def test_robust_autoscaler_rejects_spike_in_window():
+    rng = np.random.default_rng(1)
+    data = rng.normal(0, 10, (500, 1))
+    data[250, 0] = 5000.0  # 窗口内的单点尖峰
+    robust = AutoScaler(1, window_samples=500, robust=True)
+    plain = AutoScaler(1, window_samples=500)
+    for scaler in (robust, plain):
+        for start in range(0, len(data), 20):
+            scaler.extend(data[start:start + 20])
+    low, high = robust.extrema(0)
+    assert -30.0 < low < -10.0 and 10.0 < high < 30.0  # σ=10 的 2%/98% 分位数约为 ±20.5
+    assert plain.extrema(0)[1] == 5000.0
+
+
+def test_autoscaler_hysteresis():
+    scaler = AutoScaler(1, window_samples=100, chunk_samples=10, scale_factor=0.0, min_margin=1.0)
+    scaler.extend(np.linspace(-100, 100, 100)[:, None])
+    assert scaler.update() == [(0, -101.0, 101.0)]
+    scaler.extend(np.full((50, 1), 50.0))  # 仍在当前范围内
+    assert scaler.update() == []
+    scaler.extend(np.full((10, 1), 500.0))  # 越出上限
+    assert scaler.update()[0][2] == 501.0
+    scaler.extend(np.zeros((200, 1)))  # 窗口只剩 0，量程收缩到当前的 shrink_ratio 以下
+    assert scaler.update() == [(0, -1.0, 1.0)]
+    scaler.invalidate()
+    assert scaler.update() == [(0, -1.0, 1.0)]
+    assert scaler.relayouts == 4
+
+
+def test_autoscaler_without_data():
+    scaler = AutoScaler(2, window_samples=100)
+    assert scaler.extrema(0) is None
+    assert scaler.update() == []
+
+
+def test_scheduler_skips_idle_frames_and_tracks_dirty_channels():
+    scheduler = RenderScheduler(4, target_fps=30.0)
+    assert not scheduler.begin(0.0)
+    assert scheduler.skipped_idle == 1
+    scheduler.mark_dirty(2)
+    assert scheduler.begin(0.033)
+    assert scheduler.dirty == {2}
+    scheduler.end(0.034, 1.0)
+    assert not scheduler.dirty
+    scheduler.mark_dirty()
+    assert scheduler.dirty == {0, 1, 2, 3}
+
+
+def test_scheduler_adapts_frame_rate_to_frame_cost():
+    scheduler = RenderScheduler(1, target_fps=30.0, min_fps=5.0, max_fps=31.0)
+    now = 0.0
+    for _ in range(50):  # 帧耗时远超预算，帧率降到下限
+        scheduler.mark_dirty()
+        scheduler.begin(now)
+        scheduler.end(now, 100.0)
+        now += scheduler.interval_ms / 1000.0
+    assert scheduler.fps == 5.0
+    assert scheduler.end(now, 100.0) is None  # 已在下限，不再变化
+    for _ in range(100):  # 帧耗时很低，逐步回升到上限
+        scheduler.end(now, 0.1)
+    assert scheduler.fps == 31.0
+
+
+def test_scheduler_counts_late_ticks_and_achieved_fps():
+    scheduler = RenderScheduler(1, target_fps=10.0, min_fps=10.0, max_fps=10.0)
+    for i in range(12):
+        scheduler.mark_dirty()
+        scheduler.begin(i * 0.1)
+        scheduler.end(i * 0.1, 1.0)
+    assert scheduler.achieved_fps == pytest.approx(10.0)
+    scheduler.begin(1.1 + 0.35)  # 迟到 3.5 个帧间隔
+    assert scheduler.skipped_late == 2
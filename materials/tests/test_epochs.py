@@ -0,0 +1,103 @@
+"""epochs.py / markers.py: 事件分段、基线校正、样本时钟与标记打点"""
+
+import asyncio
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from epochs import Epochs, regular_epochs
+from markers import MarkerServer, MarkerStream, SampleClock, parse_datagram
+
+RATE = 100.0
+
+
+def ramp(n=1000, channels=2):
+    return np.arange(n * channels, dtype=np.float32).reshape(n, channels)
+
+
+def test_epochs_are_views_and_drop_out_of_range_events():
+    data = ramp()
+    epochs = Epochs(data, [5, 100, 500, 995], RATE, tmin=-0.1, tmax=0.2, labels=list("abcd"))
+    assert len(epochs) == 2 and list(epochs.dropped) == [5, 995]
+    assert list(epochs.labels) == ["b", "c"]
+    assert np.shares_memory(epochs[0], data)
+    np.testing.assert_array_equal(epochs[1], data[490:520].T)
+    np.testing.assert_allclose(epochs.times[[0, 10]], [-0.1, 0.0])
+
+
+def test_default_baseline_is_pre_event_mean():
+    data = ramp()
+    epochs = Epochs(data, [100, 500], RATE, tmin=-0.1, tmax=0.2)
+    corrected = epochs.get_data()
+    raw = epochs.get_data(baseline=None)
+    np.testing.assert_allclose(corrected, raw - raw[..., :10].mean(axis=-1, keepdims=True))
+    np.testing.assert_allclose(epochs.average(), corrected.mean(axis=0), atol=1e-4)
+
+
+@pytest.mark.parametrize("tmin", [0.0, 0.05])
+def test_post_event_epochs_use_whole_epoch_baseline(tmin):
+    epochs = Epochs(ramp(), [100, 500], RATE, tmin=tmin, tmax=0.3)
+    data = epochs.get_data()
+    np.testing.assert_allclose(data.mean(axis=-1), 0.0, atol=1e-3)
+    with pytest.raises(ValueError):
+        epochs.get_data(baseline=(-0.2, -0.1))  # 显式指定的区间不在分段内
+
+
+def test_epoch_edge_cases():
+    with pytest.raises(ValueError):
+        Epochs(ramp(), [100], RATE, tmin=0.2, tmax=0.1)
+    empty = Epochs(ramp(10), [5], RATE, tmin=-0.1, tmax=0.5)
+    assert len(empty) == 0 and empty.get_data().shape == (0, 2, 60)
+    data = ramp(100)
+    windows = regular_epochs(data, 30, step=20)
+    assert windows.shape == (4, 2, 30) and np.shares_memory(windows, data)
+    np.testing.assert_array_equal(windows[3], data[60:90].T)
+    assert regular_epochs(ramp(10), 30).shape == (0, 2, 30)
+
+
+def test_sample_clock_and_marker_stream():
+    clock = SampleClock(RATE)
+    stream = MarkerStream(clock, clock_fn=lambda: 10.0)
+    assert stream.make("early").sample is None
+    clock.update(10.0, 500)  # 最后一个样本 499 于 10.0 秒到达
+    assert clock.sample_at(10.0) == 499
+    assert clock.sample_at(9.5) == 449
+    received = []
+    stream.subscribe(received.append)
+    marker = stream.post("target", code=3, timestamp=10.1)
+    assert (marker.sample, marker.code) == (509, 3) and received == [marker]
+    assert list(stream.recent) == [marker]
+
+
+def test_parse_datagram():
+    assert parse_datagram(b"  stim \n", 5.0) == ("stim", None, 5.0)
+    payload = json.dumps({"label": "go", "code": 2, "wall_time": 99.75}).encode()
+    assert parse_datagram(payload, 5.0, wall_received=100.0) == ("go", 2, 4.75)
+    with pytest.raises(ValueError):
+        parse_datagram(b"{broken", 5.0)
+
+
+def test_marker_server_round_trip():
+    async def scenario():
+        clock = SampleClock(RATE)
+        clock.update(0.0, 0)
+        stream = MarkerStream(clock, clock_fn=lambda: 1.0)
+        published = []
+        stream.subscribe(published.append)
+        server = MarkerServer(stream, asyncio.get_running_loop(), port=0).start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(5)
+        try:
+            sock.sendto(b"blink", ("127.0.0.1", server.port))
+            reply = json.loads((await asyncio.to_thread(sock.recvfrom, 4096))[0])
+            await asyncio.sleep(0.01)
+        finally:
+            sock.close()
+            server.stop()
+        return reply, published
+
+    reply, published = asyncio.run(scenario())
+    assert reply["ok"] and reply["label"] == "blink" and reply["sample"] == 99
+    assert [m.source for m in published] == ["udp"]
@@ -0,0 +1,86 @@
+"""eventlog.py: 稳定键限流、结构化格式、后台写出与状态栏合并"""
+
+import asyncio
+import json
+import logging
+
+import eventlog
+from eventlog import ConsoleFormatter, JsonFormatter, RateLimitFilter, StatusCoalescer, setup_logging
+
+
+def make_record(msg, args=(), **extra):
+    record = logging.LogRecord("braincare", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_rate_limit_groups_by_stable_key(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(eventlog.time, "monotonic", lambda: now[0])
+    flt = RateLimitFilter(interval=1.0)
+    # 同一事件的消息文本各不相同 (计数、地址)，仍按事件名归为一类
+    passed = [flt.filter(make_record(f"已处理 {n} 个数据包", rate_key="packets_processed"))
+              for n in range(5)]
+    assert passed == [True, False, False, False, False]
+    assert flt.filter(make_record("连接失败: %s", ("AA",), event="connect_failed"))
+    assert not flt.filter(make_record("连接失败: %s", ("BB",), event="connect_failed"))
+    now[0] = 1.5
+    record = make_record("已处理 9 个数据包", rate_key="packets_processed")
+    assert flt.filter(record) and record.suppressed == 4
+
+
+def test_formatters_include_structured_fields():
+    record = make_record("已连接 %s", ("AA",), event="connected", device="AA", fields={"rssi": -50},
+                         symbol="✓", kind="连接", suppressed=2)
+    console = ConsoleFormatter().format(record)
+    assert console.endswith("✓ 连接: 已连接 AA (已抑制 2 条重复)")
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["event"] == "connected" and entry["device"] == "AA"
+    assert entry["fields"] == {"rssi": -50} and entry["suppressed"] == 2
+
+
+def test_setup_logging_writes_json_lines(tmp_path):
+    path = tmp_path / "events.jsonl"
+    listener = setup_logging(str(path), console=False, rate_limit=1.0)
+    logger = logging.getLogger(eventlog.LOGGER_NAME)
+    try:
+        for n in range(3):
+            logger.info("重连第 %d 次", n, extra={"event": "reconnect", "rate_key": "reconnect"})
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [entry["message"] for entry in lines] == ["重连第 0 次"]
+    assert eventlog.dropped_records() == 0
+
+
+def test_status_coalescer_keeps_latest():
+    shown = []
+
+    async def scenario():
+        coalescer = StatusCoalescer(shown.append, interval=0.05)
+        coalescer.post("a")  # 首条立即显示
+        for message in ("b", "c", "d"):
+            coalescer.post(message)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert shown == ["a", "d"]
+    StatusCoalescer(shown.append, interval=10.0).post("e")  # 无事件循环时直接回调
+    assert shown[-1] == "e"
+
+
+def test_exception_traceback_is_formatted_off_thread(tmp_path):
+    path = tmp_path / "events.jsonl"
+    listener = setup_logging(str(path), console=False)
+    logger = logging.getLogger(eventlog.LOGGER_NAME)
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.error("数据处理异常", exc_info=True, extra={"event": "pipeline_error"})
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    assert entry["event"] == "pipeline_error" and "ZeroDivisionError" in entry["traceback"]
@@ -0,0 +1,51 @@
+"""latency.py: HDR 直方图精度与逐阶段延迟记录"""
+
+import json
+
+import numpy as np
+import pytest
+
+from latency import HdrHistogram, LatencyTracer
+
+
+def test_hdr_percentiles_within_one_percent():
+    values = np.random.default_rng(0).lognormal(np.log(0.005), 1.0, 20000)  # 秒
+    histogram = HdrHistogram()
+    for v in values:
+        histogram.record(v)
+    for q in (50, 90, 99):
+        exact = np.percentile(values, q) * 1000.0
+        assert histogram.percentile(q) == pytest.approx(exact, rel=0.02)
+    assert histogram.max == int(values.max() * 1e6)
+    assert histogram.mean_ms == pytest.approx(values.mean() * 1000.0, rel=0.001)
+
+
+def test_hdr_small_values_exact_and_clamped():
+    histogram = HdrHistogram(highest_us=1000)
+    histogram.record(0.000007)
+    histogram.record(5.0)  # 超出上限记为上限
+    assert histogram.percentile(50) == 0.007
+    assert histogram.percentile(100) == 1.0
+    assert sum(count for _, count in histogram.nonzero_buckets()) == 2
+    histogram.reset()
+    assert histogram.percentile(50) is None and histogram.mean_ms is None
+
+
+def test_tracer_stages_and_weighted_render(tmp_path):
+    tracer = LatencyTracer()
+    tracer.mark("decoded", now=1.0)  # 尚未 begin，不记录
+    for i, samples in enumerate((5, 15)):
+        tracer.begin(1.0 + i * 0.010)
+        tracer.mark("decoded", now=1.001 + i * 0.010)
+        tracer.buffered(samples, now=1.002 + i * 0.010)
+    tracer.rendered(now=1.030)
+    tracer.rendered(now=1.040)  # 无待显示块，不重复记录
+    snapshot = tracer.snapshot()
+    assert snapshot["decoded"]["count"] == 2 and snapshot["delivered"] == {"count": 0}
+    assert snapshot["rendered"]["count"] == 20
+    assert snapshot["rendered"]["p50_ms"] == pytest.approx(20.0, rel=0.01)  # 以样本数加权
+    assert snapshot["rendered"]["max_ms"] == pytest.approx(30.0, rel=0.01)
+    assert "到达→显示" in tracer.summary()
+    path = tracer.dump(str(tmp_path / "latency.json"), extra={"device": "AA"})
+    data = json.loads(open(path, encoding="utf-8").read())
+    assert data["device"] == "AA" and data["stages"]["rendered"]["count"] == 20
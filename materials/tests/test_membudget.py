@@ -0,0 +1,60 @@
+"""membudget.py: 丢弃策略、超限回调与内存增长检测"""
+
+import pytest
+
+from membudget import CLEAR, DROP_NEWEST, DROP_OLDEST, BudgetSet, LeakMonitor, MemoryBudget, current_rss
+
+
+@pytest.mark.parametrize("policy, expected, dropped", [
+    (DROP_OLDEST, b"cdef", 2),
+    (DROP_NEWEST, b"abcd", 2),
+    (CLEAR, b"", 6),
+])
+def test_policies(policy, expected, dropped):
+    buffer = bytearray(b"abcdef")
+    budget = MemoryBudget("raw", 4, policy, unit="字节")
+    assert budget.enforce(buffer) == dropped
+    assert bytes(buffer) == expected
+    assert (budget.overflows, budget.dropped, budget.high_water) == (1, dropped, 6)
+
+
+def test_overflow_callback_once_per_saturation():
+    calls = []
+    budgets = BudgetSet(on_overflow=lambda budget, dropped: calls.append((budget.name, dropped)))
+    budget = budgets.add("pending", 3)
+    items = []
+    for i in range(6):  # 持续超限只回调一次
+        items.append(i)
+        budget.enforce(items)
+    assert items == [3, 4, 5] and calls == [("pending", 1)]
+    items[:] = [0, 1, 2]
+    budget.enforce(items)  # 恰好等于上限仍视为饱和
+    items[:] = [0]
+    budget.enforce(items)  # 回落到上限以下，重新计起
+    items.extend([1, 2, 3])
+    budget.enforce(items)
+    assert len(calls) == 2
+    assert budgets.snapshot()["pending"] == {"limit": 3, "policy": DROP_OLDEST, "high_water": 4,
+                                             "overflows": 4, "dropped": 4}
+    assert budgets["pending"] is budget and len(budgets.report_lines()) == 1
+    with pytest.raises(ValueError):
+        MemoryBudget("x", 1, policy="drop_random")
+
+
+def test_leak_monitor_reports_sustained_growth():
+    leaked = []
+    findings = []
+    monitor = LeakMonitor(interval=0, threshold_kib=64, consecutive=3, on_growth=findings.extend)
+    monitor.start()
+    try:
+        for _ in range(4):
+            leaked.append(bytearray(64 * 1024))
+            monitor.check()
+    finally:
+        monitor.stop()
+    assert monitor.checks == 4 and not monitor.active
+    assert any("test_membudget.py" in where and total >= 3 * 64 * 1024 for where, total, _ in findings)
+
+
+def test_current_rss_positive():
+    assert current_rss() > 0
@@ -0,0 +1,53 @@
+"""metrics.py: 指标类型、Prometheus 文本导出与本地 HTTP 端点"""
+
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, MetricsServer
+
+
+def test_histogram_buckets_are_cumulative_on_export():
+    registry = MetricsRegistry(prefix="t_")
+    histogram = registry.histogram("latency_seconds", "延迟", buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    samples = dict(histogram.samples())
+    assert samples['t_latency_seconds_bucket{le="0.01"}'] == 2  # 上界包含等于边界的值
+    assert samples['t_latency_seconds_bucket{le="1.0"}'] == 4
+    assert samples['t_latency_seconds_bucket{le="+Inf"}'] == 5
+    assert samples["t_latency_seconds_sum"] == pytest.approx(5.565)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.0) == 1.0  # +Inf 桶按最大边界估计
+    assert registry.histogram("empty").quantile(0.5) is None
+
+
+def test_render_text_format_and_lazy_gauges():
+    registry = MetricsRegistry(prefix="t_")
+    registry.counter("packets_total", "通知数").inc(3)
+    depth = [7]
+    registry.gauge("queue_depth", function=lambda: depth[0])
+    registry.gauge_family("channel_std", "逐通道标准差", "channel", lambda: {"Ch1": 1.5})
+    registry.gauge("broken", function=lambda: 1 / 0)
+    depth[0] = 9  # 抓取时才取值
+    text = registry.render()
+    assert "# HELP t_packets_total 通知数\n# TYPE t_packets_total counter\nt_packets_total 3\n" in text
+    assert "t_queue_depth 9\n" in text
+    assert 't_channel_std{channel="Ch1"} 1.5\n' in text
+    assert "\nt_broken " not in text
+    assert registry.get("packets_total").value == 3
+    with pytest.raises(ValueError):
+        registry.counter("packets_total")
+
+
+def test_server_serves_metrics():
+    registry = MetricsRegistry(prefix="t_")
+    registry.counter("up").inc()
+    server = MetricsServer(registry, port=0).start()
+    try:
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain")
+        assert "t_up 1\n" in body
+    finally:
+        server.stop()
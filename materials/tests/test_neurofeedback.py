@@ -0,0 +1,65 @@
+"""neurofeedback.py / spectral.py: 频段功率、评分公式与跳步触发"""
+
+import numpy as np
+import pytest
+
+from neurofeedback import NeuroFeedbackEngine, feedback_indices
+from rate_estimator import StreamInfo
+from spectral import BandPowerAnalyzer
+
+RATE = 250.0
+
+
+def sine(freq, seconds, channels=2, amplitude=50.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.repeat((amplitude * np.sin(2 * np.pi * freq * t))[:, None], channels, axis=1)
+
+
+def test_band_power_peaks_in_matching_band():
+    analyzer = BandPowerAnalyzer(RATE, 250)
+    powers = analyzer.compute(sine(10.0, 1.0).T)
+    assert max(powers, key=lambda name: powers[name][0]) == "alpha"
+    # 正弦功率 ≈ A²/2 (Hann 窗泄漏到相邻频段的部分很小)
+    total = sum(p[0] for p in powers.values())
+    assert total == pytest.approx(50.0 ** 2 / 2, rel=0.05)
+
+
+def test_compute_is_batched_over_leading_dimensions():
+    analyzer = BandPowerAnalyzer(RATE, 250)
+    segments = np.random.default_rng(0).normal(size=(3, 4, 250))
+    batched = analyzer.compute(segments)
+    single = analyzer.compute(segments[2, 1])
+    assert batched["beta"].shape == (3, 4)
+    assert batched["beta"][2, 1] == pytest.approx(single["beta"])
+
+
+def test_feedback_indices_formulas():
+    relaxation, focus, fatigue = feedback_indices(1.0, 3.0, 1.0)
+    assert relaxation == pytest.approx(75.0)
+    assert focus == pytest.approx(20.0)
+    assert fatigue == pytest.approx(80.0)
+    assert feedback_indices(np.ones(5), np.ones(5), np.ones(5)).shape == (3, 5)
+
+
+def test_engine_scores_once_per_hop_after_window_fills():
+    engine = NeuroFeedbackEngine(StreamInfo(RATE, 2), window_seconds=1.0, hop_seconds=0.2)
+    received = []
+    engine.subscribe(received.append)
+    data = sine(10.0, 2.0)
+    results = []
+    for start in range(0, len(data), 7):  # 块长与跳步不对齐
+        results.extend(engine.push(data[start:start + 7]))
+    # 第一个完整窗口在 1 秒时出现，之后每 0.2 秒一次
+    assert len(results) == 6
+    assert received == results
+    assert engine.latest is results[-1]
+    assert results[-1].relaxation > 90.0  # alpha 主导
+
+
+def test_engine_reset_clears_state():
+    engine = NeuroFeedbackEngine(StreamInfo(RATE, 2), window_seconds=1.0, hop_seconds=0.2)
+    engine.push(sine(10.0, 1.0))
+    assert engine.latest is not None
+    engine.reset()
+    assert engine.latest is None
+    assert engine.push(sine(10.0, 0.5)) == []
@@ -0,0 +1,72 @@
+"""profiles.py: 帧切分、失步重同步与向量化字段解码"""
+
+import numpy as np
+import pytest
+
+from profiles import available_profiles, get_profile, register_profile
+
+PROFILE = get_profile("nv-brainrf-8ch")
+
+
+def frame(counter, channels, aux=(0, 0, 0)):
+    """按原逐字节方式构造一帧 (24 位大端有符号通道 + 16 位大端辅助数据)"""
+    body = bytes([0xA0, counter & 0xFF])
+    body += b"".join(int(v).to_bytes(3, "big", signed=True) for v in channels)
+    body += bytes(24 - 3 * len(channels))
+    body += b"".join(int(v).to_bytes(2, "big", signed=True) for v in aux)
+    return body + bytes([0xC0])
+
+
+def test_decode_matches_bytewise_parsing():
+    rng = np.random.default_rng(0)
+    eeg = rng.integers(-2 ** 23, 2 ** 23, (20, 8))
+    eeg[0] = [-2 ** 23, 2 ** 23 - 1, -1, 0, 1, -2, 2 ** 22, -2 ** 22]  # 满量程与符号边界
+    aux = rng.integers(-2 ** 15, 2 ** 15, (20, 3))
+    data = np.frombuffer(b"".join(frame(i, eeg[i], aux[i]) for i in range(20)), dtype=np.uint8)
+    decoded = PROFILE.decode(data)
+    np.testing.assert_array_equal(decoded["counter"], np.arange(20))
+    np.testing.assert_array_equal(decoded["eeg"], eeg)
+    np.testing.assert_array_equal(decoded["aux"], aux)
+    assert PROFILE.decode_eeg(data).dtype == np.float64
+
+
+def test_split_aligned_frames_keeps_tail():
+    data = bytearray(b"".join(frame(i, [i] * 8) for i in range(3)) + frame(3, [3] * 8)[:10])
+    frames, consumed, failed = PROFILE.split_frames(data)
+    assert frames.shape == (3, 33) and consumed == 99 and failed == 0
+    del data[:consumed]  # 返回的帧不引用缓冲区
+    assert len(data) == 10
+    assert PROFILE.split_frames(data)[1] == 0
+
+
+def test_split_resyncs_and_drops_bad_footer():
+    bad = bytearray(frame(1, [1] * 8))
+    bad[-1] = 0x00
+    data = b"\x01\x02" + frame(0, [5] * 8) + bytes(bad) + frame(2, [7] * 8)
+    frames, consumed, failed = PROFILE.split_frames(data)
+    assert failed == 1 and consumed == len(data)
+    np.testing.assert_array_equal(PROFILE.decode(frames)["counter"], [0, 2])
+    frames, consumed, failed = PROFILE.split_frames(b"\x00" * 40)  # 无帧头整段丢弃
+    assert len(frames) == 0 and consumed == 40
+
+
+def test_two_channel_profile_scales_fields():
+    profile = get_profile("nv-brainrf-2ch")
+    assert profile.num_channels == 2 and profile.channel_names == ["FP1", "FP2"]
+    raw = bytearray(frame(0, [10, -10, 300]))
+    raw[20:22] = (1000).to_bytes(2, "big", signed=True)
+    decoded = profile.decode(np.frombuffer(raw, dtype=np.uint8))
+    np.testing.assert_array_equal(decoded["eeg"], [[10, -10]])
+    assert decoded["temperature"][0] == pytest.approx(300 - 273.15)
+    assert decoded["gyro"][0, 0] == pytest.approx(8.75)
+
+
+def test_register_rejects_bad_fields():
+    spec = dict(get_profile("nv-brainrf-8ch").spec)
+    with pytest.raises(ValueError):
+        register_profile("bad", dict(spec, fields=[{"name": "eeg", "offset": 30, "type": "i24be", "count": 2}]))
+    with pytest.raises(ValueError):
+        register_profile("bad", dict(spec, fields=[{"name": "eeg", "offset": 2, "type": "f32"}]))
+    with pytest.raises(KeyError):
+        get_profile("bad")
+    assert "nv-brainrf-8ch" in available_profiles()
@@ -0,0 +1,83 @@
+"""profiling.py: 折叠栈汇总、两种分析方式的输出文件与共享的 tracemalloc 跟踪"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import pytest
+
+from membudget import LeakMonitor
+from profiling import MODE_CPROFILE, MODE_SAMPLE, ProfilingController, StackSampler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+def test_top_functions_own_and_inclusive_counts(tmp_path):
+    sampler = StackSampler(threading.get_ident())
+    sampler.stacks = Counter({"a;b;c": 3, "a;b": 2, "a;d;a": 1})
+    assert sampler.top_functions() == [("c", 3, 3), ("b", 2, 5), ("a", 1, 6)]
+    sampler.write_folded(str(tmp_path / "cpu.folded"))
+    assert open(tmp_path / "cpu.folded", encoding="utf-8").readline() == "a;b;c 3\n"
+
+
+@pytest.mark.parametrize("mode, files", [(MODE_CPROFILE, {"cpu.pstats", "cpu.txt"}),
+                                         (MODE_SAMPLE, {"cpu.folded", "cpu.txt"})])
+def test_capture_writes_results(tmp_path, mode, files):
+    finished = []
+    controller = ProfilingController(str(tmp_path), metadata=lambda: {"device": "AA"},
+                                     on_finished=finished.append)
+    controller.start(duration=None, mode=mode)
+    assert controller.active
+    busy(0.1)
+    directory = controller.toggle()
+    assert not controller.active and finished == [directory]
+    names = set(os.listdir(directory))
+    assert files | {"memory.txt", "meta.json"} <= names
+    meta = json.load(open(os.path.join(directory, "meta.json"), encoding="utf-8"))
+    assert meta["mode"] == mode and meta["session"] == {"device": "AA"}
+    assert "busy" in open(os.path.join(directory, "cpu.txt"), encoding="utf-8").read()
+
+
+def test_unknown_mode_and_idle_stop(tmp_path):
+    controller = ProfilingController(str(tmp_path), memory=False)
+    with pytest.raises(ValueError):
+        controller.start(mode="perf")
+    assert controller.stop() is None
+
+
+def test_leak_monitor_and_profiler_share_tracing(tmp_path):
+    assert not tracemalloc.is_tracing()
+    monitor = LeakMonitor(interval=0)
+    controller = ProfilingController(str(tmp_path))
+    monitor.start()
+    controller.start(duration=None)
+    monitor.stop()  # 泄漏检测先结束，性能分析的跟踪不受影响
+    assert tracemalloc.is_tracing()
+    directory = controller.stop()
+    assert {"cpu.pstats", "memory.txt"} <= set(os.listdir(directory))
+    assert not tracemalloc.is_tracing()
+
+    controller.start(duration=None)
+    monitor.start()
+    directory = controller.stop()
+    assert "memory.txt" in os.listdir(directory) and tracemalloc.is_tracing()
+    monitor.stop()
+    assert not tracemalloc.is_tracing()
+
+
+def test_stop_writes_cpu_stats_when_tracing_was_stopped_externally(tmp_path):
+    controller = ProfilingController(str(tmp_path))
+    controller.start(duration=None)
+    tracemalloc.stop()
+    directory = controller.stop()
+    names = set(os.listdir(directory))
+    assert {"cpu.pstats", "cpu.txt", "meta.json"} <= names and "memory.txt" not in names
@@ -0,0 +1,62 @@
+"""rate_estimator.py: 帧计数展开、丢帧与标称采样率吸附"""
+
+import numpy as np
+import pytest
+
+from rate_estimator import SampleRateEstimator, StreamInfo, seconds_to_samples
+
+
+def feed(estimator, rate, seconds, frames_per_notification=7, drop_every=None, jitter=0.0, seed=0):
+    """按给定采样率模拟通知 (帧计数 mod 256)，返回首次确定的 StreamInfo"""
+    rng = np.random.default_rng(seed)
+    frame = 0
+    interval = frames_per_notification / rate
+    for i in range(int(seconds / interval)):
+        counters = []
+        for _ in range(frames_per_notification):
+            if drop_every is None or frame % drop_every:
+                counters.append(frame % 256)
+            frame += 1
+        arrival = (i + 1) * interval + rng.uniform(0, jitter)
+        info = estimator.update(arrival, counters)
+        if info is not None:
+            return info
+    return None
+
+
+def test_seconds_to_samples():
+    assert seconds_to_samples(2.0, 250.0) == 500
+    assert seconds_to_samples(0.0001, 250.0) == 1
+    info = StreamInfo(250, 8)
+    assert info.samples(0.5) == 125
+    assert info.seconds(500) == 2.0
+
+
+def test_snaps_to_nominal_rate():
+    info = feed(SampleRateEstimator(8), 251.3, 5.0, jitter=0.01)
+    assert info is not None
+    assert info.sample_rate == 250.0
+    assert info.measured_rate == pytest.approx(251.3, rel=0.01)
+
+
+def test_counter_wraparound_and_drops_do_not_lower_rate():
+    info = feed(SampleRateEstimator(8), 500.0, 5.0, drop_every=5)
+    assert info.sample_rate == 500.0
+    assert info.measured_rate == pytest.approx(500.0, rel=0.005)
+
+
+def test_off_nominal_rate_is_kept():
+    info = feed(SampleRateEstimator(8), 320.0, 5.0)
+    assert info.sample_rate == pytest.approx(320.0, rel=0.005)
+
+
+def test_waits_for_warmup_and_lock_skips_measurement():
+    estimator = SampleRateEstimator(8, warmup_seconds=3.0)
+    assert feed(estimator, 250.0, 2.0) is None
+    assert not estimator.locked
+
+    estimator.reset()
+    estimator.lock(StreamInfo(250.0, 8, source="replay"))
+    assert estimator.locked
+    assert estimator.update(10.0, [1, 2, 3]) is None
+    assert estimator.info.source == "replay"
@@ -0,0 +1,124 @@
+"""recording.py: 会话录制/读取、金字塔、标记、无损编码与后台写线程"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from connection import StreamGap
+from markers import Marker
+from membudget import DROP_NEWEST, MemoryBudget
+from rate_estimator import StreamInfo
+from recording import RecordingWriter, SessionReader, SessionRecorder
+
+RATE = 250.0
+CHANNELS = 4
+
+
+def session_data(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.round(rng.normal(0, 2000, (n, CHANNELS))).astype(np.float64)
+
+
+def record(directory, data, codec=False, block=37, **kwargs):
+    recorder = SessionRecorder(str(directory), StreamInfo(RATE, CHANNELS), device="AA:BB",
+                               min_level=3, max_level=8, codec=codec, **kwargs)
+    for start in range(0, len(data), block):
+        recorder.write(data[start:start + block])
+    return recorder
+
+
+@pytest.mark.parametrize("codec", [False, True])
+def test_round_trip_and_meta(tmp_path, codec):
+    data = session_data(5000)
+    record(tmp_path, data, codec=codec).close()
+    reader = SessionReader(str(tmp_path))
+    assert reader.encoded == codec
+    assert reader.n_samples == 5000
+    assert reader.meta["device"] == "AA:BB"
+    np.testing.assert_array_equal(reader.samples(), data)
+    np.testing.assert_array_equal(reader.read(1234, 3456), data[1234:3456])
+    np.testing.assert_allclose(reader.meta["channel_stats"]["mean"], data.mean(axis=0))
+
+
+def test_pyramid_levels_aggregate_raw_samples(tmp_path):
+    data = session_data(4096)
+    record(tmp_path, data).close()
+    reader = SessionReader(str(tmp_path))
+    level4 = np.asarray(reader.pyramid(4))
+    assert len(level4) == 4096 // 16
+    grouped = data.reshape(-1, 16, CHANNELS)
+    np.testing.assert_allclose(level4[:, 0], grouped.min(axis=1))
+    np.testing.assert_allclose(level4[:, 1], grouped.max(axis=1))
+    np.testing.assert_allclose(level4[:, 2], grouped.mean(axis=1), rtol=1e-6)
+
+
+def test_fetch_bounds_points_by_screen_width(tmp_path):
+    data = session_data(4096)
+    record(tmp_path, data).close()
+    reader = SessionReader(str(tmp_path))
+    level, x, low, high, mean = reader.fetch(0.0, reader.duration, 300)
+    assert level == 4 and low.shape == (CHANNELS, 256) and len(x) == 256
+    level, x, low, high, mean = reader.fetch(1.0, 1.4, 300)
+    assert level == 0
+    np.testing.assert_array_equal(low, data[250:350].T)
+    assert reader.fetch(100.0, 200.0, 300)[1].size == 0
+
+
+def test_markers_and_gaps_use_session_sample_index(tmp_path):
+    recorder = record(tmp_path, session_data(500), sample_origin=1000)
+    gap = StreamGap(1500, 10.0)
+    gap.close(10.5, RATE)
+    recorder.mark_gap(gap)
+    recorder.add_marker(Marker(1100, 4.4, "start", code=7))
+    recorder.add_marker(Marker(None, 5.0, "unsynced"))  # 无样本序号的标记不写入
+    recorder.close()
+    reader = SessionReader(str(tmp_path))
+    markers = reader.markers()
+    assert [(m["sample"], m["label"], m["code"]) for m in markers] == [(100, "start", 7)]
+    assert reader.meta["gaps"] == [{"start_sample": 1500, "duration_seconds": 0.5,
+                                    "missing_samples": 125, "sample_index": 500}]
+
+
+def test_writer_thread_preserves_order_and_flushes_meta(tmp_path):
+    data = session_data(3000)
+    recorder = SessionRecorder(str(tmp_path), StreamInfo(RATE, CHANNELS), codec=True)
+    writer = RecordingWriter(recorder, flush_seconds=0.05)
+    for start in range(0, len(data), 25):
+        writer.write(data[start:start + 25])
+    deadline = time.monotonic() + 5.0  # 不调用 flush，空闲超时后由写线程自行落盘
+    while SessionReader(str(tmp_path)).meta["n_samples"] < 3000 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert SessionReader(str(tmp_path)).meta["n_samples"] == 3000
+    writer.close()
+    assert writer.error is None and recorder.closed
+    np.testing.assert_array_equal(SessionReader(str(tmp_path)).samples(), data)
+
+
+def test_writer_drops_new_blocks_over_budget_and_records_gap(tmp_path):
+    data = session_data(1000)
+    recorder = SessionRecorder(str(tmp_path), StreamInfo(RATE, CHANNELS))
+    release = threading.Event()
+    write = recorder.write
+
+    def slow_write(block, accel=None):  # 模拟磁盘阻塞
+        release.wait(5.0)
+        write(block, accel)
+
+    recorder.write = slow_write
+    budget = MemoryBudget("record_queue", 3, DROP_NEWEST, unit="块")
+    writer = RecordingWriter(recorder, flush_seconds=10.0, budget=budget)
+    for start in range(0, 1000, 100):
+        writer.write(data[start:start + 100])
+        time.sleep(0.01)
+    assert writer.pending <= 3 and writer.dropped_blocks >= 6
+    assert budget.overflows == writer.dropped_blocks and budget.high_water == 4
+    release.set()
+    writer.close()
+    reader = SessionReader(str(tmp_path))
+    gaps = reader.meta["gaps"]
+    assert [g["reason"] for g in gaps] == ["writer_overflow"]
+    assert gaps[0]["missing_samples"] == writer.dropped_samples == 1000 - reader.n_samples
+    assert gaps[0]["sample_index"] == reader.n_samples
+    np.testing.assert_array_equal(reader.samples(), data[:reader.n_samples])
@@ -0,0 +1,89 @@
+"""sleep.py: 合成整夜会话上的频谱、体动、间隙特征与 CSV 输出"""
+
+import csv
+
+import numpy as np
+import pytest
+
+import sleep
+from connection import StreamGap
+from rate_estimator import StreamInfo
+from recording import SessionRecorder, SessionReader
+
+RATE = 100.0
+EPOCH = int(30 * RATE)
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    """
+    10 个 30 秒分段: 0-4 为 2 Hz delta，5-9 为 10 Hz alpha；
+    加速度只覆盖 0-5 段 (之后缺失)，分段 1 有体动；分段 7 内有一次断线间隙
+    """
+    directory = str(tmp_path_factory.mktemp("night"))
+    rng = np.random.default_rng(0)
+    t = np.arange(EPOCH) / RATE
+    recorder = SessionRecorder(directory, StreamInfo(RATE, 2), extra_meta={"start_time": "2025-11-01T23:00:00"})
+    for i in range(10):
+        freq = 2.0 if i < 5 else 10.0
+        eeg = 500 * np.sin(2 * np.pi * freq * t)[:, None] + rng.normal(0, 5, (EPOCH, 2))
+        accel = None
+        if i < 6:
+            accel = np.tile([0.0, 0.0, 1000.0], (EPOCH, 1)) + rng.normal(0, 1, (EPOCH, 3))
+            if i == 1:
+                accel[:10 * int(RATE)] += rng.normal(0, 200, (10 * int(RATE), 3))  # 前 10 秒体动
+        if i == 7:
+            recorder.write(eeg[:1000], accel)
+            gap = StreamGap(0, 0.0)
+            gap.close(0.1, RATE)
+            recorder.mark_gap(gap)
+            recorder.write(eeg[1000:], accel)
+        else:
+            recorder.write(eeg, accel)
+    recorder.close()
+    return directory
+
+
+def features(directory, chunk_epochs=3):
+    reader = SessionReader(directory)
+    extractor = sleep.SleepFeatureExtractor(reader.sample_rate)
+    parts = list(sleep.iter_features(reader, extractor, chunk_epochs))
+    assert [first for first, _ in parts] == list(range(0, 10, chunk_epochs))
+    return {key: np.concatenate([columns[key] for _, columns in parts]) for key in parts[0][1]}
+
+
+def test_spectral_features_follow_dominant_rhythm(session):
+    columns = features(session)
+    assert (columns["delta_relative"][:5] > 0.9).all()
+    assert (columns["alpha_relative"][5:] > 0.9).all()
+    assert (columns["delta_beta_ratio"][:5] > columns["delta_beta_ratio"][5:]).all()
+    assert (columns["spectral_edge_hz"][:5] < 4).all() and (columns["spectral_edge_hz"][5:] >= 8).all()
+    assert (columns["spectral_entropy"] < 0.5).all()
+    assert not columns["flat"].any() and not columns["clipped_fraction"].any()
+
+
+def test_motion_and_gaps(session):
+    columns = features(session)
+    fraction = columns["movement_fraction"]
+    assert fraction[1] == pytest.approx(10 / 30)
+    assert fraction[0] == 0.0
+    assert np.isnan(fraction[6:]).all()  # 无加速度数据的分段不是 "无体动"
+    np.testing.assert_allclose(columns["accel_z"][:6], 1000.0, atol=20.0)
+    assert list(columns["gap"]) == [0] * 7 + [1] + [0] * 2
+
+
+def test_chunking_does_not_change_features(session):
+    a, b = features(session, 3), features(session, 10)
+    for key in a:
+        np.testing.assert_allclose(a[key], b[key], rtol=1e-9, err_msg=key)
+
+
+def test_cli_writes_table(session, tmp_path, capsys):
+    output = tmp_path / "features.csv"
+    assert sleep.main([session, str(output), "--channels", "Ch2", "--chunk-epochs", "4"]) == 0
+    with open(output, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 10
+    assert rows[2]["clock_time"] == "2025-11-01T23:01:00" and float(rows[2]["start_seconds"]) == 60.0
+    assert rows[9]["movement_fraction"] == "nan"
+    assert "10 个分段" in capsys.readouterr().out
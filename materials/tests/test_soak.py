@@ -0,0 +1,38 @@
+"""短时浸泡测试: 缩短周期的合成数据回放 (约 12 分钟模拟时长)"""
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("bleak")
+pytest.importorskip("nest_asyncio")
+
+import soak  # noqa: E402
+
+
+def test_short_soak_passes():
+    lines = []
+    passed, samples = soak.run(hours=0.2, warmup_minutes=3, checkpoint_seconds=60, cycle_minutes=6,
+                               out=lines.append)
+    assert passed, "\n".join(lines)
+    assert len(samples) == 12
+    assert any("不绘制期间超限" in line for line in lines)  # 最小化期间预算确实生效
+
+
+def test_overflow_outside_pause_fails(monkeypatch):
+    import test_nv_brainrf_modified_new as app
+
+    monkeypatch.setattr(app, "LATENCY_PENDING_MAX", 4)  # 小于两次绘制之间的块数
+    lines = []
+    passed, _ = soak.run(hours=0.05, warmup_minutes=1, checkpoint_seconds=60, cycle_minutes=6,
+                         out=lines.append)
+    assert not passed
+    assert any("正常运行时段超限" in line for line in lines)
+
+
+def test_leak_check_is_opt_in():
+    import test_nv_brainrf_modified_new as app
+
+    assert not app.parse_args(["gui"])[0].leak_check
+    assert app.parse_args(["gui", "--leak-check"])[0].leak_check
+    assert app.BCIBluetoothClient().leak_monitor is None
+    assert app.BCIBluetoothClient(leak_check=True).leak_monitor is not None
@@ -0,0 +1,37 @@
+"""stacked_view.py: 叠加视图的通道标签、断点路径与量程归一化"""
+
+import numpy as np
+import pytest
+
+pg = pytest.importorskip("pyqtgraph")
+
+from stacked_view import StackedRenderer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return pg.mkQApp()
+
+
+def test_ticks_use_channel_names(app):
+    plot = pg.PlotItem()
+    StackedRenderer(plot, 2, 10, channel_names=["FP1", "FP2"])
+    assert plot.getAxis("left")._tickLevels == [[(1.0, "FP1"), (0.0, "FP2")]]
+    default = pg.PlotItem()
+    StackedRenderer(default, 2, 10)
+    assert [label for _, label in default.getAxis("left")._tickLevels[0]] == ["Ch1", "Ch2"]
+
+
+def test_render_single_broken_path(app):
+    renderer = StackedRenderer(pg.PlotItem(), 3, 4, default_span=10.0)
+    renderer.set_ranges([(1, -50.0, 50.0)])
+    renderer.set_gain(2, 2.0)
+    window = np.array([[0.0, 10.0, 0.0, 10.0]] * 3)
+    renderer.render(np.arange(4.0), window)
+    y = renderer._y.reshape(3, 4)
+    swing = np.array([-1.0, 1.0, -1.0, 1.0])
+    np.testing.assert_allclose(y[0], 2.0 + 0.4 * swing)  # 去均值后 ±5 × 0.8 / 量程 10
+    np.testing.assert_allclose(y[1], 1.0 + 0.04 * swing)  # 量程 100
+    np.testing.assert_allclose(y[2], 0.0 + 0.8 * swing)  # 增益 2
+    assert list(np.flatnonzero(~renderer._connect)) == [3, 7, 11]
+    np.testing.assert_array_equal(renderer._x, np.tile(np.arange(4.0), 3))
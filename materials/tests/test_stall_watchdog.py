@@ -0,0 +1,61 @@
+"""stall_watchdog.py: 超时计算、恢复策略升级与事件驱动的停滞检测"""
+
+import asyncio
+import time
+
+import pytest
+
+from stall_watchdog import (
+    ACTION_RECONNECT, ACTION_RESEND_START, RecoveryPolicy, StallWatchdog, stall_timeout,
+)
+
+
+def test_stall_timeout_has_floor():
+    assert stall_timeout(250.0, 250) == pytest.approx(1.0)
+    assert stall_timeout(1000.0, 10) == 0.25
+
+
+def test_policy_escalates_and_repeats_last_action():
+    policy = RecoveryPolicy()
+    assert [policy.action(n) for n in range(1, 6)] == [ACTION_RESEND_START, ACTION_RESEND_START,
+                                                       ACTION_RECONNECT, ACTION_RECONNECT,
+                                                       ACTION_RECONNECT]
+    with pytest.raises(ValueError):
+        RecoveryPolicy(actions=())
+
+
+def test_steady_data_wakes_at_most_once_per_timeout():
+    stalls = []
+
+    async def scenario():
+        watchdog = StallWatchdog(lambda *args: stalls.append(args), timeout=0.05)
+        watchdog.arm()
+        for _ in range(40):  # 0.2 秒内每 5 毫秒一个数据
+            await asyncio.sleep(0.005)
+            watchdog.feed(time.monotonic())
+        watchdog.disarm()
+        return watchdog
+
+    watchdog = asyncio.run(scenario())
+    assert stalls == []
+    assert 0 < watchdog.wakeups <= 0.25 / 0.05 + 1
+
+
+def test_stall_escalates_then_recovers():
+    stalls, recoveries = [], []
+
+    async def scenario():
+        policy = RecoveryPolicy(retry_factor=1.0)
+        watchdog = StallWatchdog(lambda action, silent, n: stalls.append((action, n)),
+                                 recoveries.append, timeout=0.02, policy=policy)
+        watchdog.arm()
+        await asyncio.sleep(0.15)
+        assert watchdog.stalled
+        watchdog.feed(time.monotonic())
+        assert not watchdog.stalled and watchdog.consecutive == 0
+        watchdog.disarm()
+
+    asyncio.run(scenario())
+    assert [n for _, n in stalls[:3]] == [1, 2, 3]
+    assert [a for a, _ in stalls[:3]] == [ACTION_RESEND_START, ACTION_RESEND_START, ACTION_RECONNECT]
+    assert len(recoveries) == 1 and recoveries[0] >= 0.1
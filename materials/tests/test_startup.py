@@ -0,0 +1,78 @@
+"""main.py / offline.py / startup_bench.py: 子命令延迟导入与离线命令行"""
+
+import numpy as np
+import pytest
+
+import offline
+from rate_estimator import StreamInfo
+from recording import SessionRecorder
+from startup_bench import HEAVY_MODULES, RUN_ARGS, make_fixture, measure, parse_importtime
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | io
+import time:        50 |         50 |     numpy.core._multiarray_umath
+import time:       900 |        950 |   numpy.core
+import time:      1000 |       1950 | numpy
+"""
+
+
+def test_parse_importtime_sums_top_level_only():
+    total, packages = parse_importtime(IMPORTTIME + "其他 stderr 输出\n")
+    assert total == 420 + 1950
+    assert packages == {"_io", "io", "numpy"}
+
+
+@pytest.fixture(scope="module")
+def fixture(tmp_path_factory):
+    return make_fixture(str(tmp_path_factory.mktemp("bench")), seconds=40.0)
+
+
+@pytest.mark.parametrize("command", sorted(RUN_ARGS))
+def test_offline_commands_skip_gui_imports(fixture, command):
+    # 真实执行: 入口函数在解析参数之后导入的依赖 (numpy、recording 等) 也计入
+    _, elapsed, packages = measure(command, fixture)
+    assert elapsed > 0
+    assert "numpy" in packages
+    if command != "profiles":
+        assert "recording" in packages
+    assert not packages & set(HEAVY_MODULES)
+
+
+def test_import_only_commands_include_lazy_dependencies(fixture):
+    pytest.importorskip("bleak")
+    _, _, packages = measure("scan", fixture)
+    assert {"offline", "discovery", "bleak"} <= packages
+    with pytest.raises(ValueError):
+        measure("importtime", fixture)
+
+
+@pytest.fixture
+def session(tmp_path):
+    recorder = SessionRecorder(str(tmp_path / "s"), StreamInfo(250.0, 2), device="AA:BB")
+    recorder.write(np.arange(1000, dtype=np.float64).reshape(500, 2))
+    recorder.close()
+    return str(tmp_path / "s")
+
+
+def test_info_and_export(session, tmp_path, capsys):
+    assert offline.info_main([session]) == 0
+    assert "设备: AA:BB" in capsys.readouterr().out
+    output = tmp_path / "out.csv"
+    assert offline.export_main([session, str(output), "--chunk", "64"]) == 0
+    table = np.loadtxt(output, delimiter=",", skiprows=1)
+    assert table.shape == (500, 3)
+    np.testing.assert_allclose(table[:, 1:], np.arange(1000).reshape(500, 2))
+    np.testing.assert_allclose(table[-1, 0], 499 / 250.0)
+
+
+def test_review_argument_errors(session, tmp_path):
+    pytest.importorskip("pyqtgraph")
+    from session_review import parse_args
+
+    args, qt_args = parse_args(["review", session, "-platform", "offscreen"])
+    assert args.directory == session and qt_args == ["-platform", "offscreen"]
+    with pytest.raises(SystemExit) as error:
+        parse_args(["review", str(tmp_path)])
+    assert error.value.code == 2
@@ -14,12 +14,16 @@ import os
 import numpy as np
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
-from bleak import BleakClient, BleakScanner
+from bleak import BleakClient
 import asyncio
 import nest_asyncio
+import time
 from datetime import datetime
 import logging
 
+from discovery import DeviceCache, DeviceFilter, discover
+from stall_watchdog import ACTION_RESEND_START, RecoveryPolicy, StallWatchdog
+
 # 初始化异步环境
 nest_asyncio.apply()
 logging.basicConfig(level=logging.INFO)
@@ -35,6 +39,8 @@ WRITE_CHAR_UUID = "6e400004-b5a3-f393-e0a9-e50e24dcca9e"
 NOTIFY_CHAR_UUID = "6e400003-b5a3-f393-e0a9-e50e24dcca9e"
 START_CMD = b'b'
 BUFFER_SIZE = 800  # 增大缓冲区应对高采样率
+STALL_TIMEOUT = 1.0  # 超过该时长无数据判定停滞并重发启动命令 (秒)
+DISCOVERY_TIMEOUT = 10.0  # 扫描超时上限 (找到匹配设备即提前返回)
 
 
 # =============================
@@ -50,6 +56,14 @@ class BCIBluetoothClient(QtCore.QObject):
         self.raw_buffer = bytearray()
         self.packet_size = 33
         self.packet_counter = 0
+        self._stopped = asyncio.Event()
+        self.watchdog = StallWatchdog(self._on_stall, timeout=STALL_TIMEOUT,
+                                      policy=RecoveryPolicy(actions=(ACTION_RESEND_START,)))
+
+    def stop(self):
+        """结束数据采集 (唤醒监听任务)"""
+        self.running = False
+        self._stopped.set()
 
     async def connect_device(self, mac_address):
         """设备连接全生命周期管理"""
@@ -101,8 +115,23 @@ class BCIBluetoothClient(QtCore.QObject):
     async def _start_monitoring(self):
         """进入数据监听模式"""
         self._log_system("进入数据采集状态", "▶")
-        while self.running:
-            await asyncio.sleep(0.01)  # 防止CPU过载
+        self._stopped.clear()
+        self.watchdog.arm()
+        try:
+            await self._stopped.wait()  # 等待停止事件，期间不占用 CPU
+        finally:
+            self.watchdog.disarm()
+
+    def _on_stall(self, action, silent_seconds, consecutive):
+        """数据流停滞 - 重发启动命令"""
+        self._log_warning(f"数据流停滞 {silent_seconds:.2f} 秒 (第 {consecutive} 次)，重发启动命令")
+        asyncio.ensure_future(self._resend_start())
+
+    async def _resend_start(self):
+        try:
+            await self.client.write_gatt_char(WRITE_CHAR_UUID, START_CMD, response=True)
+        except Exception as e:
+            self._log_error(f"重发启动命令失败: {str(e)}")
 
     async def _safe_disconnect(self):
         """安全断开连接"""
@@ -113,6 +142,7 @@ class BCIBluetoothClient(QtCore.QObject):
 
     def _data_pipeline(self, sender, data):
         """数据处理流水线"""
+        self.watchdog.feed(time.monotonic())
         try:
             self.raw_buffer += data
             self._process_packets()
@@ -186,6 +216,8 @@ class RealTimePlot(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
         self.bt_client = BCIBluetoothClient()
+        self.device_cache = DeviceCache()
+        self.device_filter = DeviceFilter(service_uuid=SERVICE_UUID, address=TARGET_MAC)
         self._init_parameters()
         self._init_ui()
         self._init_data()
@@ -278,15 +310,16 @@ class RealTimePlot(QtWidgets.QMainWindow):
         asyncio.create_task(self._async_scan())
 
     async def _async_scan(self):
-        """异步设备扫描"""
+        """异步设备扫描 - 发现第一个匹配设备即返回，结果写入设备缓存"""
         print("正在扫描蓝牙设备...")
         self._update_status("正在扫描蓝牙设备...")
         try:
-            devices = await BleakScanner.discover(timeout=20.0)
+            devices = await discover(self.device_filter, max_matches=1,
+                                     timeout=DISCOVERY_TIMEOUT, cache=self.device_cache)
             if devices:
-                print("[SCAN] 发现以下设备:")
+                print("[SCAN] 发现目标设备:")
                 for i, d in enumerate(devices):
-                    print(f"  {i + 1}. {d.name or '未知设备'} - {d.address}")
+                    print(f"  {i + 1}. {d}")
             else:
                 print("[SCAN] 未找到有效设备")
         except Exception as e:
@@ -308,13 +341,14 @@ class RealTimePlot(QtWidgets.QMainWindow):
 
     def _connect(self):
         """启动连接"""
-        asyncio.create_task(self.bt_client.connect_device(TARGET_MAC))
+        seen = self.device_cache.best(self.device_filter)  # 扫描过则直接使用发现的设备
+        asyncio.create_task(self.bt_client.connect_device(seen.device if seen is not None else TARGET_MAC))
         self.connect_btn.setText("断开")
         self.scan_btn.setEnabled(False)
 
     def _disconnect(self):
         """终止连接"""
-        self.bt_client.running = False
+        self.bt_client.stop()
         self.connect_btn.setText("连接")
         self.scan_btn.setEnabled(True)
 